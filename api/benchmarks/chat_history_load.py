@@ -0,0 +1,100 @@
+"""Chat history reads and writes of concurrent sessions, straight to Neo4j against the ChatHistoryStore buffers.
+
+Run from the api folder: python benchmarks/chat_history_load.py --sessions 200
+
+Neo4j is simulated: every round trip takes --round-trip seconds and at most
+--pool-size of them run at once, like the driver's connection pool.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from langchain_core.messages import AIMessage, HumanMessage, messages_to_dict  # noqa: E402
+
+from wrapper.chat_history_store import ChatHistoryStore  # noqa: E402
+from wrapper.neo4j_chathistory_wrapper import Neo4jSessionHistory  # noqa: E402
+
+
+class SimulatedNeo4j:
+    """The message chains of AsyncNeo4jDatabase in memory, behind a slow pooled connection."""
+
+    def __init__(self, round_trip: float, pool_size: int) -> None:
+        self.round_trip = round_trip
+        self.pool = asyncio.Semaphore(pool_size)
+        self.sessions = {}
+        self.reads = 0
+        self.writes = 0
+
+    async def query(self, cypher_query: str, params: dict = {}) -> [dict]:
+        async with self.pool:
+            self.reads += 1
+            await asyncio.sleep(self.round_trip)
+        return [{"result": message} for message in messages_to_dict(self.sessions.get(params["session_id"], []))]
+
+    async def execute_write(self, cypher_query: str, params: dict = {}) -> [dict]:
+        async with self.pool:
+            self.writes += 1
+            await asyncio.sleep(self.round_trip)
+        self.sessions.setdefault(params["session_id"], []).extend(
+            HumanMessage(content=message["content"]) if message["type"] == "human"
+            else AIMessage(content=message["content"])
+            for message in params["messages"]
+        )
+        return []
+
+
+async def run_sessions(history_for, sessions: int, turns: int) -> None:
+    async def session(index: int) -> None:
+        history = history_for(f"session-{index}")
+        for turn in range(turns):
+            # A question reads the window, then saves the question and its answer
+            await history.aget_messages()
+            await history.aadd_messages([HumanMessage(content=f"question {turn}"), AIMessage(content=f"answer {turn}")])
+
+    await asyncio.gather(*(session(index) for index in range(sessions)))
+
+
+async def measure(buffered: bool, args) -> (float, SimulatedNeo4j):
+    database = SimulatedNeo4j(args.round_trip, args.pool_size)
+    store = ChatHistoryStore(database)
+    if buffered:
+        store.start()
+        history_for = store.get_save_session_history
+    else:
+        def history_for(session_id):
+            return Neo4jSessionHistory(database, session_id)
+
+    started_at = time.perf_counter()
+    await run_sessions(history_for, args.sessions, args.turns)
+    seconds = time.perf_counter() - started_at
+    # Flushed outside the timing, a user doesn't wait for it
+    await store.close()
+
+    expected = [f"{kind} {turn}" for turn in range(args.turns) for kind in ("question", "answer")]
+    assert all([message.content for message in messages] == expected for messages in database.sessions.values())
+    assert len(database.sessions) == args.sessions
+
+    return seconds, database
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--round-trip", type=float, default=0.005, help="Seconds of every simulated Neo4j call")
+    parser.add_argument("--pool-size", type=int, default=100)
+    args = parser.parse_args()
+
+    for name, buffered in (("direct", False), ("ChatHistoryStore", True)):
+        seconds, database = asyncio.run(measure(buffered, args))
+        turns = args.sessions * args.turns
+        print(f"{name:>16}: {turns} turns of {args.sessions} sessions in {seconds:.2f} s ({turns / seconds:.0f} turns/s), "
+              f"{database.reads} reads, {database.writes} writes")
+
+
+if __name__ == "__main__":
+    main()
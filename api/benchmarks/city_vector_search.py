@@ -0,0 +1,87 @@
+"""Recall and latency of ranking nearby-city attractions: global top candidates filtered by city, against city first.
+
+The previous query took the global top max(candidates, limit) hits of the vector index and
+only then kept the nearby cities, the current one ranks the attractions of the nearby cities
+directly. Both are simulated with NumPy on attractions spread over cities with a long tail of
+small ones, recall is measured against the exact top limit of the nearby cities. The global
+search is a brute force scan here, an HNSW index answers it faster, so its latency is an upper
+bound; the city first latency grows with the attractions of the nearby cities only.
+
+Run from the api folder: python benchmarks/city_vector_search.py
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+
+def create_attractions(attractions: int, cities: int, dimensions: int, generator) -> (np.ndarray, np.ndarray):
+    # Zipf-like city sizes, a few big cities hold most attractions
+    weights = 1 / np.arange(1, cities + 1)
+    city_of = generator.choice(cities, size=attractions, p=weights / weights.sum())
+    vectors = generator.standard_normal((attractions, dimensions), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors, city_of
+
+
+def global_then_filter(vectors, city_of, query, nearby, limit, candidates) -> np.ndarray:
+    scores = vectors @ query
+    top = np.argpartition(-scores, candidates - 1)[:candidates]
+    top = top[np.isin(city_of[top], nearby)]
+    return top[np.argsort(-scores[top])][:limit]
+
+
+def city_first(vectors, city_of, query, nearby, limit, rows_by_city) -> np.ndarray:
+    rows = np.concatenate([rows_by_city[city] for city in nearby])
+    if not len(rows):
+        return rows
+    scores = vectors[rows] @ query
+    return rows[np.argsort(-scores)[:limit]]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--attractions", type=int, default=50000)
+    parser.add_argument("--cities", type=int, default=1000)
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--nearby", type=int, default=3, help="cities returned by find_nearest_cities")
+    parser.add_argument("--limit", type=int, default=30, help="rows asked for, limit * 5 in Neo4jSimilarity")
+    parser.add_argument("--candidates", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    generator = np.random.default_rng(42)
+    vectors, city_of = create_attractions(args.attractions, args.cities, args.dimensions, generator)
+    rows_by_city = {city: np.flatnonzero(city_of == city) for city in range(args.cities)}
+
+    results = {"global then filter": ([], [], 0), "city first": ([], [], 0)}
+    for _ in range(args.queries):
+        query = generator.standard_normal(args.dimensions, dtype=np.float32)
+        query /= np.linalg.norm(query)
+        nearby = generator.choice(args.cities, size=args.nearby, replace=False)
+
+        exact = city_first(vectors, city_of, query, nearby, args.limit, rows_by_city)
+        for name, search in (
+                ("global then filter", lambda: global_then_filter(vectors, city_of, query, nearby, args.limit,
+                                                                  max(args.candidates, args.limit))),
+                ("city first", lambda: city_first(vectors, city_of, query, nearby, args.limit, rows_by_city)),
+        ):
+            started_at = time.perf_counter()
+            found = search()
+            elapsed = time.perf_counter() - started_at
+
+            recalls, timings, empty = results[name]
+            recalls.append(len(np.intersect1d(found, exact)) / len(exact) if len(exact) else 1.0)
+            timings.append(elapsed)
+            results[name] = (recalls, timings, empty + (len(found) == 0 and len(exact) > 0))
+
+    print(f"{args.attractions} attractions in {args.cities} cities, {args.nearby} nearby cities, "
+          f"top {args.limit} of {args.candidates} candidates")
+    for name, (recalls, timings, empty) in results.items():
+        print(f"{name:>18}: recall {statistics.mean(recalls):.3f}, no rows for {empty / args.queries:.1%} "
+              f"of queries, median {statistics.median(timings) * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
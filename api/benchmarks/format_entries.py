@@ -0,0 +1,94 @@
+"""merge_entries against the previous dict-of-lists format_entries on raw rows with many duplicate names.
+
+Run from the api folder: python benchmarks/format_entries.py
+"""
+import argparse
+import random
+import sys
+import timeit
+from collections import Counter, defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from Utils.data_formatter import format_entries, merge_entries  # noqa: E402
+
+
+def previous_format_entries(retrieved_items):
+    """format_entries before the Attraction record, kept to compare against."""
+    combined_entries = defaultdict(lambda: {
+        "n.city_name": "",
+        "n.locations": [],
+        "n.titles": [],
+        "n.texts": [],
+        "n.urls": []
+    })
+
+    for entry in retrieved_items:
+        name = entry["n.name"]
+
+        if entry.get("n.city_name"):
+            combined_entries[name]["n.city_name"] = entry["n.city_name"]
+        if entry.get("n.location") and entry["n.location"] not in combined_entries[name]["n.locations"]:
+            combined_entries[name]["n.locations"].append(entry["n.location"])
+
+        if entry.get("n.title"):
+            combined_entries[name]["n.titles"].append(entry["n.title"])
+        if entry.get("n.text"):
+            combined_entries[name]["n.texts"].append(entry["n.text"])
+
+        if entry.get("n.url") and entry["n.url"] not in combined_entries[name]["n.urls"]:
+            combined_entries[name]["n.urls"].append(entry["n.url"])
+
+    for name, details in combined_entries.items():
+        if len(details["n.locations"]) > 1:
+            most_common_location = Counter(details["n.locations"]).most_common(1)[0][0]
+            details["n.location"] = most_common_location
+        else:
+            details["n.location"] = details["n.locations"][0] if details["n.locations"] else ""
+        details.pop("n.locations", None)
+
+        if len(details["n.urls"]) > 1:
+            details["n.url"] = details["n.urls"][0]
+        else:
+            details["n.url"] = details["n.urls"][0] if details["n.urls"] else ""
+        details.pop("n.urls", None)
+
+    return [{"n.name": name, **details} for name, details in combined_entries.items()]
+
+
+def raw_rows(rows: int, names: int, seed: int = 42) -> [dict]:
+    generator = random.Random(seed)
+    items = []
+    for i in range(rows):
+        name = generator.randrange(names)
+        items.append({
+            "n.name": f"attraction {name}",
+            "n.city_name": f"city {name % 50}",
+            # A few distinct locations and URLs per name, like rows scraped from several pages
+            "n.location": f"https://maps.example/{name}/{generator.randrange(20)}",
+            "n.url": f"https://example.com/{name}/{generator.randrange(20)}",
+            "n.title": f"title {i}",
+            "n.text": f"text {i}",
+        })
+    return items
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--names", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    items = raw_rows(args.rows, args.names)
+    assert format_entries(items) == previous_format_entries(items)
+
+    for name, function in (("previous", previous_format_entries), ("merge_entries", merge_entries),
+                           ("format_entries", format_entries)):
+        seconds = min(timeit.repeat(lambda: function(items), number=1, repeat=args.repeat))
+        print(f"{name:>14}: {seconds * 1000:.2f} ms for {args.rows} rows, {args.names} names")
+
+
+if __name__ == "__main__":
+    main()
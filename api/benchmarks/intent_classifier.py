@@ -0,0 +1,74 @@
+"""Import time of components.classifier, time to get the pipeline, and classify_batch latency.
+
+Compares loading the intent_classifier.joblib built by the Dockerfile against training
+in process, which is what happens on the first question when the file is missing.
+
+Run from the api folder: python benchmarks/intent_classifier.py
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+source_directory = str(Path(__file__).resolve().parents[1] / "src")
+sys.path.insert(0, source_directory)
+
+import joblib  # noqa: E402
+
+from components import classifier  # noqa: E402
+
+questions = ["سلام", "مرسی", "یه برنامه سه روزه برای شیراز میخوام", "جاهای دیدنی اصفهان کجاست؟", "هوا چطوره"]
+
+import_script = "import time; started_at = time.perf_counter(); import components.classifier; print(time.perf_counter() - started_at)"
+
+
+def import_time(repeat: int) -> float:
+    timings = [
+        float(subprocess.run([sys.executable, "-c", import_script], cwd=source_directory, check=True,
+                             capture_output=True, text=True).stdout)
+        for _ in range(repeat)
+    ]
+    return statistics.median(timings)
+
+
+def load_time(path: str) -> float:
+    classifier._pipeline = None
+    started_at = time.perf_counter()
+    classifier.load_pipeline(path)
+    return time.perf_counter() - started_at
+
+
+def classify_latency(batch_size: int, repeat: int) -> float:
+    texts = (questions * batch_size)[:batch_size]
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        classifier.classify_batch(texts)
+        timings.append(time.perf_counter() - started_at)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"import components.classifier: {import_time(args.repeat) * 1000:.1f} ms")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "intent_classifier.joblib")
+        joblib.dump(classifier.train_pipeline(), path)
+
+        print(f"load from joblib: {load_time(path) * 1000:.1f} ms")
+        print(f"train in process: {load_time(os.path.join(directory, 'missing.joblib')) * 1000:.1f} ms")
+
+    for batch_size in (1, 32):
+        print(f"classify_batch of {batch_size}: {classify_latency(batch_size, args.repeat * 20) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
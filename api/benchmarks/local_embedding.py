@@ -0,0 +1,96 @@
+"""Throughput of Gpt4AllEmbedding at 1, 8 and 32 concurrent embedders, against embedding inline on the event loop.
+
+Run from the api folder: python benchmarks/local_embedding.py
+Local nomic inference needs the gpt4all package and downloads the model on first use. With
+--simulate the model is replaced by a CPU-bound stand-in costing a fixed overhead per call
+plus a cost per text, which is where micro-batching pays off.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from embedding import GPT4ALL  # noqa: E402
+from embedding.GPT4ALL import Gpt4AllEmbedding  # noqa: E402
+
+simulated_costs = (0.02, 0.002)
+
+
+def busy(seconds: float) -> None:
+    until = time.perf_counter() + seconds
+    while time.perf_counter() < until:
+        pass
+
+
+def simulated_embed_texts(texts: [str], model: str) -> [[float]]:
+    call_cost, text_cost = simulated_costs
+    busy(call_cost + text_cost * len(texts))
+    return [[0.0] * Gpt4AllEmbedding.dimensions for _ in texts]
+
+
+class InlineEmbedding:
+    """The previous behaviour, embedding each query synchronously on the event loop."""
+
+    model = Gpt4AllEmbedding.model
+
+    async def embed_query(self, text: str) -> list[float]:
+        return GPT4ALL.embed_texts([text], self.model)[0]
+
+
+async def measure(embedder, concurrency: int, queries: int) -> (float, float):
+    """Queries per second and the longest stall of the event loop."""
+    longest_stall = 0.0
+    running = True
+
+    async def watch_loop():
+        nonlocal longest_stall
+        while running:
+            started_at = time.perf_counter()
+            await asyncio.sleep(0.001)
+            longest_stall = max(longest_stall, time.perf_counter() - started_at)
+
+    async def embedder_task(count: int):
+        for i in range(count):
+            await embedder.embed_query(f"جاذبه های دیدنی شهر شماره {i}")
+
+    watcher = asyncio.create_task(watch_loop())
+    started_at = time.perf_counter()
+    await asyncio.gather(*(embedder_task(queries // concurrency) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started_at
+    running = False
+    await watcher
+
+    return (queries // concurrency) * concurrency / elapsed, longest_stall
+
+
+async def run(concurrencies: [int], queries: int, max_workers: int) -> None:
+    for concurrency in concurrencies:
+        for name, embedder in (("inline", InlineEmbedding()), ("pool", Gpt4AllEmbedding(max_workers=max_workers))):
+            # The first call starts the workers and loads the model
+            await embedder.embed_query("warm up")
+            per_second, stall = await measure(embedder, concurrency, queries)
+            print(f"{concurrency:>3} concurrent, {name:>6}: {per_second:8.1f} queries/s, "
+                  f"event loop stalled up to {stall * 1000:.1f} ms")
+            if isinstance(embedder, Gpt4AllEmbedding):
+                embedder._executor.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--simulate", action="store_true", help="replace the model by a CPU-bound stand-in")
+    args = parser.parse_args()
+
+    if args.simulate:
+        GPT4ALL.embed_texts = simulated_embed_texts
+
+    asyncio.run(run(args.concurrency, args.queries, args.max_workers))
+
+
+if __name__ == "__main__":
+    main()
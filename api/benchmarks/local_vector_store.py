@@ -0,0 +1,90 @@
+"""Load time and top-k search latency of the memory-mapped LocalVectorStore at growing sizes.
+
+Run from the api folder: python benchmarks/local_vector_store.py --sizes 10000 100000 1000000
+A store of 1M 768-dim vectors takes 3 GB of disk under --directory.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from wrapper.local_vector_store import LocalVectorStore, metadata_file_name, vectors_file_name  # noqa: E402
+
+
+def write_store(directory: str, size: int, dimensions: int, cities: int, chunk_size: int = 100000) -> None:
+    generator = np.random.default_rng(42)
+
+    # Written in chunks so the biggest stores don't have to fit in memory twice
+    vectors = np.lib.format.open_memmap(os.path.join(directory, vectors_file_name), mode='w+',
+                                        dtype=np.float32, shape=(size, dimensions))
+    for start in range(0, size, chunk_size):
+        chunk = generator.standard_normal((min(chunk_size, size - start), dimensions), dtype=np.float32)
+        vectors[start:start + len(chunk)] = chunk / np.linalg.norm(chunk, axis=1, keepdims=True)
+    vectors.flush()
+    del vectors
+
+    rows = np.arange(size)
+    pd.DataFrame({
+        "attractionId": rows,
+        # Sorted by city like pack_embeddings writes it
+        "city_name": [f"city {i:05d}" for i in rows * cities // size],
+        "name": "", "location": "", "text": "", "title": "", "url": "",
+    }).to_parquet(os.path.join(directory, metadata_file_name), index=False)
+
+
+def timed(function, repeat: int) -> (float, float):
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started_at)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def benchmark(directory: str, size: int, dimensions: int, cities: int, repeat: int) -> None:
+    write_store(directory, size, dimensions, cities)
+
+    started_at = time.perf_counter()
+    store = LocalVectorStore(directory)
+    load_time = time.perf_counter() - started_at
+
+    generator = np.random.default_rng(7)
+    query = generator.standard_normal(dimensions, dtype=np.float32)
+    batch = generator.standard_normal((32, dimensions), dtype=np.float32)
+    nearby = [f"city {i:05d}" for i in range(3)]
+
+    print(f"{size} vectors of {dimensions} dims, loaded in {load_time * 1000:.1f} ms")
+    for name, function in (
+            ("full scan", lambda: store.search(query, k=50)),
+            ("3 cities", lambda: store.search(query, k=50, city_names=nearby)),
+            ("32 batched", lambda: store.search(batch, k=50)),
+    ):
+        median, p95 = timed(function, repeat)
+        print(f"  {name:>10}: median {median * 1000:.2f} ms, p95 {p95 * 1000:.2f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--cities", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--directory", default=None, help="where the stores are written, a temporary directory by default")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory(dir=args.directory) as directory:
+            benchmark(directory, size, args.dimensions, min(args.cities, size), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Peak RSS and runtime of Utils.mapper on a synthetic attractions file, against the previous whole-file mapping.
+
+Run from the api folder: python benchmarks/mapper.py --size-mb 2048
+
+Each mapping runs in its own process so its peak RSS is measured alone.
+"""
+import argparse
+import csv
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import pandas as pd  # noqa: E402
+
+from Utils.mapper import map_attractions  # noqa: E402
+
+cities = 400
+sections_per_attraction = 6
+
+
+def write_cities(file_name: str) -> None:
+    pd.DataFrame({"cityId": range(1, cities + 1), "Name": [f"city {i}" for i in range(cities)]}).to_csv(
+        file_name, index=False)
+
+
+def write_attractions(file_name: str, size_mb: int, seed: int = 42) -> int:
+    """Streamed to disk, returns the number of rows."""
+    generator = random.Random(seed)
+    words = [f"word{i}" for i in range(5000)]
+    target = size_mb * 1024 * 1024
+    rows = 0
+    with open(file_name, "w", encoding="utf8", newline="") as attractions_file:
+        writer = csv.writer(attractions_file)
+        writer.writerow(["city_name", "name", "title", "text", "url"])
+        while attractions_file.tell() < target:
+            attraction = rows // sections_per_attraction
+            writer.writerow([
+                f"city {attraction % cities}",
+                f"attraction {attraction}",
+                f"section {generator.randrange(3)}",
+                " ".join(generator.choices(words, k=150)),
+                f"https://example.com/{attraction}",
+            ])
+            rows += 1
+    return rows
+
+
+def previous_mapper(attractions_file_name: str, cities_file_name: str, output_directory: str) -> None:
+    """The mapper before streaming, kept to compare against, writing to output_directory instead of in place."""
+    attractions_df = pd.read_csv(attractions_file_name)
+    cities_df = pd.read_csv(cities_file_name)
+    attractions_df['attractionId'] = range(1, len(attractions_df) + 1)
+    attractions_df.to_csv(os.path.join(output_directory, "attractions.csv"), index=False)
+
+    merged_df = pd.merge(attractions_df, cities_df, left_on='city_name', right_on='Name')
+    merged_df[['attractionId', 'cityId']].to_csv(
+        os.path.join(output_directory, "attraction_city_connections.csv"), index=False)
+
+
+def measure(target, *args) -> (float, float):
+    """Seconds and peak RSS in MB of target run in a child process."""
+    started_at = time.perf_counter()
+    process = multiprocessing.get_context("fork").Process(target=target, args=args)
+    process.start()
+    process.join()
+    seconds = time.perf_counter() - started_at
+    if process.exitcode:
+        raise RuntimeError(f"{target.__name__} exited with {process.exitcode}")
+
+    # Linux reports kilobytes, the largest of the children waited for so far
+    return seconds, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=2048)
+    parser.add_argument("--chunksize", type=int, default=50000)
+    parser.add_argument("--skip-previous", action="store_true", help="Only run the streaming mapper")
+    parser.add_argument("--directory", help="Where the synthetic files go, defaults to a temporary directory")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.directory) as directory:
+        attractions_path, cities_path = os.path.join(directory, "attractions.csv"), os.path.join(directory, "Cities.csv")
+        write_cities(cities_path)
+        rows = write_attractions(attractions_path, args.size_mb)
+        print(f"{rows} rows, {os.path.getsize(attractions_path) / 1024 / 1024:.0f} MB of attractions")
+
+        # Measured first, RUSAGE_CHILDREN only keeps the maximum of every child
+        seconds, peak_mb = measure(map_attractions, attractions_path, cities_path,
+                                   os.path.join(directory, "streaming"), args.chunksize)
+        print(f"   streaming: {seconds:.1f} s, peak RSS {peak_mb:.0f} MB")
+
+        if not args.skip_previous:
+            os.makedirs(os.path.join(directory, "previous"))
+            seconds, peak_mb = measure(previous_mapper, attractions_path, cities_path,
+                                       os.path.join(directory, "previous"))
+            print(f"    previous: {seconds:.1f} s, peak RSS {peak_mb:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Per-request time of retrieval to prompt text, with and without the AttractionCache.
+
+Run from the api folder: python benchmarks/retrieval_path.py
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from components.result_generator import format_similars  # noqa: E402
+from components.similarity import Neo4jSimilarity  # noqa: E402
+from wrapper.attraction_cache import AttractionCache  # noqa: E402
+
+city_names = ["تهران", "شمیرانات", "ری"]
+
+
+class FakeDatabase:
+    """Returns the 100 row LIMIT of attractions_query after a simulated round trip."""
+
+    def __init__(self, latency: float, rows_per_attraction: int) -> None:
+        self.latency = latency
+        self.rows_per_attraction = rows_per_attraction
+
+    async def find_nearest_cities(self, city_name: str):
+        return [{"n": {"Name": name}} for name in city_names]
+
+    async def get_attractions(self, city_names: [str]):
+        await asyncio.sleep(self.latency)
+        return [
+            {
+                "n.city_name": city_names[i % len(city_names)],
+                "n.name": f"attraction {i // self.rows_per_attraction}",
+                "n.location": f"https://maps.example/{i // self.rows_per_attraction}",
+                "n.text": "متن جاذبه " * 40,
+                "n.title": f"title {i % self.rows_per_attraction}",
+                "n.url": f"https://example.com/{i // self.rows_per_attraction}",
+            }
+            for i in range(100)
+        ]
+
+
+class FakeWebsocket:
+    async def send_json(self, message: dict) -> None:
+        pass
+
+
+class FakeLLM:
+    model_name = "benchmark"
+    websocket = FakeWebsocket()
+
+    async def generate_streaming(self, *args, **kwargs):
+        return '{"city": "تهران", "stay_duration": 3, "mentioned_city": "نمیدانم"}'
+
+
+async def measure(similarity: Neo4jSimilarity, requests: int) -> [float]:
+    timings = []
+    for i in range(requests):
+        started_at = time.perf_counter()
+        similars = await similarity.run_async("برنامه سه روزه تهران", f"session {i}")
+        format_similars(similars)
+        timings.append(time.perf_counter() - started_at)
+    return timings
+
+
+def report(name: str, timings: [float]) -> None:
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{name:>9}: mean {statistics.mean(timings) * 1000:.3f} ms, p95 {p95 * 1000:.3f} ms")
+
+
+async def run(requests: int, latency: float, rows_per_attraction: int) -> None:
+    database = FakeDatabase(latency, rows_per_attraction)
+
+    uncached = Neo4jSimilarity(database, None, FakeLLM(), extraction_mode="structured")
+    report("uncached", await measure(uncached, requests))
+
+    attraction_cache = AttractionCache(database)
+    cached = Neo4jSimilarity(database, None, FakeLLM(), extraction_mode="structured", attraction_cache=attraction_cache)
+    report("cached", await measure(cached, requests))
+    print(f"cache: {attraction_cache.stats()}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.002, help="simulated Neo4j round trip in seconds")
+    parser.add_argument("--rows-per-attraction", type=int, default=4)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.requests, args.latency, args.rows_per_attraction))
+
+
+if __name__ == "__main__":
+    main()
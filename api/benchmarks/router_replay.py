@@ -0,0 +1,76 @@
+"""Replays a traffic log through QueryRouter and counts the trip extraction LLM calls it skips.
+
+Run from the api folder: python benchmarks/router_replay.py
+A log of one message per line can be replayed with --log, the built-in one mixes
+greetings, thanks, trip questions and follow-ups.
+"""
+import argparse
+import sys
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from components.router import QueryRouter  # noqa: E402
+
+# (message, whether it needs retrieval)
+traffic = [
+    ("سلام", False),
+    ("سلام خوبی؟", False),
+    ("سلام، وقت بخیر", False),
+    ("می‌خواهم یک سفر سه روزه به اصفهان برنامه‌ریزی کنم", True),
+    ("بهترین جاهای دیدنی شیراز کجاست؟", True),
+    ("سه روز", True),
+    ("شیراز چطور؟", True),
+    ("ممنون", False),
+    ("مرسی", False),
+    ("برای سفر به مشهد چه پیشنهادی داری؟", True),
+    ("رستوران‌های خوب تبریز را معرفی کن", True),
+    ("یک برنامه سفر یک هفته‌ای به شمال ایران می‌خواهم", True),
+    ("خیلی ممنون", False),
+    ("متشکرم", False),
+    ("دستت درد نکنه", False),
+    ("خداحافظ", False),
+    ("فعلا خداحافظ", False),
+    ("موزه‌های تهران کدامند؟", True),
+    ("با خانواده می‌خواهیم به یزد برویم", True),
+    ("چهار روز وقت داریم", True),
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--log", help="One message per line, replayed instead of the built-in traffic")
+    parser.add_argument("--threshold", type=float, default=0.6)
+    parser.add_argument("--extraction-mode", choices=["structured", "concurrent"], default="structured")
+    args = parser.parse_args()
+
+    if args.log:
+        with open(args.log, encoding="utf8") as log_file:
+            messages = [(line.strip(), None) for line in log_file if line.strip()]
+    else:
+        messages = traffic
+
+    router = QueryRouter(threshold=args.threshold)
+    skipped_travel = []
+    for message, needs_retrieval in messages:
+        if not router.needs_retrieval(message) and needs_retrieval:
+            skipped_travel.append(message)
+
+    # A structured extraction is one generation, a concurrent one three
+    calls_per_extraction = 1 if args.extraction_mode == "structured" else 3
+    routes = Counter(router.counts)
+    calls_without_router = len(messages) * calls_per_extraction
+    calls_with_router = (len(messages) - routes["skip"]) * calls_per_extraction
+
+    print(f"{len(messages)} messages, threshold {args.threshold}: "
+          + ", ".join(f"{route} {routes[route]}" for route in router.routes))
+    print(f"{args.extraction_mode} extraction LLM calls: {calls_without_router} without the router, "
+          f"{calls_with_router} with it ({calls_without_router - calls_with_router} skipped, "
+          f"{(calls_without_router - calls_with_router) / calls_without_router:.0%})")
+    if not args.log:
+        print(f"travel messages wrongly skipped: {len(skipped_travel)} {skipped_travel}")
+
+
+if __name__ == "__main__":
+    main()
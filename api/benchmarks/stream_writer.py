@@ -0,0 +1,77 @@
+"""Frames and CPU time of 100 concurrent token streams, one frame per token against the StreamWriter.
+
+Run from the api folder: python benchmarks/stream_writer.py
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from Utils.stream_writer import StreamWriter  # noqa: E402
+
+
+class CountingWebSocket:
+    """Stands in for a websocket, a send yields to the event loop like a socket write."""
+
+    def __init__(self) -> None:
+        self.frames = 0
+        self.bytes = 0
+
+    async def send_text(self, frame: str) -> None:
+        self.frames += 1
+        self.bytes += len(frame)
+        await asyncio.sleep(0)
+
+
+async def tokens(count: int, token_interval: float):
+    for i in range(count):
+        yield f"token{i} "
+        if i % 10 == 9:
+            # Tokens arrive in small bursts, like chunks read from the model's stream
+            await asyncio.sleep(token_interval * 10)
+
+
+async def per_token_stream(websocket: CountingWebSocket, count: int, token_interval: float) -> None:
+    async for token in tokens(count, token_interval):
+        await websocket.send_text(json.dumps({"type": "stream", "output": token}))
+    await websocket.send_text(json.dumps({"type": "end"}))
+
+
+async def writer_stream(websocket: CountingWebSocket, count: int, token_interval: float) -> None:
+    writer = StreamWriter(websocket)
+    writer.start()
+    async for token in tokens(count, token_interval):
+        await writer.stream(token)
+    await writer.send_json({"type": "end"})
+    await writer.close()
+
+
+async def run(stream, streams: int, count: int, token_interval: float) -> (int, float, float):
+    websockets = [CountingWebSocket() for _ in range(streams)]
+    started_at = time.perf_counter()
+    cpu_started_at = time.process_time()
+    await asyncio.gather(*(stream(websocket, count, token_interval) for websocket in websockets))
+    return (sum(websocket.frames for websocket in websockets),
+            time.perf_counter() - started_at,
+            time.process_time() - cpu_started_at)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--streams", type=int, default=100)
+    parser.add_argument("--tokens", type=int, default=500)
+    parser.add_argument("--token-interval", type=float, default=0.002, help="Seconds between tokens of a stream")
+    args = parser.parse_args()
+
+    for name, stream in (("per token", per_token_stream), ("StreamWriter", writer_stream)):
+        frames, seconds, cpu_seconds = asyncio.run(run(stream, args.streams, args.tokens, args.token_interval))
+        print(f"{name:>12}: {frames} frames in {seconds:.2f} s ({frames / seconds:.0f} frames/s), "
+              f"{cpu_seconds * 1000:.0f} ms CPU for {args.streams * args.tokens} tokens")
+
+
+if __name__ == "__main__":
+    main()
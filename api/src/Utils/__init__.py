@@ -1 +1 @@
-from .data_formatter import format_entries
+from .data_formatter import Attraction, format_entries, merge_entries, process_large_object
@@ -0,0 +1,81 @@
+import math
+import re
+from collections import defaultdict
+
+from .geospatial_square import calculate_square, haversine_distance
+
+
+class CityGazetteer:
+    """In-memory index of the City nodes: a name hash plus a lat/long grid."""
+
+    def __init__(self, cell_size_degrees: float = 0.5) -> None:
+        self.cell_size = cell_size_degrees
+        self._cities = []
+        self._ids_by_name = {}
+        self._grid = {}
+        self._name_pattern = None
+
+    def __len__(self) -> int:
+        return len(self._cities)
+
+    def _cell(self, latitude: float, longitude: float) -> (int, int):
+        return math.floor(latitude / self.cell_size), math.floor(longitude / self.cell_size)
+
+    def load(self, cities: [dict]) -> None:
+        """Build the index from City node properties, replacing the previous one in a single swap."""
+        records = []
+        ids_by_name = {}
+        grid = defaultdict(list)
+
+        for city in cities:
+            if city.get('Name') is None or city.get('lat') is None or city.get('long') is None:
+                continue
+
+            city_id = len(records)
+            records.append(city)
+            ids_by_name.setdefault(city['Name'], city_id)
+            grid[self._cell(city['lat'], city['long'])].append(city_id)
+
+        # Longest names first so "بندر عباس" wins over a shorter name it contains
+        names = sorted(ids_by_name, key=len, reverse=True)
+        name_pattern = re.compile(r"(?<!\w)(?:" + "|".join(map(re.escape, names)) + r")(?!\w)") if names else None
+
+        self._cities, self._ids_by_name, self._grid, self._name_pattern = records, ids_by_name, dict(grid), name_pattern
+
+    def get_city(self, city_name: str):
+        city_id = self._ids_by_name.get(city_name)
+        if city_id is None:
+            return None
+        return self._cities[city_id]
+
+    def mentioned_cities(self, text: str) -> [str]:
+        """Names of the known cities appearing in the text."""
+        if self._name_pattern is None:
+            return []
+        return self._name_pattern.findall(text)
+
+    def find_nearest_cities(self, city_name: str, distance_km: float = 30, limit: int = 10) -> [dict]:
+        city = self.get_city(city_name)
+        if city is None:
+            return []
+
+        latitude = city['lat']
+        longitude = city['long']
+        square_corners = calculate_square(latitude, longitude, distance_km=distance_km)
+
+        min_cell = self._cell(square_corners['min_lat'], square_corners['min_lon'])
+        max_cell = self._cell(square_corners['max_lat'], square_corners['max_lon'])
+
+        candidates = []
+        for lat_cell in range(min_cell[0], max_cell[0] + 1):
+            for lon_cell in range(min_cell[1], max_cell[1] + 1):
+                for city_id in self._grid.get((lat_cell, lon_cell), ()):
+                    candidate = self._cities[city_id]
+                    distance = haversine_distance(latitude, longitude, candidate['lat'], candidate['long'])
+                    if distance <= distance_km:
+                        candidates.append((distance, city_id))
+
+        candidates.sort()
+
+        # Same shape as the rows returned by the Cypher query
+        return [{'n': self._cities[city_id]} for _, city_id in candidates[:limit]]
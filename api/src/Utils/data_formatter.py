@@ -1,56 +1,86 @@
-from collections import defaultdict
-from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
 
 
-def format_entries(retrieved_items):
-    """Format the entries to combine redundant data."""
+@dataclass(slots=True)
+class Attraction:
+    """An attraction merged from all of its retrieved rows."""
+
+    name: str
+    city_name: str = ""
+    location: str = ""
+    url: str = ""
+    titles: List[str] = field(default_factory=list)
+    texts: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "n.name": self.name,
+            "n.city_name": self.city_name,
+            "n.titles": self.titles,
+            "n.texts": self.texts,
+            "n.location": self.location,
+            "n.url": self.url,
+        }
+
 
-    # Dictionary to store combined entries
-    combined_entries = defaultdict(lambda: {
-        "n.city_name": "",
-        "n.locations": [],
-        "n.titles": [],
-        "n.texts": [],
-        "n.urls": []
-    })
+def merge_entries(retrieved_items) -> List[Attraction]:
+    """Combine redundant rows into one Attraction per name in a single pass."""
+    attractions = {}
 
-    # Process each entry in the provided data
     for entry in retrieved_items:
         name = entry["n.name"]
 
-        # Combine city_name and locations
+        attraction = attractions.get(name)
+        if attraction is None:
+            attraction = attractions[name] = Attraction(name=name)
+
         if entry.get("n.city_name"):
-            combined_entries[name]["n.city_name"] = entry["n.city_name"]
-        if entry.get("n.location") and entry["n.location"] not in combined_entries[name]["n.locations"]:
-            combined_entries[name]["n.locations"].append(entry["n.location"])
+            attraction.city_name = entry["n.city_name"]
+
+        # Locations and URLs are de-duplicated, so the first one seen is kept
+        if entry.get("n.location") and not attraction.location:
+            attraction.location = entry["n.location"]
+        if entry.get("n.url") and not attraction.url:
+            attraction.url = entry["n.url"]
 
         # Combine titles and texts into lists
         if entry.get("n.title"):
-            combined_entries[name]["n.titles"].append(entry["n.title"])
+            attraction.titles.append(entry["n.title"])
         if entry.get("n.text"):
-            combined_entries[name]["n.texts"].append(entry["n.text"])
-
-        # Handle the URLs
-        if entry.get("n.url") and entry["n.url"] not in combined_entries[name]["n.urls"]:
-            combined_entries[name]["n.urls"].append(entry["n.url"])
-
-    # Resolve multiple locations/URLs if needed
-    for name, details in combined_entries.items():
-        if len(details["n.locations"]) > 1:
-            # Example: Choose the most common location
-            most_common_location = Counter(details["n.locations"]).most_common(1)[0][0]
-            details["n.location"] = most_common_location
-        else:
-            details["n.location"] = details["n.locations"][0] if details["n.locations"] else ""
-        details.pop("n.locations", None)
+            attraction.texts.append(entry["n.text"])
+
+    return list(attractions.values())
 
-        if len(details["n.urls"]) > 1:
-            # Example: Keep the first URL or all
-            details["n.url"] = details["n.urls"][0]  # or join as string, e.g., ", ".join(details["n.urls"])
+
+def format_entries(retrieved_items):
+    """Format the entries to combine redundant data."""
+    return [attraction.to_dict() for attraction in merge_entries(retrieved_items)]
+
+
+def apply_limitations(item: Attraction) -> Attraction:
+    num_texts = len(item.texts)
+    # Parameters
+    base_cutoff = 200  # Maximum characters when there is only one text
+    min_cutoff = 50  # Minimum characters allowed
+    reduction_factor = 10  # The reduction in character cutoff per additional text
+
+    # Calculate the character_cutoff dynamically
+    character_cutoff = max(min_cutoff, base_cutoff - num_texts * reduction_factor)
+
+    limited_texts = []
+    for text in item.texts:
+        if len(text) > character_cutoff:
+            limited_texts.append(text[:character_cutoff] + '...')
         else:
-            details["n.url"] = details["n.urls"][0] if details["n.urls"] else ""
-        details.pop("n.urls", None)
+            limited_texts.append(text)
+    item.texts = limited_texts
+
+    return item
 
-    final_data = [{"n.name": name, **details} for name, details in combined_entries.items()]
 
-    return final_data
+def process_large_object(data: List[Attraction]) -> List[Attraction]:
+    """
+    Processes a list of attractions by truncating long texts.
+    """
+    return [apply_limitations(item) for item in data]
@@ -0,0 +1,334 @@
+"""Batched, resumable, concurrent and incremental generation of attraction embeddings.
+
+Attractions are streamed from the attractions.parquet written by Utils.mapper,
+or a CSV with an attractionId column, and compared against a manifest of text
+hashes, so only new or changed ones are embedded. They are embedded in
+batches by concurrent requests under a rate limit, and each finished batch is
+checkpointed to disk; an interrupted run resumes from the checkpoints. Output
+is a float32 .npy matrix (with a sibling .ids.npy) or a Parquet file.
+"""
+import argparse
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+attraction_columns = ['attractionId', 'city_name', 'name', 'title', 'text']
+
+
+class RateLimiter:
+    """Spaces the start of requests evenly to stay under a requests per minute limit."""
+
+    def __init__(self, requests_per_minute: float = None) -> None:
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            if self._next_start > now:
+                await asyncio.sleep(self._next_start - now)
+            self._next_start = max(now, self._next_start) + self.interval
+
+
+def iter_attraction_chunks(file_name: str, columns: [str], chunksize: int = 10000):
+    """DataFrames of the given columns, those missing from the file are left out.
+
+    Reads the attractions.parquet written by Utils.mapper, or a CSV.
+    """
+    if file_name.endswith(".parquet"):
+        parquet_file = pq.ParquetFile(file_name)
+        columns = [column for column in columns if column in parquet_file.schema_arrow.names]
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+        return
+
+    yield from pd.read_csv(file_name, chunksize=chunksize, usecols=lambda column: column in columns)
+
+
+def iter_attraction_texts(file_name: str, build_text, chunksize: int = 10000):
+    """Yield (attractionId, text) without loading the whole file, build_text returns None to skip a row."""
+    for chunk in iter_attraction_chunks(file_name, attraction_columns, chunksize):
+        for attraction in chunk.to_dict('records'):
+            text = build_text(attraction)
+            if text is not None:
+                yield attraction['attractionId'], text
+
+
+def iter_batches(rows, batch_size: int):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def checkpoint_path(checkpoint_dir: str, index: int) -> str:
+    return os.path.join(checkpoint_dir, f"batch_{index:08d}.npz")
+
+
+def checkpoint_matches(path: str, ids: np.ndarray) -> bool:
+    """Whether the checkpoint holds exactly these ids, not a batch of another batch size or input."""
+    if not os.path.exists(path):
+        return False
+
+    with np.load(path) as checkpoint:
+        return np.array_equal(checkpoint['ids'], ids)
+
+
+async def embed_with_retries(embed_batch, texts: [str], rate_limiter: RateLimiter, retries: int = 3):
+    for attempt in range(retries):
+        await rate_limiter.wait()
+        try:
+            return await embed_batch(texts)
+        except Exception as e:
+            if attempt == retries - 1:
+                raise
+            print(f"embedding request failed, retrying: {e}")
+            await asyncio.sleep(2 ** attempt)
+
+
+async def generate_checkpoints(rows, embed_batch, checkpoint_dir: str, batch_size: int = 100,
+                               concurrency: int = 4, requests_per_minute: float = None) -> int:
+    """Embed every batch that has no checkpoint yet, returns the number of batches."""
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    rate_limiter = RateLimiter(requests_per_minute)
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = []
+
+    async def process(index: int, ids: np.ndarray, batch: [(int, str)]) -> None:
+        try:
+            vectors = await embed_with_retries(embed_batch, [text for _, text in batch], rate_limiter)
+            path = checkpoint_path(checkpoint_dir, index)
+            # Written under a temporary name so a crash never leaves a partial checkpoint
+            np.savez(path + ".tmp.npz", ids=ids, vectors=np.asarray(vectors, dtype=np.float32))
+            os.replace(path + ".tmp.npz", path)
+            print(f"embedded batch {index} ({len(batch)} attractions)")
+        finally:
+            semaphore.release()
+
+    index = -1
+    for index, batch in enumerate(iter_batches(rows, batch_size)):
+        ids = np.array([attraction_id for attraction_id, _ in batch], dtype=np.int64)
+        if checkpoint_matches(checkpoint_path(checkpoint_dir, index), ids):
+            continue
+
+        await semaphore.acquire()
+        tasks.append(asyncio.create_task(process(index, ids, batch)))
+
+    await asyncio.gather(*tasks)
+
+    return index + 1
+
+
+def collect_checkpoints(checkpoint_dir: str, batches: int = None) -> (np.ndarray, np.ndarray):
+    """Concatenate the checkpoints in batch order, None vectors when there are none.
+
+    Only the first batches checkpoints are read when given, the others were
+    left by an earlier run over more batches.
+    """
+    ids = []
+    vectors = []
+    if batches is None:
+        paths = sorted(glob.glob(os.path.join(checkpoint_dir, "batch_*[0-9].npz")))
+    else:
+        paths = [checkpoint_path(checkpoint_dir, index) for index in range(batches)]
+
+    for path in paths:
+        with np.load(path) as checkpoint:
+            ids.append(checkpoint['ids'])
+            vectors.append(checkpoint['vectors'])
+
+    if not ids:
+        return np.empty(0, dtype=np.int64), None
+
+    return np.concatenate(ids), np.vstack(vectors)
+
+
+def write_embeddings(output: str, ids: np.ndarray, vectors: np.ndarray) -> None:
+    if output.endswith(".parquet"):
+        table = pa.table({
+            'attractionId': ids,
+            'embedding': pa.FixedSizeListArray.from_arrays(pa.array(vectors.ravel()), vectors.shape[1]),
+        })
+        pq.write_table(table, output)
+        return
+
+    np.save(output, vectors)
+    np.save(ids_path(output), ids)
+
+
+def ids_path(output: str) -> str:
+    return os.path.splitext(output)[0] + ".ids.npy"
+
+
+def remove_embeddings(output: str) -> None:
+    paths = [output, ids_path(output)] if output.endswith(".npy") else [output]
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def read_embeddings(file_name: str) -> (np.ndarray, np.ndarray):
+    """Attraction ids and float32 vectors from a .npy, .parquet or legacy CSV embeddings file."""
+    if file_name.endswith(".npy"):
+        return np.load(ids_path(file_name)), np.load(file_name, mmap_mode='r')
+
+    ids = []
+    vectors = []
+    for chunk_ids, chunk_vectors in iter_embedding_chunks(file_name):
+        ids.append(chunk_ids)
+        vectors.append(chunk_vectors)
+
+    return np.concatenate(ids), np.vstack(vectors)
+
+
+def iter_embedding_chunks(file_name: str, chunksize: int = 10000):
+    """Yield (ids, float32 vectors) chunks of an embeddings file without loading it whole."""
+    if file_name.endswith(".npy"):
+        ids, vectors = np.load(ids_path(file_name), mmap_mode='r'), np.load(file_name, mmap_mode='r')
+        for start in range(0, len(ids), chunksize):
+            yield np.asarray(ids[start:start + chunksize]), np.asarray(vectors[start:start + chunksize])
+        return
+
+    if file_name.endswith(".parquet"):
+        parquet_file = pq.ParquetFile(file_name)
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=['attractionId', 'embedding']):
+            embeddings = batch.column('embedding')
+            vectors = embeddings.flatten().to_numpy(zero_copy_only=False).reshape(-1, embeddings.type.list_size)
+            yield batch.column('attractionId').to_numpy(), vectors.astype(np.float32, copy=False)
+        return
+
+    # The original scripts stored each vector as a stringified Python list
+    for chunk in pd.read_csv(file_name, chunksize=chunksize):
+        yield (chunk['attractionId'].to_numpy(dtype=np.int64),
+               np.array([json.loads(embedding) for embedding in chunk['embedding']], dtype=np.float32))
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf8')).hexdigest()
+
+
+def load_manifest(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+
+    with open(path, encoding='utf8') as manifest_file:
+        return json.load(manifest_file)
+
+
+def save_manifest(path: str, manifest: dict) -> None:
+    with open(path + ".tmp", 'w', encoding='utf8') as manifest_file:
+        json.dump(manifest, manifest_file)
+    os.replace(path + ".tmp", path)
+
+
+def diff_manifest(rows, manifest: dict) -> ([(int, str)], dict, [int]):
+    """Split rows into the new or changed ones, the updated manifest and the deleted attraction ids.
+
+    The manifest maps each attractionId to the hash of the exact text that was embedded.
+    """
+    changed = []
+    new_manifest = {}
+    for attraction_id, text in rows:
+        digest = text_hash(text)
+        new_manifest[str(attraction_id)] = digest
+        if manifest.get(str(attraction_id)) != digest:
+            changed.append((attraction_id, text))
+
+    deleted = [int(attraction_id) for attraction_id in manifest if attraction_id not in new_manifest]
+
+    return changed, new_manifest, deleted
+
+
+def merge_embeddings(output: str, delta_ids: np.ndarray, delta_vectors: np.ndarray, deleted: [int]) -> int:
+    """Apply the delta to the full output file, returns the number of embeddings written."""
+    if os.path.exists(output):
+        ids, vectors = read_embeddings(output)
+        # Copied, the file is about to be overwritten
+        ids, vectors = np.array(ids), np.array(vectors, dtype=np.float32)
+
+        keep = ~np.isin(ids, np.concatenate([delta_ids, np.asarray(deleted, dtype=np.int64)]))
+        ids, vectors = ids[keep], vectors[keep]
+
+        if delta_vectors is not None:
+            ids = np.concatenate([ids, delta_ids])
+            vectors = np.vstack([vectors, delta_vectors])
+    else:
+        ids, vectors = delta_ids, delta_vectors
+
+    if vectors is None:
+        return 0
+
+    write_embeddings(output, ids, vectors)
+    return len(ids)
+
+
+def run_cli(build_text, create_embed_batch, description: str = __doc__, default_concurrency: int = 4):
+    """Command line entry point shared by the embedding scripts.
+
+    build_text turns an attraction row into the text to embed, create_embed_batch
+    returns an async callable embedding a list of texts. Only attractions whose
+    text changed since the last run are embedded; they are written to the delta
+    file (deleted ids to <delta>.deleted.json) and merged into the output file.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--input', required=True, help="attractions.parquet written by Utils.mapper")
+    parser.add_argument('--output', required=True, help="Output .npy or .parquet file")
+    parser.add_argument('--delta', help="Defaults to <output>.delta.npy or <output>.delta.parquet")
+    parser.add_argument('--manifest', help="Defaults to <output>.manifest.json")
+    parser.add_argument('--checkpoint-dir', help="Defaults to <output>.checkpoints")
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=default_concurrency)
+    parser.add_argument('--requests-per-minute', type=float, default=None)
+    args = parser.parse_args()
+
+    stem, extension = os.path.splitext(args.output)
+    delta = args.delta or f"{stem}.delta{extension}"
+    manifest_path = args.manifest or f"{stem}.manifest.json"
+    checkpoint_dir = args.checkpoint_dir or args.output + ".checkpoints"
+
+    # Without the output file, the manifest says nothing about what is embedded
+    manifest = load_manifest(manifest_path) if os.path.exists(args.output) else {}
+    changed, new_manifest, deleted = diff_manifest(iter_attraction_texts(args.input, build_text), manifest)
+    print(f"{len(changed)} new or changed, {len(deleted)} deleted attractions")
+
+    batches = asyncio.run(generate_checkpoints(
+        changed,
+        create_embed_batch(),
+        checkpoint_dir,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        requests_per_minute=args.requests_per_minute,
+    ))
+
+    delta_ids, delta_vectors = collect_checkpoints(checkpoint_dir, batches)
+    if delta_vectors is not None:
+        write_embeddings(delta, delta_ids, delta_vectors)
+    else:
+        # The delta of the previous run would otherwise be applied again
+        remove_embeddings(delta)
+    with open(os.path.splitext(delta)[0] + ".deleted.json", 'w', encoding='utf8') as deleted_file:
+        json.dump(deleted, deleted_file)
+
+    total = merge_embeddings(args.output, delta_ids, delta_vectors, deleted)
+    save_manifest(manifest_path, new_manifest)
+
+    # The checkpoints belong to this delta only, a later run must not resume from them
+    shutil.rmtree(checkpoint_dir)
+
+    print(f"embedded {len(delta_ids)} attractions in {batches} batches, {total} embeddings in {args.output}")
@@ -16,3 +16,17 @@ def calculate_square(lat, lon, distance_km=20):
         "min_lon": top_left[1],
         "max_lon": bottom_right[1]
     }
+
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometers."""
+    earth_radius_km = 6371.0
+
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    delta_phi = math.radians(lat2 - lat1)
+    delta_lambda = math.radians(lon2 - lon1)
+
+    a = math.sin(delta_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
+
+    return 2 * earth_radius_km * math.asin(math.sqrt(a))
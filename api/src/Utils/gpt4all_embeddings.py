@@ -1,34 +1,28 @@
-import csv
-import pandas as pd
-from nomic import embed
-
+"""Embed the attractions mapped by Utils.mapper with the local nomic embedding model.
 
-def generate_embeddings(file_name, limit=None):
-    csvfile_out = open(file_name, 'w', encoding='utf8', newline='')
-    fieldnames = ['attractionId', 'embedding']
-    output_plot = csv.DictWriter(csvfile_out, fieldnames=fieldnames)
-    output_plot.writeheader()
+    python -m Utils.gpt4all_embeddings --input data/attractions.parquet --output attraction-embeddings.npy
+"""
+import asyncio
 
-    attractions_df = pd.read_csv('C:/Users/Abolfazl/OneDrive/Abolfazl/OneDrive/Desktop/Cities/attractions.csv')
+from nomic import embed
 
-    attractions = attractions_df[['attractionId', 'city_name', 'name', 'title', 'text']]
+from Utils.embedding_pipeline import run_cli
 
-    print(len(attractions))
 
-    for attraction in attractions.iterrows():
-        attraction = attraction[1]
-        print(attraction['title'])
+def build_text(attraction):
+    return f"{attraction['city_name']}, {attraction['name']}, {attraction['title']}: {attraction['text']}"
 
-        text = f"{attraction['city_name']}, {attraction['name']}, {attraction['title']}: {attraction['text']}"
 
-        embeddings = embed.text([text], model="nomic-embed-text-v1.5", inference_mode="local")['embeddings']
+def create_embed_batch(model="nomic-embed-text-v1.5"):
 
-        output_plot.writerow({
-            'attractionId': attraction['attractionId'],
-            'embedding': embeddings[0]
-        })
+    async def embed_batch(texts):
+        # Local inference is CPU bound, keep it off the event loop
+        embeddings = await asyncio.to_thread(embed.text, texts, model=model, inference_mode="local")
+        return embeddings['embeddings']
 
-    csvfile_out.close()
+    return embed_batch
 
 
-generate_embeddings('C:/Users/Abolfazl/OneDrive/Abolfazl/OneDrive/Desktop/Cities/attraction-embeddings.csv')
+if __name__ == "__main__":
+    # A single local model instance, batches are processed one at a time
+    run_cli(build_text, create_embed_batch, description=__doc__, default_concurrency=1)
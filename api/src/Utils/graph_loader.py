@@ -0,0 +1,218 @@
+"""Bulk load the City/Attraction CSVs and attraction embeddings into Neo4j.
+
+    python -m Utils.graph_loader --cities Cities.csv --attractions data/attractions.parquet \
+        --connections data/attraction_city_connections.parquet \
+        --embeddings attraction-embeddings-openai.npy --embedding-backend openai
+
+Files are streamed and written in batched UNWIND transactions. Cities and
+attractions load in parallel, then connections and embeddings. Every statement
+MERGEs on cityId/attractionId, so re-running the loader is idempotent.
+
+Cities loaded here get their point property. A graph whose cities were loaded
+before that can be migrated once with:
+
+    python -m Utils.graph_loader --backfill-points
+"""
+import argparse
+import asyncio
+import csv
+import os
+import time
+
+import pyarrow.parquet as pq
+
+from Utils.embedding_pipeline import iter_embedding_chunks
+from Utils.vector_index_loader import backends
+from wrapper.async_neo4j_wrapper import AsyncNeo4jDatabase
+from wrapper.neo4j_wrapper import upsert_embeddings_query, vector_index_names
+
+cities_query = """
+UNWIND $rows AS row
+MERGE (n:City {cityId: row.cityId})
+SET n += row
+SET n.point = CASE WHEN row.lat IS NULL OR row.long IS NULL THEN null
+    ELSE point({latitude: row.lat, longitude: row.long}) END
+"""
+
+attractions_query = """
+UNWIND $rows AS row
+MERGE (n:Attraction {attractionId: row.attractionId})
+SET n += row
+"""
+
+# Bounded so a large graph is migrated in many small transactions
+backfill_city_points_query = """
+MATCH (n:City)
+WHERE n.point IS NULL AND n.lat IS NOT NULL AND n.long IS NOT NULL
+WITH n LIMIT $limit
+SET n.point = point({latitude: n.lat, longitude: n.long})
+RETURN count(n) AS updated
+"""
+
+
+def connections_query(relationship: str) -> str:
+    # Relationship types can't be parameters
+    return f"""
+    UNWIND $rows AS row
+    MATCH (a:Attraction {{attractionId: row.attractionId}})
+    MATCH (c:City {{cityId: row.cityId}})
+    MERGE (a)-[:{relationship}]->(c)
+    """
+
+
+def to_int(value: str) -> int:
+    # pandas wrote some id columns as floats, e.g. "12.0"
+    return int(float(value))
+
+
+# Columns converted from the CSV strings, everything else is stored as text
+converters = {
+    'cityId': to_int,
+    'attractionId': to_int,
+    'lat': float,
+    'long': float,
+}
+
+
+def convert_row(row: dict) -> dict:
+    converted = {}
+    for column, value in row.items():
+        if value is None or value == '':
+            continue
+        converter = converters.get(column)
+        converted[column] = converter(value) if converter else value
+    return converted
+
+
+def iter_csv_batches(file_name: str, batch_size: int, columns: [str] = None):
+    """Yield batches of converted rows without loading the whole file, Parquet files are read as is."""
+    if file_name.endswith(".parquet"):
+        yield from iter_parquet_batches(file_name, batch_size, columns)
+        return
+
+    with open(file_name, encoding='utf8', newline='') as csv_file:
+        batch = []
+        for row in csv.DictReader(csv_file):
+            if columns is not None:
+                row = {column: row.get(column) for column in columns}
+            batch.append(convert_row(row))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def iter_parquet_batches(file_name: str, batch_size: int, columns: [str] = None):
+    parquet_file = pq.ParquetFile(file_name)
+    if columns is not None:
+        columns = [column for column in columns if column in parquet_file.schema_arrow.names]
+
+    for record_batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+        yield [
+            {column: value for column, value in row.items() if value is not None and value != ''}
+            for row in record_batch.to_pylist()
+        ]
+
+
+def iter_embedding_batches(file_name: str, batch_size: int):
+    for ids, vectors in iter_embedding_chunks(file_name, batch_size):
+        yield [
+            {"attractionId": int(attraction_id), "embedding": vector.tolist()}
+            for attraction_id, vector in zip(ids, vectors)
+        ]
+
+
+async def load_batches(database: AsyncNeo4jDatabase, label: str, query: str, batches, params: dict = None) -> int:
+    total = 0
+    started = time.perf_counter()
+
+    for rows in batches:
+        await database.execute_write(query, {"rows": rows, **(params or {})})
+        total += len(rows)
+
+    elapsed = time.perf_counter() - started
+    print(f"{label}: {total} rows in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.0f} rows/sec)")
+
+    return total
+
+
+async def backfill_city_points(database: AsyncNeo4jDatabase, batch_size: int) -> int:
+    total = 0
+    while True:
+        records = await database.execute_write(backfill_city_points_query, {"limit": batch_size})
+        updated = records[0]["updated"] if records else 0
+        if not updated:
+            break
+        total += updated
+
+    print(f"city points: {total} cities backfilled")
+
+    return total
+
+
+async def load_graph(database: AsyncNeo4jDatabase, args) -> None:
+    await database.ensure_indexes()
+
+    nodes = []
+    if args.cities:
+        nodes.append(load_batches(database, "cities", cities_query, iter_csv_batches(args.cities, args.batch_size)))
+    if args.attractions:
+        nodes.append(load_batches(
+            database, "attractions", attractions_query,
+            iter_csv_batches(args.attractions, args.batch_size,
+                             ['attractionId', 'city_name', 'name', 'location', 'text', 'title', 'url'])
+        ))
+    await asyncio.gather(*nodes)
+
+    # Both need the nodes above to exist
+    links = []
+    if args.connections:
+        links.append(load_batches(
+            database, "connections", connections_query(args.relationship),
+            iter_csv_batches(args.connections, args.batch_size, ['attractionId', 'cityId'])
+        ))
+    if args.embeddings:
+        model_name, dimensions = backends[args.embedding_backend]
+        await database.ensure_vector_index(model_name, dimensions)
+        _, property_name = vector_index_names(model_name)
+        links.append(load_batches(
+            database, "embeddings", upsert_embeddings_query,
+            iter_embedding_batches(args.embeddings, args.batch_size), {"property": property_name}
+        ))
+    await asyncio.gather(*links)
+
+    if args.backfill_points:
+        await backfill_city_points(database, args.batch_size)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cities', help="Cities.csv")
+    parser.add_argument('--attractions', help="attractions.csv or the Utils.mapper attractions.parquet")
+    parser.add_argument('--connections', help="attraction_city_connections .csv or .parquet")
+    parser.add_argument('--embeddings', help=".npy, .parquet or CSV embeddings file")
+    parser.add_argument('--embedding-backend', choices=backends.keys(), default='openai')
+    parser.add_argument('--relationship', default='LOCATED_IN', help="Attraction to City relationship type")
+    parser.add_argument('--backfill-points', action='store_true',
+                        help="Set the point of cities loaded without one, a one-off migration")
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    database = AsyncNeo4jDatabase(
+        host=os.getenv('NEO4J_URL'),
+        user=os.getenv('NEO4J_USER'),
+        password=os.getenv('NEO4J_PASS'),
+        database=os.getenv('NEO4J_DATABASE'),
+    )
+
+    try:
+        await load_graph(database, args)
+    finally:
+        await database.close()
+
+    print("done, call POST /refresh_cities on the API to reload its city index")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
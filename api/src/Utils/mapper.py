@@ -1,17 +1,125 @@
+"""Assign attraction ids and map every attraction to its city.
+
+    python -m Utils.mapper --attractions attractions.csv --cities Cities.csv --output data
+
+Attractions are streamed in chunks and joined against an in-memory
+{city name: cityId} dictionary, so memory stays flat however large the text
+corpus is. Writes <output>/attractions.parquet and
+<output>/attraction_city_connections.parquet; the input is never rewritten.
+
+Rows that already have an attractionId keep it. Others get a stable id hashed
+from city_name, name, title and the row's position among the rows sharing
+them, so re-running on a reordered or extended file doesn't renumber existing
+attractions. An attraction has a row per section and sections may share a
+title, the position tells them apart. The text is not part of the id, an edited
+section keeps its id and is updated in place by the loaders.
+"""
+import argparse
+import hashlib
+import os
+
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+attractions_output_name = "attractions.parquet"
+connections_output_name = "attraction_city_connections.parquet"
+
+connections_schema = pa.schema([('attractionId', pa.int64()), ('cityId', pa.int64())])
+
+
+def stable_id(city_name: str, name: str, title: str, position: int = 0) -> int:
+    key = "\x1f".join([city_name, name, title, str(position)]).encode('utf8')
+    # 63 bits so it fits Neo4j and int64 columns
+    return int.from_bytes(hashlib.sha256(key).digest()[:8], 'big') >> 1
+
+
+def assign_ids(chunk: pd.DataFrame, positions: dict) -> pd.Series:
+    """positions counts the rows seen so far per (city_name, name, title), across chunks."""
+    hashed = []
+    for key in zip(chunk['city_name'], chunk['name'], chunk['title']):
+        position = positions.get(key, 0)
+        positions[key] = position + 1
+        hashed.append(stable_id(*key, position))
+    ids = pd.Series(hashed, index=chunk.index, dtype='int64')
+
+    if 'attractionId' in chunk:
+        # Parsed one by one, going through float64 would round the 63-bit ids
+        existing = pd.to_numeric(chunk['attractionId'], errors='coerce').notna()
+        ids[existing] = [
+            int(value) if value.strip().lstrip('-').isdigit() else int(float(value))
+            for value in chunk['attractionId'][existing]
+        ]
+
+    return ids
+
+
+def load_city_ids(cities_file_name: str) -> dict:
+    cities = pd.read_csv(cities_file_name, usecols=['cityId', 'Name'])
+    return dict(zip(cities['Name'], cities['cityId'].astype('int64')))
+
+
+def map_attractions(attractions_file_name: str, cities_file_name: str, output_directory: str,
+                    chunksize: int = 50000) -> (int, int):
+    """Returns the number of attractions and of attraction to city connections written."""
+    city_ids = load_city_ids(cities_file_name)
+
+    columns = list(pd.read_csv(attractions_file_name, nrows=0).columns)
+    text_columns = [column for column in columns if column != 'attractionId']
+    for column in ['city_name', 'name', 'title', 'text']:
+        if column not in text_columns:
+            text_columns.append(column)
+
+    # Fixed schema, otherwise pandas infers a different one for chunks with empty columns
+    attractions_schema = pa.schema(
+        [('attractionId', pa.int64())] + [(column, pa.string()) for column in text_columns]
+    )
+
+    os.makedirs(output_directory, exist_ok=True)
+    attractions_writer = pq.ParquetWriter(os.path.join(output_directory, attractions_output_name), attractions_schema)
+    connections_writer = pq.ParquetWriter(os.path.join(output_directory, connections_output_name), connections_schema)
+
+    attractions = 0
+    connections = 0
+    positions = {}
+    try:
+        for chunk in pd.read_csv(attractions_file_name, chunksize=chunksize, dtype=str, keep_default_na=False):
+            for column in text_columns:
+                if column not in chunk:
+                    chunk[column] = ""
+
+            chunk['attractionId'] = assign_ids(chunk, positions)
+            attractions_writer.write_table(
+                pa.Table.from_pandas(chunk[attractions_schema.names], schema=attractions_schema, preserve_index=False)
+            )
+
+            city_id = chunk['city_name'].map(city_ids)
+            mapped = city_id.notna()
+            connections_writer.write_table(pa.table({
+                'attractionId': chunk['attractionId'][mapped].to_numpy(),
+                'cityId': city_id[mapped].astype('int64').to_numpy(),
+            }, schema=connections_schema))
+
+            attractions += len(chunk)
+            connections += int(mapped.sum())
+    finally:
+        attractions_writer.close()
+        connections_writer.close()
+
+    return attractions, connections
 
-# Load the CSV files into dataframes
-attractions_df = pd.read_csv('C:/Users/Abolfazl/OneDrive/Abolfazl/OneDrive/Desktop/شهر ها/attractions.csv')
 
-cities_df = pd.read_csv('C:/Users/Abolfazl/OneDrive/Abolfazl/OneDrive/Desktop/شهر ها//Cities.csv')
-attractions_df['attractionId'] = range(1, len(attractions_df) + 1)
-attractions_df.to_csv('C:/Users/Abolfazl/OneDrive/Abolfazl/OneDrive/Desktop/شهر ها/attractions.csv', index=False)
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--attractions', required=True, help="attractions.csv")
+    parser.add_argument('--cities', required=True, help="Cities.csv")
+    parser.add_argument('--output', required=True, help="Output directory")
+    parser.add_argument('--chunksize', type=int, default=50000)
+    args = parser.parse_args()
 
-# Merge the dataframes on the shared columns
-merged_df = pd.merge(attractions_df, cities_df, left_on='city_name', right_on='Name')
+    attractions, connections = map_attractions(args.attractions, args.cities, args.output, args.chunksize)
+    print(f"mapped {connections} of {attractions} attractions to a city")
 
-# Create the resulting dataframe with attractionId and cityId columns
-result_df = merged_df[['attractionId', 'cityId']]
 
-# Save the resulting dataframe to a new Excel file
-result_df.to_csv('C:/Users/Abolfazl/OneDrive/Abolfazl/OneDrive/Desktop/شهر ها/attraction_city_connections.csv', index=False)
+if __name__ == "__main__":
+    main()
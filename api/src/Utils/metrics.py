@@ -0,0 +1,70 @@
+from prometheus_client import Counter, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, REGISTRY
+
+# Answers take seconds, the buckets go up to a long GPT4All itinerary
+latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+
+stage_latency = Histogram(
+    'travel_adviser_stage_seconds',
+    'Latency of each stage of answering a question',
+    ['stage', 'model'],
+    buckets=latency_buckets,
+)
+
+time_to_first_token = Histogram(
+    'travel_adviser_time_to_first_token_seconds',
+    'Time from the start of a streamed generation to its first token',
+    ['model'],
+    buckets=latency_buckets,
+)
+
+inference_queue_wait = Histogram(
+    'travel_adviser_inference_queue_wait_seconds',
+    'Time a local generation waited for a model instance',
+    ['priority'],
+    buckets=latency_buckets,
+)
+
+inference_tokens_per_second = Histogram(
+    'travel_adviser_inference_tokens_per_second',
+    'Generation speed of each local inference job',
+    ['priority'],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+
+generated_tokens = Counter('travel_adviser_generated_tokens', 'Tokens generated by the LLMs', ['model'])
+
+neo4j_queries = Counter('travel_adviser_neo4j_queries', 'Cypher statements sent to Neo4j', ['access_mode'])
+
+
+class StatsCollector:
+    """Exposes the counters the caches, router and scheduler already keep, read only when scraped.
+
+    read_caches returns {cache name: (hits, misses)}. counters and gauges map a
+    metric name to (label name, callable returning {label value: value}).
+    """
+
+    def __init__(self, read_caches, counters: dict = None, gauges: dict = None) -> None:
+        self.read_caches = read_caches
+        self.counters = counters or {}
+        self.gauges = gauges or {}
+
+    def collect(self):
+        hits = CounterMetricFamily('travel_adviser_cache_hits', 'Cache hits', labels=['cache'])
+        misses = CounterMetricFamily('travel_adviser_cache_misses', 'Cache misses', labels=['cache'])
+        for name, (cache_hits, cache_misses) in self.read_caches().items():
+            hits.add_metric([name], cache_hits)
+            misses.add_metric([name], cache_misses)
+        yield hits
+        yield misses
+
+        for metrics, metric_family in ((self.counters, CounterMetricFamily), (self.gauges, GaugeMetricFamily)):
+            for name, (label, read_values) in metrics.items():
+                metric = metric_family(f'travel_adviser_{name}', name.replace('_', ' ').capitalize(), labels=[label])
+                for label_value, value in read_values().items():
+                    metric.add_metric([label_value], value)
+                yield metric
+
+
+def register_stats_collector(read_caches, counters: dict = None, gauges: dict = None) -> None:
+    REGISTRY.register(StatsCollector(read_caches, counters, gauges))
@@ -1,46 +1,36 @@
-import csv
+"""Embed the attractions mapped by Utils.mapper with OpenAI embeddings.
+
+    python -m Utils.openai_embeddings --input data/attractions.parquet --output attraction-embeddings-openai.npy
+"""
 import pandas as pd
-from openai import OpenAI
+from openai import AsyncOpenAI
 
-client = OpenAI()
+from Utils.embedding_pipeline import run_cli
 
 
 def is_invalid_text(value):
     return pd.isna(value) or value is None or value.strip() == ''
 
 
-def generate_embeddings(file_name):
-    csvfile_out = open(file_name, 'w', encoding='utf8', newline='')
-    fieldnames = ['attractionId', 'embedding']
-    output_plot = csv.DictWriter(csvfile_out, fieldnames=fieldnames)
-    output_plot.writeheader()
-
-    attractions_df = pd.read_csv('C:/Users/Abolfazl/OneDrive/Abolfazl/OneDrive/Desktop/Cities/attractions.csv')
-
-    attractions = attractions_df[['attractionId', 'city_name', 'name', 'title', 'text']]
-
-    print(len(attractions))
-
-    for attraction in attractions.iterrows():
-        attraction = attraction[1]
-        print(attraction['title'])
+def build_text(attraction):
+    if is_invalid_text(attraction['text']):
+        return None
 
-        if is_invalid_text(attraction['text']):
-            continue
+    attraction['text'] = (attraction['text'][:7500] + '..') if len(attraction['text']) > 7500 else attraction['text']
 
-        attraction['text'] = (attraction['text'][:7500] + '..') if len(attraction['text']) > 7500 else attraction['text']
+    return f"جاذبه گردشگری در شهر {attraction['city_name']} به نام {attraction['name']}. عنوان: {attraction['title']}. توضیحات: {attraction['text']}. این مکان یکی از بهترین جاهای دیدنی و تفریحی در {attraction['city_name']} است و می‌تواند گزینه مناسبی برای سفر شما باشد."
 
-        text = f"جاذبه گردشگری در شهر {attraction['city_name']} به نام {attraction['name']}. عنوان: {attraction['title']}. توضیحات: {attraction['text']}. این مکان یکی از بهترین جاهای دیدنی و تفریحی در {attraction['city_name']} است و می‌تواند گزینه مناسبی برای سفر شما باشد."
 
-        embedding = client.embeddings.create(input=[text], model="text-embedding-ada-002",)
-        embed = embedding.data[0].embedding
+def create_embed_batch(model="text-embedding-ada-002"):
+    client = AsyncOpenAI()
 
-        output_plot.writerow({
-            'attractionId': attraction['attractionId'],
-            'embedding': embed
-        })
+    async def embed_batch(texts):
+        # The embeddings endpoint accepts the whole batch in one request
+        embedding = await client.embeddings.create(input=texts, model=model)
+        return [data.embedding for data in embedding.data]
 
-    csvfile_out.close()
+    return embed_batch
 
 
-generate_embeddings('C:/Users/Abolfazl/OneDrive/Abolfazl/OneDrive/Desktop/Cities/attraction-embeddings-openai.csv')
+if __name__ == "__main__":
+    run_cli(build_text, create_embed_batch, description=__doc__)
@@ -0,0 +1,59 @@
+"""Pack an attraction embeddings file into a directory readable by wrapper.local_vector_store.
+
+    python -m Utils.pack_embeddings --embeddings attraction-embeddings-openai.npy \
+        --attractions data/attractions.parquet --output vector_store/openai
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from Utils.embedding_pipeline import iter_attraction_chunks, read_embeddings
+from wrapper.local_vector_store import metadata_file_name, vectors_file_name
+
+metadata_columns = ['attractionId', 'city_name', 'name', 'location', 'text', 'title', 'url']
+
+
+def pack_embeddings(ids: np.ndarray, vectors: np.ndarray, attractions_file_name: str, output_directory: str) -> int:
+    attractions = pd.concat(iter_attraction_chunks(attractions_file_name, metadata_columns), ignore_index=True)
+    attractions = attractions.drop_duplicates('attractionId').set_index('attractionId')
+
+    # Keep only embedded attractions that still exist
+    known = np.isin(ids, attractions.index.to_numpy())
+    ids = ids[known]
+    vectors = np.asarray(vectors[known], dtype=np.float32)
+
+    metadata = attractions.loc[ids].reset_index()
+    for column in metadata_columns:
+        if column not in metadata:
+            metadata[column] = ""
+    metadata = metadata[metadata_columns].fillna("")
+
+    # Sorting by city makes every city a contiguous partition
+    order = np.argsort(metadata['city_name'].to_numpy(dtype=str), kind='stable')
+    metadata = metadata.iloc[order].reset_index(drop=True)
+    vectors = vectors[order]
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    os.makedirs(output_directory, exist_ok=True)
+    np.save(os.path.join(output_directory, vectors_file_name), vectors.astype(np.float32))
+    metadata.to_parquet(os.path.join(output_directory, metadata_file_name), index=False)
+
+    return len(metadata)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--embeddings', required=True, help=".npy, .parquet or CSV embeddings file")
+    parser.add_argument('--attractions', required=True, help="attractions.parquet written by Utils.mapper")
+    parser.add_argument('--output', required=True, help="Directory of the packed store")
+    args = parser.parse_args()
+
+    ids, vectors = read_embeddings(args.embeddings)
+    count = pack_embeddings(ids, vectors, args.attractions, args.output)
+    print(f"packed {count} embeddings into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
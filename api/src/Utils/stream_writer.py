@@ -0,0 +1,140 @@
+import asyncio
+
+import orjson
+
+
+class StreamWriter:
+    """Per-connection websocket writer that coalesces streamed tokens.
+
+    Tokens are buffered and sent as one "stream" frame every flush_interval
+    seconds or flush_bytes bytes. Frames are encoded with orjson and written by
+    a single task reading a bounded queue, so generation never waits on the
+    socket: while the queue is full, tokens keep accumulating in the buffer.
+    Every frame goes through the queue, which keeps the frames of a request in
+    order. Tokens of concurrent requests are buffered separately and their
+    stream frames carry the request_id.
+    """
+
+    def __init__(self, websocket, flush_interval: float = 0.02, flush_bytes: int = 512, queue_size: int = 64) -> None:
+        self.websocket = websocket
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        # Tokens of every in-flight request, None for untagged ones
+        self._buffers = {}
+        self._buffer_bytes = {}
+        self._flush_handle = None
+        self._writer_task = None
+        self._error = None
+
+    def start(self) -> None:
+        if self._writer_task is None:
+            self._writer_task = asyncio.create_task(self._write_loop())
+
+    async def close(self) -> None:
+        """Send everything still buffered, then stop the writer task."""
+        if self._writer_task is None:
+            return
+
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        if not self._writer_task.done():
+            for request_id in list(self._buffers):
+                await self._put_buffer(request_id)
+            await self._queue.put(None)
+            await self._writer_task
+        self._writer_task = None
+
+    async def send_json(self, message: dict) -> None:
+        if self._error is not None:
+            raise self._error
+
+        # Buffered tokens of the same request were generated before this frame
+        await self._put_buffer(message.get("request_id"))
+        await self._queue.put(orjson.dumps(message, option=orjson.OPT_SERIALIZE_NUMPY).decode())
+
+    async def stream(self, token: str, request_id: str = None) -> None:
+        self.stream_nowait(token, request_id)
+
+    def stream_nowait(self, token: str, request_id: str = None) -> None:
+        """Buffer a token, must be called from the event loop thread."""
+        if self._error is not None:
+            raise self._error
+
+        self._buffers.setdefault(request_id, []).append(token)
+        self._buffer_bytes[request_id] = self._buffer_bytes.get(request_id, 0) + len(token.encode())
+
+        if self._buffer_bytes[request_id] >= self.flush_bytes:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.flush_interval, self._on_timer)
+
+    def _take_buffer(self, request_id: str) -> str:
+        tokens = self._buffers.pop(request_id, None)
+        self._buffer_bytes.pop(request_id, None)
+        if not tokens:
+            return None
+
+        message = {"type": "stream", "output": "".join(tokens)}
+        if request_id is not None:
+            message["request_id"] = request_id
+        return orjson.dumps(message).decode()
+
+    async def _put_buffer(self, request_id: str) -> None:
+        frame = self._take_buffer(request_id)
+        if frame is not None:
+            await self._queue.put(frame)
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        for request_id in list(self._buffers):
+            if self._queue.full():
+                # Slow client, keep coalescing until the writer catches up
+                self._flush_handle = asyncio.get_running_loop().call_later(self.flush_interval, self._on_timer)
+                return
+
+            frame = self._take_buffer(request_id)
+            if frame is not None:
+                self._queue.put_nowait(frame)
+
+    def _on_timer(self) -> None:
+        self._flush_handle = None
+        self._flush()
+
+    async def _write_loop(self) -> None:
+        while True:
+            frame = await self._queue.get()
+            if frame is None:
+                return
+
+            try:
+                await self.websocket.send_text(frame)
+            except Exception as e:
+                # Usually a disconnect, the next send or stream call raises it
+                self._error = e
+                # Unblock senders waiting on a full queue, nothing will be written anymore
+                while not self._queue.empty():
+                    self._queue.get_nowait()
+                return
+
+
+class StreamChannel:
+    """The frames of one request over a shared StreamWriter, tagged with its request_id."""
+
+    def __init__(self, writer: StreamWriter, request_id: str) -> None:
+        self.writer = writer
+        self.request_id = request_id
+
+    async def send_json(self, message: dict) -> None:
+        await self.writer.send_json({**message, "request_id": self.request_id})
+
+    async def stream(self, token: str) -> None:
+        self.writer.stream_nowait(token, self.request_id)
+
+    def stream_nowait(self, token: str) -> None:
+        self.writer.stream_nowait(token, self.request_id)
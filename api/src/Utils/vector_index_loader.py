@@ -0,0 +1,59 @@
+"""Load an attraction embeddings file into the Neo4j vector index of its model.
+
+    python -m Utils.vector_index_loader --backend openai --embeddings attraction-embeddings-openai.npy
+"""
+import argparse
+import asyncio
+import os
+
+from Utils.embedding_pipeline import iter_embedding_chunks
+from wrapper.async_neo4j_wrapper import AsyncNeo4jDatabase
+
+# Embedding model and dimensions written by each embedding script
+backends = {
+    'openai': ('text-embedding-ada-002', 1536),
+    'gpt4all': ('nomic-embed-text-v1.5', 768),
+}
+
+
+async def load_embeddings(database: AsyncNeo4jDatabase, file_name: str, model_name: str, dimensions: int,
+                          batch_size: int = 500) -> int:
+    await database.ensure_vector_index(model_name, dimensions)
+
+    total = 0
+    for ids, vectors in iter_embedding_chunks(file_name, batch_size):
+        rows = [
+            {"attractionId": int(attraction_id), "embedding": vector.tolist()}
+            for attraction_id, vector in zip(ids, vectors)
+        ]
+        await database.upsert_embeddings(model_name, rows)
+
+        total += len(rows)
+        print(f"loaded {total} embeddings")
+
+    return total
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--backend', choices=backends.keys(), required=True)
+    parser.add_argument('--embeddings', required=True, help=".npy, .parquet or CSV embeddings file")
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    database = AsyncNeo4jDatabase(
+        host=os.getenv('NEO4J_URL'),
+        user=os.getenv('NEO4J_USER'),
+        password=os.getenv('NEO4J_PASS'),
+        database=os.getenv('NEO4J_DATABASE'),
+    )
+
+    model_name, dimensions = backends[args.backend]
+    try:
+        await load_embeddings(database, args.embeddings, model_name, dimensions, args.batch_size)
+    finally:
+        await database.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,2 +1,2 @@
 from .base_component import BaseComponent
-from .classifier import is_travel_related_query
+from .classifier import classify_batch, is_travel_related_query
@@ -1,7 +1,22 @@
+"""Intent classifier used to tell travel questions apart from small talk.
+
+The TF-IDF + LogisticRegression pipeline is trained offline and loaded from
+disk on first use:
+
+    python -m components.classifier --output components/intent_classifier.joblib
+
+When the file is missing the pipeline is trained in process instead.
+"""
+import argparse
+import os
+import re
+
+import joblib
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
 from sklearn.pipeline import make_pipeline
-import numpy as np
+
+model_path = os.path.join(os.path.dirname(__file__), "intent_classifier.joblib")
 
 training_data = [
     ("من می‌خواهم به شیراز بروم. چه جاهایی را پیشنهاد می‌دهید؟", "attraction_query"),
@@ -47,6 +62,13 @@ training_data = [
     ("خداحافظ", "farewell"),
     ("متشکرم", "thanks"),
     ("مرسی", "thanks"),
+    ("سلام خوبی؟", "greeting"),
+    ("سلام، وقت بخیر", "greeting"),
+    ("ممنون", "thanks"),
+    ("خیلی ممنون", "thanks"),
+    ("ممنون از راهنمایی‌ات", "thanks"),
+    ("دستت درد نکنه", "thanks"),
+    ("فعلا خداحافظ", "farewell"),
     ("ببخشید", "apology"),
     ("کمک", "help"),
     ("لطفا", "request"),
@@ -61,30 +83,74 @@ training_data = [
     ("دیدنی‌های تبریز", "attraction_query"),
 ]
 
-training_texts, training_labels = zip(*training_data)
+attraction_keywords = ["جاهای دیدنی", "جاذبه‌ها", "جاذبه", "مکان‌های دیدنی", "رستوران", "بازار", "موزه", "هتل", "پارک", "باغ", "مراکز خرید"]
 
-pipeline = make_pipeline(TfidfVectorizer(stop_words='english'), LogisticRegression(max_iter=1000))
+# One pass over the text instead of one substring search per keyword
+attraction_pattern = re.compile("|".join(re.escape(keyword) for keyword in attraction_keywords))
 
-pipeline.fit(training_texts, training_labels)
+travel_intents = {"attraction_query", "plan_trip"}
 
-attraction_keywords = ["جاهای دیدنی", "جاذبه‌ها", "جاذبه", "مکان‌های دیدنی", "رستوران", "بازار", "موزه", "هتل", "پارک", "باغ", "مراکز خرید"]
+_pipeline = None
 
 
-def is_travel_related_query(user_input):
-    for keyword in attraction_keywords:
-        if keyword in user_input:
-            return True
+def train_pipeline():
+    training_texts, training_labels = zip(*training_data)
 
-    proba = pipeline.predict_proba([user_input])
-    intent = pipeline.predict([user_input])[0]
+    # Most intents have only a few examples, with the default C=1 no intent gets a confident probability
+    pipeline = make_pipeline(TfidfVectorizer(stop_words='english'), LogisticRegression(max_iter=1000, C=10))
+    pipeline.fit(training_texts, training_labels)
 
-    threshold = 0.6
-    dynamic_threshold = max(threshold, np.mean(proba[0]))
+    return pipeline
 
-    if max(proba[0]) < dynamic_threshold:
-        return False
 
-    if intent in ["attraction_query", "plan_trip"]:
+def load_pipeline(path: str = model_path):
+    global _pipeline
+    if _pipeline is None:
+        if os.path.exists(path):
+            _pipeline = joblib.load(path)
+        else:
+            print(f"{path} not found, training the intent classifier in process")
+            _pipeline = train_pipeline()
+
+    return _pipeline
+
+
+def classify_batch(texts: [str]) -> [(str, float)]:
+    """Most likely intent and its probability for every text, in one vectorized call."""
+    pipeline = load_pipeline()
+    proba = pipeline.predict_proba(list(texts))
+    best = proba.argmax(axis=1)
+
+    return [(pipeline.classes_[index], float(proba[row, index])) for row, index in enumerate(best)]
+
+
+def has_attraction_keyword(user_input: str) -> bool:
+    return attraction_pattern.search(user_input) is not None
+
+
+def is_travel_related_query(user_input, threshold: float = 0.6):
+    if has_attraction_keyword(user_input):
         return True
 
-    return False
+    intent, probability = classify_batch([user_input])[0]
+
+    # Never below chance level, the mean probability over all intents
+    dynamic_threshold = max(threshold, 1 / len(load_pipeline().classes_))
+
+    if probability < dynamic_threshold:
+        return False
+
+    return intent in travel_intents
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the intent classifier and save it to disk")
+    parser.add_argument('--output', default=model_path)
+    args = parser.parse_args()
+
+    joblib.dump(train_pipeline(), args.output)
+    print(f"saved the intent classifier to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
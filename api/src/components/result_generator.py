@@ -7,58 +7,25 @@ from langchain_core.prompts.chat import MessagesPlaceholder
 from llm.basellm import BaseLLM
 from llm.OpenAI import ChatOpenAIChat
 from llm.GPT4ALL import Gpt4AllChat
+from Utils.data_formatter import Attraction
+from Utils.metrics import stage_latency
 from .base_component import BaseComponent
 
 
-def apply_limitations(item):
-    if 'n.texts' in item:
-        num_texts = len(item['n.texts'])
-        # Parameters
-        base_cutoff = 200  # Maximum characters when there is only one text
-        min_cutoff = 50  # Minimum characters allowed
-        reduction_factor = 10  # The reduction in character cutoff per additional text
+def format_similars(similars: List[Attraction]):
+    # Texts are already truncated by process_large_object when the similars are retrieved
+    formatted_similars = []
 
-        # Calculate the character_cutoff dynamically
-        character_cutoff = max(min_cutoff, base_cutoff - num_texts * reduction_factor)
+    for counter, place in enumerate(similars, start=1):
+        description = " ".join(place.texts)
 
-        limited_texts = []
-        for text in item['n.texts']:
-            if len(text) > character_cutoff:
-                limited_texts.append(text[:character_cutoff] + '...')
-            else:
-                limited_texts.append(text)
-        item['n.texts'] = limited_texts
+        formatted_similars.append(
+            f"{counter}. **{place.name}** - **{place.city_name}**:\n"
+            f"   - **توضیحات**: {description}... [اطلاعات بیشتر]({place.url})\n"
+            f"   - **موقعیت مکانی**: [مشاهده روی نقشه]({place.location})\n\n"
+        )
 
-    return item
-
-
-def process_large_object(data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """
-    Processes a list of dictionaries by removing large lists and truncating long strings.
-    """
-    return [apply_limitations(item) for item in data]
-
-
-def format_similars(similars):
-    similars = process_large_object(similars)
-
-    formatted_similars = ''
-    counter = 1
-
-    for place in similars:
-        name = place.get('n.name', 'مکان نامشخص')
-        city = place.get('n.city_name', 'شهر نامشخص')
-        description = " ".join(place.get('n.texts', ['توضیحاتی در دسترس نیست']))
-        location_url = place.get('n.location', 'موقعیت مکانی در دسترس نیست')
-        more_info_url = place.get('n.url', 'اطلاعات بیشتری در دسترس نیست')
-
-        formatted_similars += f"{counter}. **{name}** - **{city}**:\n"
-        formatted_similars += f"   - **توضیحات**: {description}... [اطلاعات بیشتر]({more_info_url})\n"
-        formatted_similars += f"   - **موقعیت مکانی**: [مشاهده روی نقشه]({location_url})\n\n"
-
-        counter += 1
-
-    return formatted_similars
+    return ''.join(formatted_similars)
 
 
 class ResultGenerator(BaseComponent):
@@ -162,10 +129,12 @@ class ResultGenerator(BaseComponent):
             similars: List[Dict[str, Any]]
     ) -> [str]:
 
-        formatted_similars = format_similars(similars)
+        with stage_latency.labels('format_similars', self.llm.model_name).time():
+            formatted_similars = format_similars(similars)
 
         prompt = self.generate_prompt()
 
-        output = await self.llm.generate_streaming(question, session_id, formatted_similars, prompt)
+        with stage_latency.labels('generation', self.llm.model_name).time():
+            output = await self.llm.generate_streaming(question, session_id, formatted_similars, prompt)
 
         return "".join(output)
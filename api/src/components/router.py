@@ -0,0 +1,41 @@
+from .classifier import classify_batch, has_attraction_keyword, travel_intents
+
+
+class QueryRouter:
+    """Decides whether a question needs trip extraction and attraction retrieval.
+
+    Only questions the intent classifier confidently puts outside travel, like
+    greetings and thanks, are skipped. Questions no intent is confident about,
+    travel or not, still go through retrieval, so short follow-ups of a trip
+    conversation keep working.
+    """
+
+    routes = ("keyword", "travel", "uncertain", "skip")
+
+    def __init__(self, threshold: float = 0.6) -> None:
+        # Minimum probability of the top intent to route on it, above 1 never skips
+        self.threshold = threshold
+        self.counts = {route: 0 for route in self.routes}
+
+    def route(self, question: str) -> str:
+        if has_attraction_keyword(question):
+            route = "keyword"
+        else:
+            intent, probability = classify_batch([question])[0]
+
+            if probability < self.threshold:
+                route = "uncertain"
+            elif intent in travel_intents:
+                route = "travel"
+            else:
+                route = "skip"
+
+        self.counts[route] += 1
+
+        return route
+
+    def needs_retrieval(self, question: str) -> bool:
+        return self.route(question) != "skip"
+
+    def stats(self) -> dict:
+        return {"threshold": self.threshold, **self.counts}
@@ -1,4 +1,6 @@
 from typing import Any
+import asyncio
+import json
 import random
 
 from langchain_core.prompts import PromptTemplate, ChatPromptTemplate
@@ -7,10 +9,14 @@ from langchain_core.prompts.chat import MessagesPlaceholder
 from components.base_component import BaseComponent
 from llm.basellm import BaseLLM
 from embedding.base_embedding import BaseEmbedding
-from wrapper.neo4j_wrapper import Neo4jDatabase
-from Utils.data_formatter import format_entries
+from wrapper.async_neo4j_wrapper import AsyncNeo4jDatabase
+from Utils.data_formatter import merge_entries, process_large_object
+from Utils.metrics import stage_latency
+from wrapper.attraction_cache import AttractionCache
+from wrapper.local_vector_store import LocalVectorStore
 
-from .classifier import is_travel_related_query
+from .router import QueryRouter
+from .trip_state import TripStateStore
 
 
 def validate_user_trip_information(city_name: str, mentioned_city_in_question: str, stay_duration: str) -> (int, str):
@@ -30,6 +36,28 @@ def validate_user_trip_information(city_name: str, mentioned_city_in_question: s
     return stay_duration, city_name
 
 
+def parse_trip_information(text: str) -> dict:
+    """Parse the JSON object of a structured trip extraction, None when it is malformed."""
+    start = text.find("{")
+    end = text.rfind("}")
+    if start == -1 or end < start:
+        return None
+
+    try:
+        data = json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+
+    if not isinstance(data, dict):
+        return None
+
+    # validate_user_trip_information works on the raw string answers
+    return {
+        key: str(data[key]).strip() if data.get(key) is not None else None
+        for key in ("city", "stay_duration", "mentioned_city")
+    }
+
+
 def create_prompt(use_history: bool):
     if use_history:
         messages = [
@@ -48,12 +76,72 @@ def create_prompt(use_history: bool):
 
 
 class Neo4jSimilarity(BaseComponent):
-    def __init__(self, database: Neo4jDatabase, embedder: BaseEmbedding, llm: BaseLLM) -> None:
+    def __init__(
+            self,
+            database: AsyncNeo4jDatabase,
+            embedder: BaseEmbedding,
+            llm: BaseLLM,
+            extraction_mode: str = "structured",
+            attraction_cache: AttractionCache = None,
+            retrieval_mode: str = "random",
+            vector_store: LocalVectorStore = None,
+            router: QueryRouter = None,
+            trip_states: TripStateStore = None
+    ) -> None:
         self.database = database
+        # Skips extraction and retrieval for small talk
+        self.router = router
+        self.attraction_cache = attraction_cache
+        # "random": sample the attractions of the nearby cities, "vector": rank them against the question
+        # with the embeddings stored in Neo4j, "local": rank them with the in-process vector store
+        self.retrieval_mode = retrieval_mode
+        self.vector_store = vector_store
         self.embedder = embedder
         self.llm = llm
+        # "structured": one JSON generation, "concurrent": three generations run together
+        self.extraction_mode = extraction_mode
+        # Last extracted trip of every session, reused while new messages can't change it
+        self.trip_states = trip_states
 
     async def get_user_trip_information(self, question: str, session_id: str, ) -> (int, str):
+        if self.trip_states is None:
+            return await self.extract_trip_information(question, session_id)
+
+        state = self.trip_states.get(session_id, question)
+        if state is not None:
+            return state.stay_duration, state.city_name
+
+        stay_duration, city_name = await self.extract_trip_information(question, session_id)
+        self.trip_states.set(session_id, stay_duration, city_name)
+
+        return stay_duration, city_name
+
+    async def extract_trip_information(self, question: str, session_id: str) -> (int, str):
+        if self.extraction_mode == "structured":
+            trip_information = await self.extract_structured_trip_information(question, session_id)
+
+            if trip_information is not None:
+                return validate_user_trip_information(trip_information["city"],
+                                                      trip_information["mentioned_city"],
+                                                      trip_information["stay_duration"])
+
+        return await self.extract_concurrent_trip_information(question, session_id)
+
+    async def extract_structured_trip_information(self, question: str, session_id: str) -> dict:
+        trip_information_question = f"""بر اساس آخرین مکالمه و پیام جدید کاربر، اطلاعات سفر را فقط و فقط به صورت یک شیء JSON با کلیدهای "city"، "stay_duration" و "mentioned_city" بنویس و هیچ متن دیگری ننویس.
+city: نام آخرین شهر مقصد مورد نظر کاربر در مکالمه.
+stay_duration: آخرین تعداد روز اعلام شده برای سفر فقط به صورت عدد ریاضی، مثل 2 یا 3.
+mentioned_city: اگر در پیام جدید تنها نام یک شهر ذکر شده باشد، فقط نام آن شهر. اگر بیش از یک شهر ذکر شده یا هیچ شهری ذکر نشده، 'نمیدانم'.
+برای هر مقداری که مطمئن نیستی یا نمی‌دانی، فقط 'نمیدانم' بنویس.
+پیام جدید: {question}"""
+
+        prompt = create_prompt(use_history=True)
+        response = await self.llm.generate_streaming(trip_information_question, session_id, None, prompt, False,
+                                                     use_history=True, save_conversation=False, json_mode=True)
+
+        return parse_trip_information(response)
+
+    async def extract_concurrent_trip_information(self, question: str, session_id: str) -> (int, str):
         use_history = True
         # Questions that need chat history
         city_name_question = "بر اساس آخرین مکالمه، آخرین مقصد مورد نظر کاربر کجاست؟ فقط نام آخرین شهر را بنویس. اگر مطمئن نیستی یا نمی‌دانی، فقط 'نمیدانم' بنویس."
@@ -63,17 +151,19 @@ class Neo4jSimilarity(BaseComponent):
         mentioned_city_name_question = f"در متن زیر که متن کاربر است، اگر تنها نام یک شهر ذکر شده باشد، فقط نام آن شهر را بنویس. اگر بیش از یک شهر ذکر شده یا هیچ شهری ذکر نشده، یا اگر مطمئن نیستی، کلمه 'نمیدانم' را بنویس.متن: {question}"
 
         prompt = create_prompt(use_history)
-        # Generate responses with history
-        city_name = await self.llm.generate_streaming(city_name_question, session_id, None, prompt, False,
-                                                      use_history=use_history, save_conversation=False)
-        stay_duration = await self.llm.generate_streaming(stay_duration_question, session_id, None, prompt, False,
-                                                          use_history=use_history, save_conversation=False)
-
-        use_history = False
-        prompt = create_prompt(use_history)
-        # Generate response without history
-        mentioned_city_in_question = await self.llm.generate_streaming(mentioned_city_name_question, session_id, None,
-                                                                       prompt, use_history, use_history=False)
+        no_history_prompt = create_prompt(False)
+
+        # The three questions are independent, so they are generated concurrently
+        city_name, stay_duration, mentioned_city_in_question = await asyncio.gather(
+            # Generate responses with history
+            self.llm.generate_streaming(city_name_question, session_id, None, prompt, False,
+                                        use_history=use_history, save_conversation=False),
+            self.llm.generate_streaming(stay_duration_question, session_id, None, prompt, False,
+                                        use_history=use_history, save_conversation=False),
+            # Generate response without history
+            self.llm.generate_streaming(mentioned_city_name_question, session_id, None,
+                                        no_history_prompt, False, use_history=False),
+        )
 
         stay_duration, city_name = validate_user_trip_information(city_name, mentioned_city_in_question, stay_duration)
 
@@ -81,10 +171,12 @@ class Neo4jSimilarity(BaseComponent):
 
     async def run_async(self, question: str, session_id: str, similars=None) -> Any:
 
-        # if is_attraction_query(question) is False:
-        #     return []
+        if self.router is not None and not self.router.needs_retrieval(question):
+            await self.llm.websocket.send_json({"type": "debug", "detail": "not a travel question, skipped retrieval"})
+            return []
 
-        stay_duration, city_name = await self.get_user_trip_information(question, session_id)
+        with stage_latency.labels('trip_extraction', self.llm.model_name).time():
+            stay_duration, city_name = await self.get_user_trip_information(question, session_id)
 
         if city_name is None:
             return []
@@ -94,7 +186,8 @@ class Neo4jSimilarity(BaseComponent):
 
         await self.llm.websocket.send_json({"type": "debug", "detail": f"recognized city: {city_name}, stay_duration: {stay_duration}"})
 
-        nearest_cities = self.database.find_nearest_cities(city_name)
+        with stage_latency.labels('nearest_cities', self.llm.model_name).time():
+            nearest_cities = await self.database.find_nearest_cities(city_name)
 
         if not nearest_cities:
             await self.llm.websocket.send_json(
@@ -103,15 +196,36 @@ class Neo4jSimilarity(BaseComponent):
 
         city_names = [city['n']['Name'] for city in nearest_cities]
 
-        # question_embedding = await self.embedder.embed_query(question)
-
-        retrieved_items = self.database.get_attractions(city_names=city_names)
+        if self.retrieval_mode in ("vector", "local"):
+            with stage_latency.labels('vector_search', self.llm.model_name).time():
+                return await self.get_similar_attractions(question, city_names, limit=stay_duration * 2)
 
-        contents = format_entries(retrieved_items)
+        with stage_latency.labels('attractions', self.llm.model_name).time():
+            if self.attraction_cache is not None:
+                contents = await self.attraction_cache.get_attractions(city_names)
+            else:
+                retrieved_items = await self.database.get_attractions(city_names=city_names)
+                with stage_latency.labels('format_entries', self.llm.model_name).time():
+                    contents = process_large_object(merge_entries(retrieved_items))
 
         random_contents = random.sample(contents, min(len(contents), stay_duration * 2))
 
         return random_contents
 
+    async def get_similar_attractions(self, question: str, city_names: [str], limit: int) -> Any:
+        question_embedding = await self.embedder.embed_query(question)
+
+        # Rows come back ordered by score, merging keeps the first occurrence of each name
+        if self.retrieval_mode == "local":
+            retrieved_items = await self.vector_store.get_similar_attractions(
+                question_embedding, city_names, limit=limit * 5
+            )
+        else:
+            retrieved_items = await self.database.get_similar_attractions(
+                self.embedder.model, question_embedding, city_names, limit=limit * 5
+            )
+
+        return process_large_object(merge_entries(retrieved_items))[:limit]
+
     def run(self, question: str, session_id: str, similars=None) -> Any:
         pass
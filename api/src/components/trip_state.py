@@ -0,0 +1,62 @@
+import re
+from dataclasses import dataclass
+
+from Utils.city_gazetteer import CityGazetteer
+from Utils.lru_cache import LRUCache
+
+# Latin, Persian and Arabic-Indic digits
+digit_pattern = re.compile(r"[0-9۰-۹٠-٩]")
+
+# Stay durations are often written out, "نه" and "یه" also match unrelated words, which only costs an extraction
+number_words = ["یک", "یه", "دو", "سه", "چهار", "پنج", "شش", "هفت", "هشت", "نه", "ده", "هفته", "آخر هفته", "ماه"]
+number_word_pattern = re.compile(r"(?<!\w)(?:" + "|".join(map(re.escape, number_words)) + r")(?!\w)")
+
+
+@dataclass(slots=True)
+class TripState:
+    city_name: str = None
+    stay_duration: int = 0
+
+
+class TripStateStore:
+    """Last extracted (city, stay_duration) of every session.
+
+    The extraction LLM calls only need to run again when a new message may
+    change the trip, i.e. when it mentions a known city or a number.
+    """
+
+    def __init__(self, gazetteer: CityGazetteer, maxsize: int = 10000, ttl: float = None) -> None:
+        self.gazetteer = gazetteer
+        self._states = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.reused = 0
+        self.extracted = 0
+
+    def may_change_trip(self, question: str) -> bool:
+        return (
+            digit_pattern.search(question) is not None
+            or number_word_pattern.search(question) is not None
+            or bool(self.gazetteer.mentioned_cities(question))
+        )
+
+    def get(self, session_id: str, question: str) -> TripState:
+        """The cached state when the question can't change it, None when extraction has to run."""
+        state = self._states.get(session_id)
+        if state is None or self.may_change_trip(question):
+            self.extracted += 1
+            return None
+
+        self.reused += 1
+        return state
+
+    def set(self, session_id: str, stay_duration: int, city_name: str) -> None:
+        if city_name is None:
+            self._states.pop(session_id)
+            return
+
+        self._states.set(session_id, TripState(city_name=city_name, stay_duration=stay_duration))
+
+    def clear(self, session_id: str) -> None:
+        self._states.pop(session_id)
+
+    def stats(self) -> dict:
+        return {"reused": self.reused, "extracted": self.extracted, "size": len(self._states)}
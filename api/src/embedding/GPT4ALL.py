@@ -1,10 +1,84 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
 from nomic import embed
 from .base_embedding import BaseEmbedding
 
 
+def embed_texts(texts: [str], model: str) -> [[float]]:
+    # Runs in a worker process, each worker keeps its own copy of the local model
+    return embed.text(texts, model=model, inference_mode="local")['embeddings']
+
+
 class Gpt4AllEmbedding(BaseEmbedding):
-    """Wrapper around GPT4All embedding models."""
+    """Wrapper around GPT4All embedding models.
+
+    Local inference runs in a process pool so it doesn't stall the event loop.
+    Queries arriving within batch_window seconds are embedded in one call.
+    """
+
+    model = "nomic-embed-text-v1.5"
+    dimensions = 768
+
+    def __init__(self, max_workers: int = None, batch_window: float = 0.005, max_batch_size: int = 32) -> None:
+        self.max_workers = max_workers or os.cpu_count()
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self._executor = None
+        self._pending = []
+        self._flush_handle = None
 
     async def embed_query(self, text: str) -> list[float]:
-        embeddings = embed.text([text], model="nomic-embed-text-v1.5", inference_mode="local")
-        return embeddings['embeddings'][0]
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._embed_batch(batch))
+
+    async def _run_in_pool(self, texts: [str]) -> [[float]]:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+
+        executor = self._executor
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, embed_texts, texts, self.model)
+        except BrokenProcessPool:
+            # A worker died, e.g. killed for memory, and a broken pool rejects every later call
+            if self._executor is executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            raise
+
+    async def _embed_batch(self, batch: [(str, asyncio.Future)]) -> None:
+        texts = [text for text, _ in batch]
+        try:
+            try:
+                embeddings = await self._run_in_pool(texts)
+            except BrokenProcessPool:
+                print("embedding worker pool broke, retrying the batch on a new pool")
+                embeddings = await self._run_in_pool(texts)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), embedding in zip(batch, embeddings):
+            if not future.done():
+                future.set_result(embedding)
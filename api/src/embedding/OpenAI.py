@@ -7,6 +7,8 @@ client = AsyncOpenAI()
 class OpenAIEmbedding(BaseEmbedding):
     """Wrapper around OpenAI embedding models."""
 
+    dimensions = 1536
+
     def __init__(
         self, model_name: str = "text-embedding-ada-002"
     ) -> None:
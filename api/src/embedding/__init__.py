@@ -1 +1,2 @@
 from .base_embedding import BaseEmbedding
+from .cached_embedding import CachedEmbedding
@@ -0,0 +1,97 @@
+import asyncio
+import re
+import sqlite3
+import threading
+import unicodedata
+
+import numpy as np
+
+from Utils.lru_cache import LRUCache
+from .base_embedding import BaseEmbedding
+
+# Arabic code points commonly typed in place of their Persian equivalents
+persian_characters = str.maketrans({
+    "ي": "ی",  # Arabic yeh -> Persian yeh
+    "ى": "ی",  # Alef maksura -> Persian yeh
+    "ك": "ک",  # Arabic kaf -> Persian keheh
+})
+
+
+def normalize_text(text: str) -> str:
+    """Fold the variants of the same question typed in different ways onto one key."""
+    text = unicodedata.normalize("NFKC", text).translate(persian_characters)
+    # Zero-width non-joiners are often typed as plain spaces or left out
+    text = text.replace("\u200c", " ")
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class CachedEmbedding(BaseEmbedding):
+    """Caching layer in front of any BaseEmbedding.
+
+    Query embeddings are keyed by model name and normalized text, kept in a
+    bounded LRU and, when a path is given, in a SQLite table on disk.
+    """
+
+    def __init__(self, embedder: BaseEmbedding, maxsize: int = 10000, path: str = None) -> None:
+        self.embedder = embedder
+        self.model = getattr(embedder, 'model', type(embedder).__name__)
+        self.dimensions = getattr(embedder, 'dimensions', None)
+        self._cache = LRUCache(maxsize=maxsize)
+        self.disk_hits = 0
+
+        self._connection = None
+        # Disk reads and writes run in worker threads and share the connection
+        self._connection_lock = threading.Lock()
+        if path is not None:
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (model TEXT, text TEXT, vector BLOB, PRIMARY KEY (model, text))"
+            )
+
+    def _read_disk(self, text: str):
+        with self._connection_lock:
+            row = self._connection.execute(
+                "SELECT vector FROM embeddings WHERE model = ? AND text = ?", (self.model, text)
+            ).fetchone()
+        if row is None:
+            return None
+        return np.frombuffer(row[0], dtype=np.float32).tolist()
+
+    def _write_disk(self, text: str, embedding: list[float]) -> None:
+        vector = np.asarray(embedding, dtype=np.float32).tobytes()
+        with self._connection_lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO embeddings (model, text, vector) VALUES (?, ?, ?)",
+                (self.model, text, vector)
+            )
+            self._connection.commit()
+
+    async def embed_query(self, text: str) -> list[float]:
+        key = normalize_text(text)
+
+        embedding = self._cache.get((self.model, key))
+        if embedding is not None:
+            return embedding
+
+        if self._connection is not None:
+            embedding = await asyncio.to_thread(self._read_disk, key)
+            if embedding is not None:
+                self.disk_hits += 1
+                self._cache.set((self.model, key), embedding)
+                return embedding
+
+        embedding = await self.embedder.embed_query(text)
+
+        self._cache.set((self.model, key), embedding)
+        if self._connection is not None:
+            # The commit waits on the disk, keep it off the event loop
+            await asyncio.to_thread(self._write_disk, key, embedding)
+
+        return embedding
+
+    def stats(self) -> dict:
+        stats = self._cache.stats()
+        stats["disk_hits"] = self.disk_hits
+        requests = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + self.disk_hits) / requests if requests else 0.0
+        return stats
@@ -1,53 +1,95 @@
-import os
+import asyncio
+import time
 
 from langchain.schema import StrOutputParser
 
-from langchain_community.chat_message_histories import Neo4jChatMessageHistory
-from langchain_community.graphs import Neo4jGraph
 from langchain_community.llms import GPT4All
 
-from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables.history import RunnableWithMessageHistory
 
-from wrapper.no_save_neo4j_chat_history_wrapper import NoSaveNeo4jChatMessageHistory
+from Utils.metrics import generated_tokens, time_to_first_token
+from Utils.stream_writer import StreamWriter
+from wrapper.chat_history_store import ChatHistoryStore
 from .basellm import BaseLLM
+from .inference_scheduler import EXTRACTION_PRIORITY, GENERATION_PRIORITY, InferenceScheduler
+
+
+def load_gpt4all_model(model_name: str = "Meta-Llama-3-8B-Instruct.Q4_0.gguf", n_threads: int = 2,
+                       n_batch: int = 16) -> GPT4All:
+    """Load the GPT4All weights. Callbacks are passed per call so the instance can be shared."""
+    return GPT4All(model=model_name,
+                   backend="llama",
+                   f16_kv=True,
+                   seed=42,
+                   streaming=True,
+                   temp=0.7,
+                   top_p=0.2,
+                   n_batch=n_batch,
+                   n_threads=n_threads,
+                   use_mlock=True,
+                   top_k=40,
+                   n_predict=256,
+                   max_tokens=512,
+                   repeat_last_n=64,
+                   repeat_penalty=1.18,
+                   )
+
+
+class GenerationCancelled(Exception):
+    pass
+
+
+class CustomCallbackHandler(BaseCallbackHandler):
+    """Collects and streams the tokens of one generation.
+
+    GPT4All generates in an executor thread and calls this handler there, so
+    tokens are handed to the event loop thread. cancel() stops the generation
+    at the next token: keep_generating is passed to gpt4all as its native
+    callback, which is what actually stops the model, raising here only ends
+    the Python loop reading the tokens. A cancelled run fails in on_llm_end,
+    otherwise its truncated answer would be saved to the chat history.
+    """
+
+    # Exceptions raised here must abort the generation instead of being logged
+    raise_error = True
+
+    def __init__(self, websocket: StreamWriter, send_response: bool = True):
+        self.websocket = websocket
+        self.send_response = send_response
+        self.tokens = []
+        self.first_token_at = None
+        self.cancelled = False
+        self._loop = asyncio.get_running_loop()
 
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        if self.cancelled:
+            raise GenerationCancelled()
 
-graph = Neo4jGraph(
-    url=os.getenv('NEO4J_URL'),
-    username=os.getenv('NEO4J_USER'),
-    password=os.getenv('NEO4J_PASS'),
-    database=os.getenv('NEO4J_DATABASE'),
-)
-
-
-def get_session_history_method(save_conversation):
-    if save_conversation:
-        return get_save_session_history
-    else:
-        return get_no_save_session_history
-
-
-def get_save_session_history(session_id):
-    return Neo4jChatMessageHistory(session_id=session_id, graph=graph)
-
-
-def get_no_save_session_history(session_id):
-    return NoSaveNeo4jChatMessageHistory(session_id=session_id, graph=graph)
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
 
+        self.tokens.append(token)
+        if self.send_response:
+            self._loop.call_soon_threadsafe(self._stream, token)
 
+    def on_llm_end(self, response, **kwargs) -> None:
+        if self.cancelled:
+            raise GenerationCancelled()
 
+    def _stream(self, token: str) -> None:
+        try:
+            self.websocket.stream_nowait(token)
+        except Exception:
+            # Nobody is listening anymore
+            self.cancel()
 
-class CustomAsyncCallbackHandler(AsyncCallbackHandler):
-    def __init__(self, websocket):
-        self.websocket = websocket
-        self.tokens = []
+    def cancel(self) -> None:
+        self.cancelled = True
 
-    async def on_llm_new_token(self, token: str, **kwargs) -> None:
-        response = {"type": "stream", "output": token}
-        self.tokens.append(token)
-        await self.websocket.send_json(response)
+    def keep_generating(self, token_id: int, response: str) -> bool:
+        return not self.cancelled
 
     def copy_token(self):
         return self.tokens.copy()
@@ -59,27 +101,16 @@ class CustomAsyncCallbackHandler(AsyncCallbackHandler):
 class Gpt4AllChat(BaseLLM):
     def __init__(
             self,
-            websocket,
+            websocket: StreamWriter,
+            history_store: ChatHistoryStore,
+            scheduler: InferenceScheduler = None,
             model_name: str = "Meta-Llama-3-8B-Instruct.Q4_0.gguf",
     ) -> None:
-        self.handler = CustomAsyncCallbackHandler(websocket)
         self.websocket = websocket
-        self.model = GPT4All(model="Meta-Llama-3-8B-Instruct.Q4_0.gguf",
-                             backend="llama",
-                             f16_kv=True,
-                             seed=42,
-                             callbacks=[self.handler],
-                             streaming=True,
-                             temp=0.7,
-                             top_p=0.2,
-                             n_batch=16,
-                             n_threads=2,
-                             use_mlock=True,
-                             top_k=40,
-                             n_predict=256,
-                             max_tokens=512,
-                             repeat_last_n=64,
-                             repeat_penalty=1.18,
+        self.history_store = history_store
+        # Owns the model instances, shared by every connection
+        self.scheduler = scheduler if scheduler is not None else InferenceScheduler(
+            lambda: load_gpt4all_model(model_name)
         )
         self.model_name = model_name
 
@@ -91,42 +122,61 @@ class Gpt4AllChat(BaseLLM):
             prompt: ChatPromptTemplate,
             send_response: bool = True,
             use_history: bool = True,
-            save_conversation: bool = True
+            save_conversation: bool = True,
+            json_mode: bool = False
     ) -> [str]:
+        started_at = time.perf_counter()
+
+        # GPT4All has no constrained decoding, json_mode relies on the prompt alone
 
         await self.websocket.send_json({"type": "debug", "detail": f"created prompt: {prompt}"})
         await self.websocket.send_json({"type": "debug", "detail": f"fetched similars: {similars}"})
 
-        chain = prompt | self.model | StrOutputParser()
-
-        await self.websocket.send_json({"type": "debug", "detail": "chain created and model is going to generate"})
-
-        session_history_method = get_session_history_method(save_conversation)
-
-        if use_history:
-            chat_with_message_history = RunnableWithMessageHistory(
-                chain,
-                get_session_history=session_history_method,
-                input_messages_key="question",
-                history_messages_key="chat_history",
-            )
-
-            await chat_with_message_history.ainvoke(
-                {
-                    "question": question,
-                    "similars": similars,
-                },
-                config={
-                    "configurable": {
-                        "session_id": session_id
-                        },
-                }
-            )
-        else:
-            await chain.ainvoke({"question": question, "similars": similars})
-
-        results = self.handler.copy_token()
-        self.handler.clear_tokens()
+        session_history_method = self.history_store.get_session_history_method(save_conversation)
+
+        # One handler per call so concurrent generations don't mix their tokens
+        handler = CustomCallbackHandler(self.websocket, send_response)
+
+        # Prompts whose answer isn't streamed are the short extraction ones
+        priority = GENERATION_PRIORITY if send_response else EXTRACTION_PRIORITY
+
+        async with self.scheduler.job(session_id, priority) as job:
+            chain = prompt | job.model.bind(callback=handler.keep_generating) | StrOutputParser()
+
+            await self.websocket.send_json({"type": "debug", "detail": "chain created and model is going to generate"})
+
+            config = {"callbacks": [handler]}
+            if use_history:
+                runnable = RunnableWithMessageHistory(
+                    chain,
+                    get_session_history=session_history_method,
+                    input_messages_key="question",
+                    history_messages_key="chat_history",
+                )
+                config["configurable"] = {"session_id": session_id}
+            else:
+                runnable = chain
+
+            generation = asyncio.ensure_future(runnable.ainvoke({"question": question, "similars": similars}, config))
+            try:
+                # Cancelling the await alone would leave the executor thread generating on the model
+                await asyncio.shield(generation)
+            except asyncio.CancelledError:
+                handler.cancel()
+                # Keep the scheduler slot until the model has actually stopped
+                await asyncio.wait([generation])
+                if not generation.cancelled():
+                    generation.exception()
+                job.tokens = len(handler.tokens)
+                raise
+
+            job.tokens = len(handler.tokens)
+
+        generated_tokens.labels(self.model_name).inc(len(handler.tokens))
+        if send_response and handler.first_token_at is not None:
+            time_to_first_token.labels(self.model_name).observe(handler.first_token_at - started_at)
+
+        results = handler.copy_token()
 
         final_response = self.reconstruct_streaming_response(results)
 
@@ -1,4 +1,5 @@
 import os
+import time
 
 from langchain.schema import StrOutputParser
 
@@ -7,44 +8,29 @@ from langchain_community.chat_models import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables.history import RunnableWithMessageHistory
 
-from langchain_community.chat_message_histories import Neo4jChatMessageHistory
-from langchain_community.graphs import Neo4jGraph
-
-from wrapper.no_save_neo4j_chat_history_wrapper import NoSaveNeo4jChatMessageHistory
+from Utils.metrics import generated_tokens, time_to_first_token
+from Utils.stream_writer import StreamWriter
+from wrapper.chat_history_store import ChatHistoryStore
 from .basellm import BaseLLM
 
-graph = Neo4jGraph(
-    url=os.getenv('NEO4J_URL'),
-    username=os.getenv('NEO4J_USER'),
-    password=os.getenv('NEO4J_PASS'),
-    database=os.getenv('NEO4J_DATABASE'),
-)
-
-
-def get_session_history_method(save_conversation):
-    if save_conversation:
-        return get_save_session_history
-    else:
-        return get_no_save_session_history
-
 
-def get_save_session_history(session_id):
-    return Neo4jChatMessageHistory(session_id=session_id, graph=graph)
-
-
-def get_no_save_session_history(session_id):
-    return NoSaveNeo4jChatMessageHistory(session_id=session_id, graph=graph)
+def load_openai_model(model_name: str = "gpt-3.5-turbo") -> ChatOpenAI:
+    return ChatOpenAI(openai_api_key=os.getenv('OPENAPI_APIKEY'),
+                      model_name=model_name,
+                      streaming=True)
 
 
 class ChatOpenAIChat(BaseLLM):
     def __init__(
             self,
-            websocket,
+            websocket: StreamWriter,
+            history_store: ChatHistoryStore,
+            model: ChatOpenAI = None,
             model_name: str = "gpt-3.5-turbo",
     ) -> None:
         self.websocket = websocket
-        self.model = ChatOpenAI(openai_api_key=os.getenv('OPENAPI_APIKEY'),
-                                streaming=True)
+        self.history_store = history_store
+        self.model = model if model is not None else load_openai_model(model_name)
         self.model_name = model_name
 
     async def generate_streaming(
@@ -55,18 +41,24 @@ class ChatOpenAIChat(BaseLLM):
             prompt: ChatPromptTemplate,
             send_response: bool = True,
             use_history: bool = True,
-            save_conversation: bool = True
+            save_conversation: bool = True,
+            json_mode: bool = False
     ) -> [str]:
 
         await self.websocket.send_json({"type": "debug", "detail": f"created prompt: {prompt}"})
         await self.websocket.send_json({"type": "debug", "detail": f"fetched similars: {similars}"})
 
-        chain = prompt | self.model | StrOutputParser()
+        model = self.model
+        if json_mode:
+            model = model.bind(response_format={"type": "json_object"})
+
+        chain = prompt | model | StrOutputParser()
 
         await self.websocket.send_json({"type": "debug", "detail": "chain created and model is going to generate"})
 
-        session_history_method = get_session_history_method(save_conversation)
+        session_history_method = self.history_store.get_session_history_method(save_conversation)
 
+        started_at = time.perf_counter()
         tokens = []
         if use_history:
             chat_with_message_history = RunnableWithMessageHistory(
@@ -87,9 +79,10 @@ class ChatOpenAIChat(BaseLLM):
                         },
                     }
             ):
-                response = {"type": "stream", "output": chunk}
+                if not tokens and send_response:
+                    time_to_first_token.labels(self.model_name).observe(time.perf_counter() - started_at)
                 if send_response:
-                    await self.websocket.send_json(response)
+                    await self.websocket.stream(chunk)
 
                 tokens.append(chunk)
         else:
@@ -99,12 +92,15 @@ class ChatOpenAIChat(BaseLLM):
                         "similars": similars,
                     }
             ):
-                response = {"type": "stream", "output": chunk}
+                if not tokens and send_response:
+                    time_to_first_token.labels(self.model_name).observe(time.perf_counter() - started_at)
                 if send_response:
-                    await self.websocket.send_json(response)
+                    await self.websocket.stream(chunk)
 
                 tokens.append(chunk)
 
+        generated_tokens.labels(self.model_name).inc(len(tokens))
+
         final_response = self.reconstruct_streaming_response(tokens)
 
         return final_response
@@ -18,7 +18,8 @@ class BaseLLM(ABC):
             prompt,
             send_response: bool = True,
             use_history: bool = True,
-            save_conversation: bool = True
+            save_conversation: bool = True,
+            json_mode: bool = False
     ) -> List[Any]:
         """Comment"""
 
@@ -0,0 +1,121 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+from Utils.metrics import inference_queue_wait, inference_tokens_per_second
+
+# Lower runs first, extraction prompts are short and block the answer that follows them
+EXTRACTION_PRIORITY = 0
+GENERATION_PRIORITY = 1
+
+
+@dataclass(slots=True)
+class InferenceJob:
+    model: object
+    session_id: str
+    priority: int
+    queue_wait: float
+    tokens: int = 0
+
+
+class InferenceScheduler:
+    """Hands out local model instances to generation jobs.
+
+    A model instance runs one generation at a time, so up to max_concurrency
+    instances are loaded, the first one given and the rest on demand. Waiting
+    jobs are served by priority, then by how many jobs their session already
+    has queued so one chatty session can't starve the others, then in arrival
+    order.
+    """
+
+    def __init__(self, load_model, max_concurrency: int = 1, model=None) -> None:
+        self._load_model = load_model
+        self.max_concurrency = max_concurrency
+        self._idle_models = [model] if model is not None else []
+        self._loaded = len(self._idle_models)
+        self._waiting = []
+        self._queued_per_session = defaultdict(int)
+        self._order = itertools.count()
+        self.jobs = 0
+        self.total_queue_wait = 0.0
+        self.total_tokens = 0
+        self.total_generation_time = 0.0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiting)
+
+    @asynccontextmanager
+    async def job(self, session_id: str, priority: int = GENERATION_PRIORITY):
+        """Waits for a model instance, set job.tokens before leaving to get tokens/sec reported."""
+        queued_at = time.perf_counter()
+        model = await self._acquire(session_id, priority)
+        started_at = time.perf_counter()
+
+        job = InferenceJob(model=model, session_id=session_id, priority=priority, queue_wait=started_at - queued_at)
+        try:
+            yield job
+        finally:
+            self._release(model)
+
+            elapsed = time.perf_counter() - started_at
+            self.jobs += 1
+            self.total_queue_wait += job.queue_wait
+            self.total_tokens += job.tokens
+            self.total_generation_time += elapsed
+            inference_queue_wait.labels(priority).observe(job.queue_wait)
+            if job.tokens and elapsed:
+                inference_tokens_per_second.labels(priority).observe(job.tokens / elapsed)
+
+    async def _acquire(self, session_id: str, priority: int):
+        if self._idle_models:
+            return self._idle_models.pop()
+
+        if self._loaded < self.max_concurrency:
+            self._loaded += 1
+            try:
+                return await asyncio.to_thread(self._load_model)
+            except BaseException:
+                self._loaded -= 1
+                raise
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority, self._queued_per_session[session_id], next(self._order), session_id, future))
+        self._queued_per_session[session_id] += 1
+
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Handed a model right as the job was cancelled
+                self._release(future.result())
+            raise
+
+    def _release(self, model) -> None:
+        while self._waiting:
+            *_, session_id, future = heapq.heappop(self._waiting)
+            self._dequeued(session_id)
+            if not future.done():
+                future.set_result(model)
+                return
+
+        self._idle_models.append(model)
+
+    def _dequeued(self, session_id: str) -> None:
+        self._queued_per_session[session_id] -= 1
+        if not self._queued_per_session[session_id]:
+            del self._queued_per_session[session_id]
+
+    def stats(self) -> dict:
+        return {
+            "models": self._loaded,
+            "max_concurrency": self.max_concurrency,
+            "queued": self.queued,
+            "jobs": self.jobs,
+            "avg_queue_wait": self.total_queue_wait / self.jobs if self.jobs else 0.0,
+            "tokens_per_second": self.total_tokens / self.total_generation_time if self.total_generation_time else 0.0,
+        }
@@ -0,0 +1,104 @@
+from embedding.cached_embedding import CachedEmbedding
+from embedding.GPT4ALL import Gpt4AllEmbedding
+from embedding.OpenAI import OpenAIEmbedding
+from wrapper.chat_history_store import ChatHistoryStore
+from .basellm import BaseLLM
+from .GPT4ALL import Gpt4AllChat, load_gpt4all_model
+from .inference_scheduler import InferenceScheduler
+from .OpenAI import ChatOpenAIChat, load_openai_model
+
+model_loaders = {
+    'openai': load_openai_model,
+    'gpt4all': load_gpt4all_model,
+}
+
+embedder_factories = {
+    'openai': OpenAIEmbedding,
+    'gpt4all': Gpt4AllEmbedding,
+}
+
+
+class ModelRegistry:
+    """Process-wide holder of the LLM and embedding backends.
+
+    Weights are loaded once per backend; per-connection wrappers only own
+    their websocket and token callback.
+    """
+
+    def __init__(
+            self,
+            history_store: ChatHistoryStore,
+            embedding_cache_size: int = 0,
+            embedding_cache_path: str = None,
+            model_options: dict = None,
+            gpt4all_max_concurrency: int = 1
+    ) -> None:
+        self.history_store = history_store
+        # Keyword arguments of each model loader, keyed by model name
+        self.model_options = model_options or {}
+        # Number of GPT4All instances, each one runs a single generation at a time
+        self.gpt4all_max_concurrency = gpt4all_max_concurrency
+        # Every embedder is wrapped in a CachedEmbedding when the cache size is positive
+        self.embedding_cache_size = embedding_cache_size
+        self.embedding_cache_path = embedding_cache_path
+        self._models = {}
+        self._embedders = {}
+        self._schedulers = {}
+
+    def load(self, model_names: [str]) -> None:
+        for model_name in model_names:
+            try:
+                self.get_model(model_name)
+                self.get_embedder(model_name)
+            except Exception as e:
+                print(f"could not preload model {model_name}: {e}")
+
+    def get_model(self, model_name: str):
+        if model_name not in self._models:
+            loader = model_loaders.get(model_name)
+            if loader is None:
+                return None
+            options = self.model_options.get(model_name, {})
+            self._models[model_name] = loader(**options)
+
+            if model_name == 'gpt4all':
+                self._schedulers[model_name] = InferenceScheduler(
+                    lambda: loader(**options),
+                    max_concurrency=self.gpt4all_max_concurrency,
+                    model=self._models[model_name],
+                )
+
+        return self._models[model_name]
+
+    def get_embedder(self, model_name: str):
+        if model_name not in self._embedders:
+            factory = embedder_factories.get(model_name)
+            if factory is None:
+                return None
+            embedder = factory()
+            if self.embedding_cache_size > 0:
+                embedder = CachedEmbedding(embedder, self.embedding_cache_size, self.embedding_cache_path)
+            self._embedders[model_name] = embedder
+
+        return self._embedders[model_name]
+
+    def embedding_cache_stats(self) -> dict:
+        return {
+            model_name: embedder.stats()
+            for model_name, embedder in self._embedders.items()
+            if isinstance(embedder, CachedEmbedding)
+        }
+
+    def scheduler_stats(self) -> dict:
+        return {model_name: scheduler.stats() for model_name, scheduler in self._schedulers.items()}
+
+    def create_model(self, model_name: str, websocket) -> BaseLLM:
+        model = self.get_model(model_name)
+
+        if model_name == 'openai':
+            return ChatOpenAIChat(websocket, self.history_store, model=model)
+
+        elif model_name == 'gpt4all':
+            return Gpt4AllChat(websocket, self.history_store, scheduler=self._schedulers[model_name])
+
+        return None
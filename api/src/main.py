@@ -1,61 +1,137 @@
+import asyncio
 import os
 from typing import Optional
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from pydantic import BaseModel
 
+from Utils.metrics import register_stats_collector, stage_latency
 from Utils.session_id_generator import Session
+from Utils.stream_writer import StreamChannel, StreamWriter
 from components.result_generator import ResultGenerator
+from components.router import QueryRouter
+from components.trip_state import TripStateStore
 from components.similarity import Neo4jSimilarity
-from embedding.GPT4ALL import Gpt4AllEmbedding
-from embedding.OpenAI import OpenAIEmbedding
-from llm.OpenAI import ChatOpenAIChat
-from llm.GPT4ALL import Gpt4AllChat
-from wrapper.neo4j_wrapper import Neo4jDatabase
+from llm.model_registry import ModelRegistry
+from wrapper.async_neo4j_wrapper import AsyncNeo4jDatabase
+from wrapper.attraction_cache import AttractionCache
+from wrapper.chat_history_store import ChatHistoryStore
+from wrapper.local_vector_store import LocalVectorStore
 from wrapper.neo4j_chathistory_wrapper import Neo4jChatHistoryDatabase
 
-neo4j_connection = Neo4jDatabase(
+neo4j_connection = AsyncNeo4jDatabase(
     host=os.getenv('NEO4J_URL'),
     user=os.getenv('NEO4J_USER'),
     password=os.getenv('NEO4J_PASS'),
     database=os.getenv('NEO4J_DATABASE'),
+    max_connection_pool_size=int(os.getenv('NEO4J_MAX_POOL_SIZE', 100)),
+    connection_acquisition_timeout=float(os.getenv('NEO4J_ACQUISITION_TIMEOUT', 60)),
+)
+
+# Formatted attractions per city, attraction data changes rarely
+attraction_cache = AttractionCache(
+    database=neo4j_connection,
+    maxsize=int(os.getenv('ATTRACTION_CACHE_SIZE', 512)),
+    ttl=float(os.getenv('ATTRACTION_CACHE_TTL', 3600)),
 )
 
 # Initialize LLM modules
 openai_api_key = os.environ.get("OPENAI_API_KEY", None)
 
+# Backends whose weights are loaded at startup, the rest are loaded on first use
+preload_models = [model_name for model_name in os.getenv('PRELOAD_MODELS', 'openai,gpt4all').split(',') if model_name]
+
+# Shared by the LLM wrappers and the chat history endpoints
+chat_history_store = ChatHistoryStore(neo4j_connection)
+
+model_registry = ModelRegistry(
+    chat_history_store,
+    embedding_cache_size=int(os.getenv('EMBEDDING_CACHE_SIZE', 10000)),
+    embedding_cache_path=os.getenv('EMBEDDING_CACHE_PATH') or None,
+    model_options={
+        'gpt4all': {
+            'n_threads': int(os.getenv('GPT4ALL_THREADS', 2)),
+            'n_batch': int(os.getenv('GPT4ALL_BATCH', 16)),
+        },
+    },
+    # Every extra GPT4All instance holds its own copy of the weights
+    gpt4all_max_concurrency=int(os.getenv('GPT4ALL_MAX_CONCURRENCY', 1)),
+)
 
-def create_neo4j_chat_history_connection(session_id: str):
-    return Neo4jChatHistoryDatabase(
-        host=os.getenv('NEO4J_URL'),
-        user=os.getenv('NEO4J_USER'),
-        password=os.getenv('NEO4J_PASS'),
-        session_id=session_id)
+# "structured" extracts the trip information in one JSON generation, "concurrent" in three parallel ones
+trip_extraction_mode = os.getenv('TRIP_EXTRACTION_MODE', 'structured')
 
+# "random" samples the attractions of the nearby cities, "vector" ranks them with the embeddings stored in Neo4j,
+# "local" ranks them with the packed embeddings under LOCAL_VECTOR_STORE_PATH/<model name>
+retrieval_mode = os.getenv('RETRIEVAL_MODE', 'random')
 
-def create_embedder(model_name):
-    model = None
+# Questions classified as small talk with at least this probability skip extraction and retrieval
+query_router = QueryRouter(threshold=float(os.getenv('QUERY_ROUTER_THRESHOLD', 0.6)))
 
-    if model_name == 'openai':
-        model = OpenAIEmbedding()
+# Extracted trip of every session, re-extracted only when a message mentions a known city or a number
+trip_states = TripStateStore(
+    neo4j_connection.cities,
+    maxsize=int(os.getenv('TRIP_STATE_CACHE_SIZE', 10000)),
+    ttl=float(os.getenv('TRIP_STATE_CACHE_TTL', 86400)),
+)
+local_vector_store_path = os.getenv('LOCAL_VECTOR_STORE_PATH', 'vector_store')
+
+vector_stores = {}
+
+# Streamed tokens are sent in one frame every STREAM_FLUSH_MS milliseconds or STREAM_FLUSH_BYTES bytes
+stream_flush_interval = float(os.getenv('STREAM_FLUSH_MS', 20)) / 1000
+stream_flush_bytes = int(os.getenv('STREAM_FLUSH_BYTES', 512))
+
+# Questions answered at the same time on one websocket, tagged ones can be in flight together
+max_inflight_requests = int(os.getenv('WEBSOCKET_MAX_INFLIGHT', 4))
+
+
+def cache_hit_counts() -> dict:
+    attraction_stats = attraction_cache.stats()
+    trip_state_stats = trip_states.stats()
+    counts = {
+        "attractions": (attraction_stats["hits"], attraction_stats["misses"]),
+        "trip_states": (trip_state_stats["reused"], trip_state_stats["extracted"]),
+    }
+    for model_name, embedding_stats in model_registry.embedding_cache_stats().items():
+        counts[f"embeddings_{model_name}"] = (embedding_stats["hits"], embedding_stats["misses"])
+    return counts
+
+
+# Read from the existing stats only when /metrics is scraped
+register_stats_collector(
+    cache_hit_counts,
+    counters={"router_routes": ("route", lambda: dict(query_router.counts))},
+    gauges={
+        "inference_queued_jobs": (
+            "model", lambda: {model_name: stats["queued"] for model_name, stats in model_registry.scheduler_stats().items()}
+        ),
+    },
+)
 
-    elif model_name == 'gpt4all':
-        model = Gpt4AllEmbedding()
 
-    return model
+def get_vector_store(model_name: str):
+    if retrieval_mode != 'local':
+        return None
 
+    if model_name not in vector_stores:
+        try:
+            vector_stores[model_name] = LocalVectorStore(os.path.join(local_vector_store_path, model_name))
+        except FileNotFoundError as e:
+            # Remembered as missing, the questions of this model fall back to random retrieval
+            print(f"no local vector store for {model_name}, using random retrieval: {e}")
+            vector_stores[model_name] = None
 
-def create_model(model_name, websocket):
-    model = None
-    if model_name == 'openai':
-        model = ChatOpenAIChat(websocket)
+    return vector_stores[model_name]
 
-    elif model_name == 'gpt4all':
-        model = Gpt4AllChat(websocket)
 
-    return model
+def create_neo4j_chat_history_connection(session_id: str):
+    return Neo4jChatHistoryDatabase(
+        history_store=chat_history_store,
+        session_id=session_id)
 
 
 class Payload(BaseModel):
@@ -83,69 +159,105 @@ app.add_middleware(
 )
 
 
-@app.websocket("/text2text")
-async def websocket_endpoint(websocket: WebSocket):
-    async def send_debug_message(message):
-        await websocket.send_json({"type": "debug", "detail": message})
+@app.on_event("startup")
+async def load_models():
+    await neo4j_connection.connect()
+    await neo4j_connection.ensure_indexes()
+    chat_history_store.start()
+    model_registry.load(preload_models)
+    for model_name in preload_models:
+        get_vector_store(model_name)
 
-    async def send_error_message(message):
-        await websocket.send_json({"type": "error", "detail": message})
 
-    await websocket.accept()
-    await send_debug_message("connected")
-    try:
-        while True:
-            data = await websocket.receive_json()
+@app.on_event("shutdown")
+async def close_connections():
+    # Flush the buffered chat history before the driver goes away
+    await chat_history_store.close()
+    await neo4j_connection.close()
 
-            if "type" not in data:
-                await websocket.send_json({"error": "missing type"})
-                continue
 
-            if "session_id" not in data:
-                await websocket.send_json({"error": "missing session id"})
-                continue
+async def cancel_task(task: asyncio.Task) -> bool:
+    """Cancel a running task and wait until it has stopped, the model included."""
+    if task is None or task.done():
+        return False
 
-            if "model" not in data:
-                await websocket.send_json({"error": "missing model"})
-                continue
+    task.cancel()
+    await asyncio.wait([task])
+    return True
 
-            session_id = data['session_id']
 
-            model_name = data['model']
+def create_components(model_name: str, stream) -> (ResultGenerator, Neo4jSimilarity):
+    """Per-request wrappers around the shared backends, writing their frames to stream."""
+    model = model_registry.create_model(model_name, stream)
 
-            model = create_model(model_name, websocket)
+    if model is None:
+        return None
+
+    vector_store = get_vector_store(model_name)
+    model_retrieval_mode = 'random' if retrieval_mode == 'local' and vector_store is None else retrieval_mode
+
+    return (
+        ResultGenerator(
+            llm=model
+        ),
+        Neo4jSimilarity(
+            database=neo4j_connection,
+            embedder=model_registry.get_embedder(model_name),
+            llm=model,
+            extraction_mode=trip_extraction_mode,
+            attraction_cache=attraction_cache,
+            retrieval_mode=model_retrieval_mode,
+            vector_store=vector_store,
+            router=query_router,
+            trip_states=trip_states
+        )
+    )
 
-            if model is None:
-                await websocket.send_json({"error": "model undefined"})
-                continue
 
-            result_generator = ResultGenerator(
-                llm=model
-            )
+@app.websocket("/text2text")
+async def websocket_endpoint(websocket: WebSocket):
+    # Every frame goes through the writer so they stay in order with the coalesced tokens
+    writer = StreamWriter(
+        websocket,
+        flush_interval=stream_flush_interval,
+        flush_bytes=stream_flush_bytes,
+    )
 
-            embedder = create_embedder(model_name)
+    await websocket.accept()
+    writer.start()
+    await writer.send_json({"type": "debug", "detail": "connected"})
 
-            similarity = Neo4jSimilarity(
-                database=neo4j_connection,
-                embedder=embedder,
-                llm=model
-            )
+    # Questions answered at the same time on this connection, the others wait for a slot
+    inflight = asyncio.Semaphore(max_inflight_requests)
 
-            if data["type"] == "question":
-                try:
-                    question = data["question"]
+    async def answer_question(question: str, session_id: str, result_generator: ResultGenerator,
+                              similarity: Neo4jSimilarity, stream):
+        async def send_debug_message(message):
+            await stream.send_json({"type": "debug", "detail": message})
 
+        async def send_error_message(message):
+            await stream.send_json({"type": "error", "detail": message})
+
+        model_name = result_generator.llm.model_name
+
+        async with inflight:
+            # prometheus_client timers are plain context managers, not async ones
+            with stage_latency.labels('answer', model_name).time():
+                try:
                     await send_debug_message("received question: " + question)
                     try:
-                        similars = await similarity.run_async(question=question, session_id=session_id)
+                        with stage_latency.labels('retrieval', model_name).time():
+                            similars = await similarity.run_async(question=question, session_id=session_id)
                     except Exception as e:
                         await send_error_message(str(e))
-                        continue
+                        return
+
+                    serialized_similars = [similar.to_dict() for similar in similars]
 
-                    await websocket.send_json(
+                    await stream.send_json(
                         {
                             "type": "start",
-                            "similars": similars
+                            "similars": serialized_similars
                         }
                     )
                     output = await result_generator.run_async(
@@ -154,18 +266,78 @@ async def websocket_endpoint(websocket: WebSocket):
                         similars=similars
                     )
 
-                    await websocket.send_json(
+                    await stream.send_json(
                         {
                             "type": "end",
                             "output": output,
-                            "similars": similars,
+                            "similars": serialized_similars,
                         }
                     )
                 except Exception as e:
                     await send_error_message(str(e))
                 await send_debug_message("output done")
+
+    # Answered while the loop keeps receiving, so a disconnect is noticed right away.
+    # Untagged questions replace each other, tagged ones run side by side keyed by request_id
+    current_task = None
+    request_tasks = {}
+    try:
+        while True:
+            data = await websocket.receive_json()
+
+            request_id = data.get("request_id")
+            # Frames of a tagged request carry its request_id, untagged ones keep the original format
+            stream = writer if request_id is None else StreamChannel(writer, request_id)
+
+            if "type" not in data:
+                await stream.send_json({"error": "missing type"})
+                continue
+
+            if data["type"] == "cancel":
+                await cancel_task(request_tasks.get(request_id) if request_id is not None else current_task)
+                continue
+
+            if "session_id" not in data:
+                await stream.send_json({"error": "missing session id"})
+                continue
+
+            if "model" not in data:
+                await stream.send_json({"error": "missing model"})
+                continue
+
+            session_id = data['session_id']
+
+            model_name = data['model']
+
+            components = create_components(model_name, stream)
+
+            if components is None:
+                await stream.send_json({"error": "model undefined"})
+                continue
+
+            if data["type"] == "question":
+                question_task = answer_question(data["question"], session_id, *components, stream)
+
+                if request_id is None:
+                    # A new question supersedes the one still being answered
+                    if await cancel_task(current_task):
+                        await writer.send_json({"type": "debug", "detail": "cancelled the previous question"})
+
+                    current_task = asyncio.create_task(question_task)
+                elif request_id in request_tasks:
+                    question_task.close()
+                    await stream.send_json({"type": "error", "detail": "duplicate request_id"})
+                else:
+                    request_tasks[request_id] = asyncio.create_task(question_task)
+                    request_tasks[request_id].add_done_callback(
+                        lambda _, request_id=request_id: request_tasks.pop(request_id, None)
+                    )
     except WebSocketDisconnect:
         print("disconnected")
+    finally:
+        # Nobody is waiting for the answers anymore
+        await asyncio.gather(*[cancel_task(task) for task in [current_task, *request_tasks.values()]])
+        await writer.close()
 
 
 @app.get("/")
@@ -191,7 +363,7 @@ async def generate_session_id():
 
 # @app.post("/similars")
 # async def get_similars(payload: Payload):
-#     embedder = create_embedder(payload.model_name)
+#     embedder = model_registry.get_embedder(payload.model_name)
 #
 #     similarity = Neo4jSimilarity(
 #         database=neo4j_connection,
@@ -203,6 +375,37 @@ async def generate_session_id():
 #     return {'similars': similars}
 
 
+@app.post("/refresh_cities")
+async def refresh_cities():
+    await neo4j_connection.refresh_cities()
+    attraction_cache.invalidate()
+    return {"success": True}
+
+
+@app.get("/cache_stats")
+async def cache_stats():
+    return {
+        "attractions": attraction_cache.stats(),
+        "embeddings": model_registry.embedding_cache_stats(),
+        "trip_states": trip_states.stats(),
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/inference_stats")
+async def inference_stats():
+    return model_registry.scheduler_stats()
+
+
+@app.get("/router_stats")
+async def router_stats():
+    return query_router.stats()
+
+
 @app.get("/chat_history")
 async def get_chat_history(session_id: str):
     if session_id is None:
@@ -210,7 +413,7 @@ async def get_chat_history(session_id: str):
 
     chat_history_db = create_neo4j_chat_history_connection(session_id)
 
-    messages = chat_history_db.get_messages()
+    messages = await chat_history_db.get_messages()
 
     return {"messages": messages}
 
@@ -227,7 +430,8 @@ async def clear_chat_history(session_id: str):
 
     chat_history_db = create_neo4j_chat_history_connection(session_id)
 
-    chat_history_db.clear_messages()
+    await chat_history_db.clear_messages()
+    trip_states.clear(session_id)
 
     return {"success": True}
 
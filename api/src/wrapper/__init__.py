@@ -1,3 +1,6 @@
 from .neo4j_wrapper import Neo4jDatabase
+from .async_neo4j_wrapper import AsyncNeo4jDatabase
 from .neo4j_chathistory_wrapper import Neo4jChatHistoryDatabase
 from .no_save_neo4j_chat_history_wrapper import NoSaveNeo4jChatMessageHistory
+from .chat_history_store import ChatHistoryStore
+from .attraction_cache import AttractionCache
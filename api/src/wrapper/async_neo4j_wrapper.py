@@ -0,0 +1,213 @@
+from typing import Any, Dict, List, Optional
+
+from neo4j import AsyncGraphDatabase, exceptions
+
+from Utils.city_gazetteer import CityGazetteer
+from Utils.metrics import neo4j_queries
+from .neo4j_wrapper import (
+    attractions_query,
+    cities_query,
+    city_query,
+    nearest_cities_query,
+    node_properties_query,
+    rel_properties_query,
+    rel_query,
+    schema_queries,
+    schema_text,
+    similar_attractions_query,
+    upsert_embeddings_query,
+    vector_index_names,
+    vector_index_query,
+)
+
+
+class AsyncNeo4jDatabase:
+    """Awaitable counterpart of Neo4jDatabase, so queries don't block the event loop."""
+
+    def __init__(
+            self,
+            host: str,
+            user: str,
+            password: str,
+            database: str,
+            read_only: bool = True,
+            max_connection_pool_size: int = 100,
+            connection_acquisition_timeout: float = 60.0,
+    ) -> None:
+        """Initialize an async neo4j database, call connect() before use"""
+        self._driver = AsyncGraphDatabase.driver(
+            host,
+            auth=(user, password),
+            max_connection_pool_size=max_connection_pool_size,
+            connection_acquisition_timeout=connection_acquisition_timeout,
+        )
+        self._database = database
+        self._read_only = read_only
+        self.schema = ""
+        self.cities = CityGazetteer()
+
+    async def connect(self) -> None:
+        # Verify connection
+        try:
+            await self._driver.verify_connectivity()
+        except exceptions.ServiceUnavailable:
+            raise ValueError(
+                "Could not connect to Neo4j database. "
+                "Please ensure that the url is correct"
+            )
+        except exceptions.AuthError:
+            raise ValueError(
+                "Could not connect to Neo4j database. "
+                "Please ensure that the username and password are correct"
+            )
+        try:
+            await self.refresh_schema()
+        except:
+            raise ValueError("Missing APOC Core plugin")
+        await self.refresh_cities()
+
+    @staticmethod
+    async def _execute_query(tx, cypher_query: str, params: Optional[Dict] = {}):
+        result = await tx.run(cypher_query, params)
+        return [r.data() async for r in result]
+
+    async def query(
+            self, cypher_query: str, params: Optional[Dict] = {}
+    ) -> List[Dict[str, Any]]:
+        neo4j_queries.labels('read' if self._read_only else 'write').inc()
+        async with self._driver.session(database=self._database) as session:
+            try:
+                if self._read_only:
+                    return await session.execute_read(
+                        self._execute_query, cypher_query, params
+                    )
+                else:
+                    result = await session.run(cypher_query, params)
+                    return [r.data() async for r in result]
+
+            # Catch Cypher syntax errors
+            except exceptions.CypherSyntaxError as e:
+                return [
+                    {
+                        "code": "invalid_cypher",
+                        "message": f"Invalid Cypher statement due to an error: {e}",
+                    }
+                ]
+
+            except exceptions.ClientError as e:
+                # Catch access mode errors
+                if e.code == "Neo.ClientError.Statement.AccessMode":
+                    return [
+                        {
+                            "code": "error",
+                            "message": "Couldn't execute the query due to the read only access to Neo4j",
+                        }
+                    ]
+                else:
+                    return [{"code": "error", "message": e}]
+
+    async def execute_write(
+            self, cypher_query: str, params: Optional[Dict] = {}
+    ) -> List[Dict[str, Any]]:
+        """Run a statement in a write transaction, regardless of read_only."""
+        neo4j_queries.labels('write').inc()
+        async with self._driver.session(database=self._database) as session:
+            return await session.execute_write(self._execute_query, cypher_query, params)
+
+    async def ensure_indexes(self) -> None:
+        """Create the indexes and constraints the application queries rely on."""
+        async with self._driver.session(database=self._database) as session:
+            for schema_query in schema_queries:
+                try:
+                    result = await session.run(schema_query)
+                    await result.consume()
+                except exceptions.Neo4jError as e:
+                    print(f"could not apply schema query {schema_query.strip()}: {e}")
+
+    async def ensure_vector_index(self, model_name: str, dimensions: int) -> None:
+        index_name, property_name = vector_index_names(model_name)
+        async with self._driver.session(database=self._database) as session:
+            result = await session.run(vector_index_query(index_name, property_name, dimensions))
+            await result.consume()
+
+    async def upsert_embeddings(self, model_name: str, rows: [dict]) -> None:
+        """Store the embeddings of {attractionId, embedding} rows on their Attraction nodes."""
+        _, property_name = vector_index_names(model_name)
+        await self.execute_write(upsert_embeddings_query, {"rows": rows, "property": property_name})
+
+    async def refresh_schema(self) -> None:
+        node_props = [el["output"] for el in await self.query(node_properties_query)]
+        rel_props = [el["output"] for el in await self.query(rel_properties_query)]
+        rels = [el["output"] for el in await self.query(rel_query)]
+        schema = schema_text(node_props, rel_props, rels)
+        self.schema = schema
+        print(schema)
+
+    async def refresh_cities(self) -> None:
+        """Reload the in-memory city index, call it whenever City nodes change."""
+        self.cities.load([el["n"] for el in await self.query(cities_query) if "n" in el])
+        print(f"loaded {len(self.cities)} cities")
+
+    async def check_if_empty(self) -> bool:
+        data = await self.query(
+            """
+        MATCH (n)
+        WITH count(n) as c
+        RETURN CASE WHEN c > 0 THEN true ELSE false END AS output
+        """
+        )
+        return data[0]["output"]
+
+    async def get_attractions(self, city_names: [str]):
+
+        data = await self.query(attractions_query, {"city_names": city_names})
+
+        return data
+
+    async def get_similar_attractions(
+            self,
+            model_name: str,
+            embedding: [float],
+            city_names: [str],
+            limit: int = 10
+    ):
+        """Top attractions of the given cities by cosine similarity to the embedding of the model."""
+        _, property_name = vector_index_names(model_name)
+
+        data = await self.query(
+            similar_attractions_query,
+            {
+                "property": property_name,
+                "embedding": embedding,
+                "city_names": city_names,
+                "limit": limit,
+            }
+        )
+
+        return data
+
+    async def get_city(self, city_name: str):
+        if len(self.cities):
+            return self.cities.get_city(city_name)
+
+        data = await self.query(city_query, {"city_name": city_name})
+        if not data:
+            return None
+        return data[0]['n']
+
+    async def find_nearest_cities(self, city_name: str):
+        if len(self.cities):
+            return self.cities.find_nearest_cities(city_name, distance_km=30)
+
+        city = await self.get_city(city_name)
+        if city is None:
+            return []
+
+        data = await self.query(
+            nearest_cities_query,
+            {"latitude": city['lat'], "longitude": city['long'], "distance": 30 * 1000}
+        )
+        return data
+
+    async def close(self) -> None:
+        await self._driver.close()
@@ -0,0 +1,40 @@
+import asyncio
+
+from Utils.data_formatter import merge_entries, process_large_object
+from Utils.lru_cache import LRUCache
+from .async_neo4j_wrapper import AsyncNeo4jDatabase
+
+
+class AttractionCache:
+    """Per-city cache of merged and truncated attraction entries."""
+
+    def __init__(self, database: AsyncNeo4jDatabase, maxsize: int = 512, ttl: float = 3600) -> None:
+        self._database = database
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    async def _load_city(self, city_name: str) -> list:
+        retrieved_items = await self._database.get_attractions(city_names=[city_name])
+        contents = process_large_object(merge_entries(retrieved_items))
+        self._cache.set(city_name, contents)
+        return contents
+
+    async def get_attractions(self, city_names: [str]) -> list:
+        """Formatted entries of all the given cities, loading the missing ones concurrently."""
+        cached = {city_name: self._cache.get(city_name) for city_name in city_names}
+
+        missing = [city_name for city_name, contents in cached.items() if contents is None]
+        if missing:
+            loaded = await asyncio.gather(*[self._load_city(city_name) for city_name in missing])
+            cached.update(zip(missing, loaded))
+
+        return [entry for city_name in city_names for entry in cached[city_name]]
+
+    def invalidate(self, city_name: str = None) -> None:
+        """Drop one city, or every city when no name is given."""
+        if city_name is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(city_name)
+
+    def stats(self) -> dict:
+        return self._cache.stats()
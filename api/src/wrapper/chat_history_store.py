@@ -0,0 +1,154 @@
+import asyncio
+from collections import deque
+from typing import Sequence
+
+from langchain_core.messages import BaseMessage
+
+from Utils.lru_cache import LRUCache
+from .async_neo4j_wrapper import AsyncNeo4jDatabase
+from .neo4j_chathistory_wrapper import BufferedSessionHistory, Neo4jSessionHistory
+from .no_save_neo4j_chat_history_wrapper import NoSaveNeo4jChatMessageHistory
+
+
+class ChatHistoryStore:
+    """Process-wide chat history with a hot in-memory window per session.
+
+    Reads are served from a ring buffer per session, loaded from Neo4j on first
+    use. Writes land in the buffer immediately and are flushed to Neo4j in
+    batches by a background task through a bounded queue.
+    """
+
+    def __init__(
+            self,
+            database: AsyncNeo4jDatabase,
+            window: int = 3,
+            buffer_window: int = 10,
+            max_sessions: int = 10000,
+            queue_size: int = 1000,
+            batch_size: int = 100,
+    ) -> None:
+        self._database = database
+        self._window = window
+        # Same window as Neo4jChatHistoryDatabase, the largest one read
+        self._buffer_window = buffer_window
+        self._buffers = LRUCache(maxsize=max_sessions)
+        # Queued writes per session, their buffers outlive an LRU eviction until flushed
+        self._pending = {}
+        self._pending_buffers = {}
+        self._flushed = asyncio.Condition()
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._batch_size = batch_size
+        self._flush_task = None
+
+    def start(self) -> None:
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        """Flush every pending write, then stop the background task."""
+        if self._flush_task is None:
+            return
+
+        await self._queue.join()
+        self._flush_task.cancel()
+        self._flush_task = None
+
+    def get_session_history_method(self, save_conversation: bool):
+        if save_conversation:
+            return self.get_save_session_history
+        else:
+            return self.get_no_save_session_history
+
+    def get_save_session_history(self, session_id: str) -> BufferedSessionHistory:
+        return BufferedSessionHistory(self, session_id, self._window)
+
+    def get_no_save_session_history(self, session_id: str) -> BufferedSessionHistory:
+        return NoSaveNeo4jChatMessageHistory(self, session_id, self._window)
+
+    async def _get_buffer(self, session_id: str) -> deque:
+        buffer = self._buffers.get(session_id)
+        if buffer is not None:
+            return buffer
+
+        # Reloading would miss the messages still waiting in the queue
+        buffer = self._pending_buffers.get(session_id)
+        if buffer is not None:
+            self._buffers.set(session_id, buffer)
+            return buffer
+
+        history = Neo4jSessionHistory(self._database, session_id, self._buffer_window)
+        messages = await history.aget_messages()
+
+        # Another task may have loaded the session while this one was waiting
+        buffer = self._buffers.get(session_id)
+        if buffer is None:
+            buffer = deque(messages, maxlen=self._buffer_window * 2 + 1)
+            self._buffers.set(session_id, buffer)
+
+        return buffer
+
+    async def get_messages(self, session_id: str, window: int) -> list[BaseMessage]:
+        buffer = await self._get_buffer(session_id)
+        return list(buffer)[-(window * 2 + 1):]
+
+    async def add_messages(self, session_id: str, messages: Sequence[BaseMessage]) -> None:
+        if not messages:
+            return
+
+        buffer = await self._get_buffer(session_id)
+        buffer.extend(messages)
+
+        if self._flush_task is None:
+            await Neo4jSessionHistory(self._database, session_id).aadd_messages(messages)
+            return
+
+        self._pending[session_id] = self._pending.get(session_id, 0) + 1
+        self._pending_buffers[session_id] = buffer
+        try:
+            await self._queue.put((session_id, list(messages)))
+        except BaseException:
+            await self._written([session_id])
+            raise
+
+    async def clear(self, session_id: str) -> None:
+        # Pending writes of the session would otherwise land after the clear
+        async with self._flushed:
+            await self._flushed.wait_for(lambda: session_id not in self._pending)
+        self._buffers.pop(session_id)
+        await Neo4jSessionHistory(self._database, session_id).aclear()
+
+    async def _written(self, session_ids: [str]) -> None:
+        for session_id in session_ids:
+            self._pending[session_id] -= 1
+            if not self._pending[session_id]:
+                del self._pending[session_id]
+                del self._pending_buffers[session_id]
+
+        async with self._flushed:
+            self._flushed.notify_all()
+
+    async def _flush_loop(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self._batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            try:
+                await self._write_batch(batch)
+            except Exception as e:
+                print(f"could not flush chat history: {e}")
+            finally:
+                await self._written([session_id for session_id, _ in batch])
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _write_batch(self, batch: [(str, [BaseMessage])]) -> None:
+        messages_by_session = {}
+        for session_id, messages in batch:
+            messages_by_session.setdefault(session_id, []).extend(messages)
+
+        # One write transaction per session keeps each message chain in order
+        await asyncio.gather(*[
+            Neo4jSessionHistory(self._database, session_id).aadd_messages(messages)
+            for session_id, messages in messages_by_session.items()
+        ])
@@ -0,0 +1,80 @@
+import asyncio
+import os
+
+import numpy as np
+import pandas as pd
+
+vectors_file_name = 'vectors.npy'
+metadata_file_name = 'metadata.parquet'
+
+
+class LocalVectorStore:
+    """Attraction embeddings memory-mapped from a packed float32 matrix.
+
+    Rows are L2-normalized and sorted by city, so the attractions of a city are
+    a contiguous partition and cosine similarity is a plain dot product.
+    The directory is written by Utils.pack_embeddings.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.vectors = np.load(os.path.join(directory, vectors_file_name), mmap_mode='r')
+        self.metadata = pd.read_parquet(os.path.join(directory, metadata_file_name))
+
+        self.partitions = {}
+        city_names = self.metadata['city_name'].to_numpy()
+        if len(city_names):
+            boundaries = np.flatnonzero(city_names[1:] != city_names[:-1]) + 1
+            starts = np.concatenate(([0], boundaries))
+            ends = np.concatenate((boundaries, [len(city_names)]))
+            for start, end in zip(starts, ends):
+                self.partitions[city_names[start]] = (int(start), int(end))
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def search(self, query_vectors: np.ndarray, k: int = 10, city_names: [str] = None) -> [[(int, float)]]:
+        """Top k (row, score) pairs per query, optionally only inside the partitions of the given cities."""
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        if city_names is None:
+            ranges = [(0, len(self.vectors))]
+        else:
+            ranges = [self.partitions[city_name] for city_name in city_names if city_name in self.partitions]
+
+        if not ranges:
+            return [[] for _ in queries]
+
+        rows = np.concatenate([np.arange(start, end) for start, end in ranges])
+        scores = np.concatenate([self.vectors[start:end] @ queries.T for start, end in ranges]).T
+
+        k = min(k, len(rows))
+        results = []
+        for query_scores in scores:
+            top = np.argpartition(-query_scores, k - 1)[:k]
+            top = top[np.argsort(-query_scores[top])]
+            results.append([(int(rows[index]), float(query_scores[index])) for index in top])
+
+        return results
+
+    def get_rows(self, rows: [int]) -> [dict]:
+        """Metadata of the given rows, in the same shape as Neo4jDatabase.get_attractions."""
+        records = self.metadata.iloc[rows]
+        return [
+            {
+                "n.city_name": record.city_name,
+                "n.name": record.name,
+                "n.location": record.location,
+                "n.text": record.text,
+                "n.title": record.title,
+                "n.url": record.url,
+                "attractionId": record.attractionId,
+            }
+            for record in records.itertuples(index=False)
+        ]
+
+    async def get_similar_attractions(self, embedding: [float], city_names: [str], limit: int = 10) -> [dict]:
+        # The matrix product is CPU bound, keep it off the event loop
+        matches = await asyncio.to_thread(self.search, embedding, limit, city_names)
+        rows = [row for row, _ in matches[0]]
+        return self.get_rows(rows)
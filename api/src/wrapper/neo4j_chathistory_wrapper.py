@@ -1,23 +1,111 @@
-from langchain_community.chat_message_histories import Neo4jChatMessageHistory
+from typing import Sequence
+
+from langchain_core.messages import BaseMessage, messages_from_dict
 from langchain_core.messages.ai import AIMessage
 from langchain_core.messages.human import HumanMessage
 
+from .async_neo4j_wrapper import AsyncNeo4jDatabase
+
+# Same graph layout as langchain's Neo4jChatMessageHistory:
+# (:Session)-[:LAST_MESSAGE]->(:Message)<-[:NEXT]-(:Message)...
+add_messages_query = """
+MERGE (s:Session {id: $session_id})
+WITH s
+OPTIONAL MATCH (s)-[lm:LAST_MESSAGE]->(last_message)
+DELETE lm
+WITH s, last_message
+UNWIND $messages AS message
+CREATE (new:Message)
+SET new += message
+WITH s, last_message, collect(new) AS new_messages
+CALL apoc.nodes.link([node IN [last_message] WHERE node IS NOT NULL] + new_messages, 'NEXT')
+WITH s, last(new_messages) AS newest
+CREATE (s)-[:LAST_MESSAGE]->(newest)
+"""
+
+clear_messages_query = """
+MATCH (s:Session {id: $session_id})-[:LAST_MESSAGE]->(last_message)
+MATCH (last_message)<-[:NEXT*0..]-(node)
+DETACH DELETE node
+"""
+
+
+def get_messages_query(window: int) -> str:
+    # Variable length bounds can't be parameters, window is always an int
+    return f"""
+    MATCH (s:Session {{id: $session_id}})-[:LAST_MESSAGE]->(last_message)
+    MATCH p=(last_message)<-[:NEXT*0..{int(window) * 2}]-()
+    WITH p, length(p) AS length
+    ORDER BY length DESC LIMIT 1
+    UNWIND reverse(nodes(p)) AS node
+    RETURN {{data: {{content: node.content}}, type: node.type}} AS result
+    """
+
+
+class Neo4jSessionHistory:
+    """Chat message history of one session on the shared async Neo4j driver.
+
+    Async only, like the driver: RunnableWithMessageHistory uses aget_messages
+    and aadd_messages from ainvoke and astream, invoke isn't supported.
+    """
+
+    def __init__(
+            self,
+            database: AsyncNeo4jDatabase,
+            session_id: str,
+            window: int = 3
+    ) -> None:
+        self._database = database
+        self._session_id = session_id
+        self._window = window
+
+    async def aget_messages(self) -> list[BaseMessage]:
+        records = await self._database.query(get_messages_query(self._window), {"session_id": self._session_id})
+        return messages_from_dict([el["result"] for el in records if "result" in el])
+
+    async def aadd_messages(self, messages: Sequence[BaseMessage]) -> None:
+        if not messages:
+            return
+
+        # All messages are appended to the session chain in one transaction
+        await self._database.execute_write(
+            add_messages_query,
+            {
+                "session_id": self._session_id,
+                "messages": [{"type": message.type, "content": message.content} for message in messages],
+            }
+        )
+
+    async def aclear(self) -> None:
+        await self._database.execute_write(clear_messages_query, {"session_id": self._session_id})
+
+
+class BufferedSessionHistory:
+    """Chat message history of one session served from the ChatHistoryStore buffers, async only."""
+
+    def __init__(self, store, session_id: str, window: int = 3) -> None:
+        self._store = store
+        self._session_id = session_id
+        self._window = window
+
+    async def aget_messages(self) -> list[BaseMessage]:
+        return await self._store.get_messages(self._session_id, self._window)
+
+    async def aadd_messages(self, messages: Sequence[BaseMessage]) -> None:
+        await self._store.add_messages(self._session_id, messages)
+
+    async def aclear(self) -> None:
+        await self._store.clear(self._session_id)
+
 
 class Neo4jChatHistoryDatabase:
     def __init__(
             self,
-            host: str,
-            user: str,
-            password: str,
+            history_store,
             session_id: str,
             window: int = 10
     ) -> None:
-        self._driver = Neo4jChatMessageHistory(
-            url=host,
-            username=user,
-            password=password,
-            session_id=session_id,
-            window=window)
+        self._history = BufferedSessionHistory(history_store, session_id, window)
 
     async def add_messages(self, messages: [(str, str)]):
         new_messages = []
@@ -31,11 +119,10 @@ class Neo4jChatHistoryDatabase:
             else:
                 new_messages.append(HumanMessage(content=text))
 
-        for message in new_messages:
-            self._driver.add_message(message)
+        await self._history.aadd_messages(new_messages)
 
-    def get_messages(self):
-        return self._driver.messages
+    async def get_messages(self):
+        return await self._history.aget_messages()
 
-    def clear_messages(self):
-        return self._driver.clear()
+    async def clear_messages(self):
+        return await self._history.aclear()
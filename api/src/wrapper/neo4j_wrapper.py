@@ -1,5 +1,6 @@
+import re
 from typing import Any, Dict, List, Optional
-from Utils.geospatial_square import calculate_square
+from Utils.city_gazetteer import CityGazetteer
 
 from neo4j import GraphDatabase, exceptions
 
@@ -27,6 +28,72 @@ WHERE type = "RELATIONSHIP" AND elementType = "node"
 RETURN "(:" + label + ")-[:" + property + "]->(:" + toString(other[0]) + ")" AS output
 """
 
+cities_query = """
+MATCH (n:City)
+RETURN n
+"""
+
+attractions_query = """
+MATCH (n:Attraction)
+WHERE n.city_name IN $city_names
+RETURN n.city_name, n.name, n.location, n.text, n.title, n.url
+LIMIT 100
+"""
+
+city_query = """
+MATCH (n:City) WHERE n.Name = $city_name RETURN n LIMIT 1
+"""
+
+nearest_cities_query = """
+MATCH (n:City)
+WHERE point.distance(n.point, point({latitude: $latitude, longitude: $longitude})) < $distance
+RETURN n
+ORDER BY point.distance(n.point, point({latitude: $latitude, longitude: $longitude}))
+LIMIT 10
+"""
+
+# Only the attractions of the given cities are ranked, a global vector index search
+# filtered afterwards often leaves nothing for small cities
+similar_attractions_query = """
+MATCH (n:Attraction)
+WHERE n.city_name IN $city_names AND n[$property] IS NOT NULL
+WITH n, vector.similarity.cosine(n[$property], $embedding) AS score
+RETURN n.city_name, n.name, n.location, n.text, n.title, n.url, score
+ORDER BY score DESC
+LIMIT $limit
+"""
+
+upsert_embeddings_query = """
+UNWIND $rows AS row
+MATCH (n:Attraction {attractionId: row.attractionId})
+CALL db.create.setNodeVectorProperty(n, $property, row.embedding)
+"""
+
+
+def vector_index_names(model_name: str) -> (str, str):
+    """Vector index and node property holding the attraction embeddings of a model."""
+    slug = re.sub(r'\W+', '_', model_name).strip('_').lower()
+    return f"attraction_{slug}", f"embedding_{slug}"
+
+
+def vector_index_query(index_name: str, property_name: str, dimensions: int) -> str:
+    # Index names, properties and options can't be parameters
+    return f"""
+    CREATE VECTOR INDEX {index_name} IF NOT EXISTS
+    FOR (n:Attraction) ON (n.{property_name})
+    OPTIONS {{indexConfig: {{`vector.dimensions`: {int(dimensions)}, `vector.similarity_function`: 'cosine'}}}}
+    """
+
+
+# Indexes and constraints used by the queries above, all idempotent
+schema_queries = [
+    "CREATE CONSTRAINT city_id IF NOT EXISTS FOR (n:City) REQUIRE n.cityId IS UNIQUE",
+    "CREATE CONSTRAINT attraction_id IF NOT EXISTS FOR (n:Attraction) REQUIRE n.attractionId IS UNIQUE",
+    "CREATE INDEX city_name IF NOT EXISTS FOR (n:City) ON (n.Name)",
+    "CREATE INDEX attraction_city_name IF NOT EXISTS FOR (n:Attraction) ON (n.city_name)",
+    "CREATE POINT INDEX city_point IF NOT EXISTS FOR (n:City) ON (n.point)",
+]
+
 
 def schema_text(node_props, rel_props, rels) -> str:
     return f"""
@@ -54,6 +121,7 @@ class Neo4jDatabase:
         self._database = database
         self._read_only = read_only
         self.schema = ""
+        self.cities = CityGazetteer()
         # Verify connection
         try:
             self._driver.verify_connectivity()
@@ -71,6 +139,7 @@ class Neo4jDatabase:
             self.refresh_schema()
         except:
             raise ValueError("Missing APOC Core plugin")
+        self.refresh_cities()
 
     @staticmethod
     def _execute_read_only_query(tx, cypher_query: str, params: Optional[Dict] = {}):
@@ -112,6 +181,15 @@ class Neo4jDatabase:
                 else:
                     return [{"code": "error", "message": e}]
 
+    def ensure_indexes(self) -> None:
+        """Create the indexes and constraints the application queries rely on."""
+        with self._driver.session(database=self._database) as session:
+            for schema_query in schema_queries:
+                try:
+                    session.run(schema_query).consume()
+                except exceptions.Neo4jError as e:
+                    print(f"could not apply schema query {schema_query.strip()}: {e}")
+
     def refresh_schema(self) -> None:
         node_props = [el["output"] for el in self.query(node_properties_query)]
         rel_props = [el["output"] for el in self.query(rel_properties_query)]
@@ -120,6 +198,11 @@ class Neo4jDatabase:
         self.schema = schema
         print(schema)
 
+    def refresh_cities(self) -> None:
+        """Reload the in-memory city index, call it whenever City nodes change."""
+        self.cities.load([el["n"] for el in self.query(cities_query) if "n" in el])
+        print(f"loaded {len(self.cities)} cities")
+
     def check_if_empty(self) -> bool:
         data = self.query(
             """
@@ -132,45 +215,30 @@ class Neo4jDatabase:
 
     def get_attractions(self, city_names: [str]):
 
-        data = self.query(f"""
-             MATCH (n:Attraction)
-             WHERE n.city_name IN {city_names}
-             RETURN n.city_name, n.name, n.location, n.text, n.title, n.url
-             Limit 100
-        """)
+        data = self.query(attractions_query, {"city_names": city_names})
 
         return data
 
     def get_city(self, city_name: str):
-        data = self.query(
-            f"""
-            MATCH (n:City) WHERE n.Name = "{city_name}" RETURN n LIMIT 1;
-            """
-        )
+        if len(self.cities):
+            return self.cities.get_city(city_name)
+
+        data = self.query(city_query, {"city_name": city_name})
         if not data:
             return None
         return data[0]['n']
 
     def find_nearest_cities(self, city_name: str):
+        if len(self.cities):
+            return self.cities.find_nearest_cities(city_name, distance_km=30)
+
         city = self.get_city(city_name)
         if city is None:
             return []
 
-        longitude = city['long']
-        latitude = city['lat']
-        square_corners = calculate_square(latitude, longitude, distance_km=30)
-
         data = self.query(
-            f"""
-            MATCH (n:City) WHERE 
-            
-            n.lat > {square_corners['min_lat']} and 
-            n.lat < {square_corners['max_lat']} and 
-            n.long > {square_corners['min_lon']} and 
-            n.long < {square_corners['max_lon']} 
-            
-            RETURN n LIMIT 10;
-            """
+            nearest_cities_query,
+            {"latitude": city['lat'], "longitude": city['long'], "distance": 30 * 1000}
         )
         return data
 
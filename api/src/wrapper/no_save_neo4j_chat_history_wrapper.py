@@ -1,7 +1,11 @@
-from langchain_community.chat_message_histories import Neo4jChatMessageHistory
+from typing import Sequence
 
+from langchain_core.messages import BaseMessage
 
-class NoSaveNeo4jChatMessageHistory(Neo4jChatMessageHistory):
-    def add_message(self, message):
+from .neo4j_chathistory_wrapper import BufferedSessionHistory
+
+
+class NoSaveNeo4jChatMessageHistory(BufferedSessionHistory):
+    async def aadd_messages(self, messages: Sequence[BaseMessage]) -> None:
         # Override the save method to do nothing, preventing persistence
         pass
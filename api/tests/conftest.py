@@ -0,0 +1,4 @@
+import os
+
+# The OpenAI clients are created at import time and only need a key to exist
+os.environ.setdefault('OPENAI_API_KEY', 'test')
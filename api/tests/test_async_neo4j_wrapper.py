@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+from wrapper.async_neo4j_wrapper import AsyncNeo4jDatabase
+
+query_seconds = 0.3
+tick_seconds = 0.01
+
+
+class SlowRecord:
+    def __init__(self, data: dict) -> None:
+        self._data = data
+
+    def data(self) -> dict:
+        return self._data
+
+
+class SlowResult:
+    def __init__(self, rows: [dict]) -> None:
+        self._rows = rows
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for row in self._rows:
+            yield SlowRecord(row)
+
+
+class SlowTransaction:
+    async def run(self, cypher_query: str, params: dict):
+        # Stands in for the network round trip of a slow query
+        await asyncio.sleep(query_seconds)
+        return SlowResult([{"n": {"Name": name}} for name in params.get("city_names", [])])
+
+
+class SlowSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def execute_read(self, work, *args):
+        return await work(SlowTransaction(), *args)
+
+
+class SlowDriver:
+    def session(self, database: str = None):
+        return SlowSession()
+
+    async def close(self) -> None:
+        pass
+
+
+async def stream_tokens(until: asyncio.Event) -> float:
+    """Ticks like a token stream on another socket, returns the longest gap between ticks."""
+    longest_gap = 0.0
+    last_tick = time.perf_counter()
+    while not until.is_set():
+        await asyncio.sleep(tick_seconds)
+        now = time.perf_counter()
+        longest_gap = max(longest_gap, now - last_tick)
+        last_tick = now
+    return longest_gap
+
+
+def test_slow_query_does_not_delay_other_streams():
+    async def run():
+        database = AsyncNeo4jDatabase("bolt://localhost:7687", "neo4j", "password", "neo4j")
+        await database.close()
+        database._driver = SlowDriver()
+
+        done = asyncio.Event()
+        stream = asyncio.create_task(stream_tokens(done))
+
+        started_at = time.perf_counter()
+        rows = await database.get_attractions(["Tehran"])
+        elapsed = time.perf_counter() - started_at
+        done.set()
+
+        return rows, elapsed, await stream
+
+    rows, elapsed, longest_gap = asyncio.run(run())
+
+    assert rows == [{"n": {"Name": "Tehran"}}]
+    assert elapsed >= query_seconds
+    # The stream kept ticking while the query was waiting on the database
+    assert longest_gap < query_seconds / 3
+
+
+def test_concurrent_queries_overlap():
+    async def run():
+        database = AsyncNeo4jDatabase("bolt://localhost:7687", "neo4j", "password", "neo4j")
+        await database.close()
+        database._driver = SlowDriver()
+
+        started_at = time.perf_counter()
+        await asyncio.gather(*(database.get_attractions([f"city {i}"]) for i in range(10)))
+        return time.perf_counter() - started_at
+
+    assert asyncio.run(run()) < query_seconds * 3
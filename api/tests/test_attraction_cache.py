@@ -0,0 +1,52 @@
+import asyncio
+
+from wrapper.attraction_cache import AttractionCache
+
+
+class CountingDatabase:
+    def __init__(self) -> None:
+        self.loaded = []
+
+    async def get_attractions(self, city_names: [str]):
+        self.loaded.extend(city_names)
+        city_name = city_names[0]
+        return [
+            {"n.name": f"{city_name} bazaar", "n.city_name": city_name, "n.text": "x" * 300, "n.title": "a"},
+            {"n.name": f"{city_name} bazaar", "n.city_name": city_name, "n.text": "y", "n.title": "b"},
+        ]
+
+
+def test_cities_are_loaded_once_and_merged():
+    database = CountingDatabase()
+    cache = AttractionCache(database)
+
+    async def run():
+        first = await cache.get_attractions(["Tehran", "Rey"])
+        second = await cache.get_attractions(["Rey", "Tehran"])
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert database.loaded == ["Tehran", "Rey"]
+    assert [attraction.name for attraction in first] == ["Tehran bazaar", "Rey bazaar"]
+    assert [attraction.name for attraction in second] == ["Rey bazaar", "Tehran bazaar"]
+    # Merged into one entry with its texts already truncated
+    assert first[0].titles == ["a", "b"]
+    assert len(first[0].texts[0]) < 300
+    assert cache.stats() == {"hits": 2, "misses": 2, "size": 2}
+
+
+def test_invalidate_reloads_the_city():
+    database = CountingDatabase()
+    cache = AttractionCache(database)
+
+    async def run():
+        await cache.get_attractions(["Tehran", "Rey"])
+        cache.invalidate("Tehran")
+        await cache.get_attractions(["Tehran", "Rey"])
+        cache.invalidate()
+        await cache.get_attractions(["Rey"])
+
+    asyncio.run(run())
+
+    assert database.loaded == ["Tehran", "Rey", "Tehran", "Rey"]
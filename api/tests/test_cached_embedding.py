@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+from embedding.base_embedding import BaseEmbedding
+from embedding.cached_embedding import CachedEmbedding, normalize_text
+
+
+class CountingEmbedding(BaseEmbedding):
+    model = "counting"
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def embed_query(self, text: str) -> list[float]:
+        self.calls += 1
+        return [float(len(text)), 1.0]
+
+
+def test_variants_of_a_question_share_one_embedding():
+    embedder = CountingEmbedding()
+    cached = CachedEmbedding(embedder)
+
+    async def run():
+        first = await cached.embed_query("جاهای ديدني  تهران")
+        second = await cached.embed_query("جاهای دیدنی تهران")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first is second
+    assert embedder.calls == 1
+    assert normalize_text("می‌خواهم") == "می خواهم"
+
+
+def test_embeddings_are_reused_from_disk(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    embedder = CountingEmbedding()
+
+    asyncio.run(CachedEmbedding(embedder, path=path).embed_query("اصفهان"))
+    second = CachedEmbedding(embedder, path=path)
+    embedding = asyncio.run(second.embed_query("اصفهان"))
+
+    assert embedding == [6.0, 1.0]
+    assert embedder.calls == 1
+    assert second.stats()["disk_hits"] == 1
+
+
+def test_disk_write_does_not_block_the_event_loop(tmp_path):
+    cached = CachedEmbedding(CountingEmbedding(), path=str(tmp_path / "embeddings.sqlite"))
+    write_disk = cached._write_disk
+
+    def slow_write_disk(text, embedding):
+        time.sleep(0.3)
+        write_disk(text, embedding)
+
+    cached._write_disk = slow_write_disk
+
+    async def run():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        await cached.embed_query("شیراز")
+        ticker.cancel()
+        return ticks
+
+    # The loop kept running while the slow commit was in a worker thread
+    assert asyncio.run(run()) >= 10
@@ -0,0 +1,218 @@
+import asyncio
+
+from langchain_community.chat_models.fake import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage, messages_to_dict
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import RunnableLambda
+from langchain_core.runnables.history import RunnableWithMessageHistory
+
+from components.result_generator import ResultGenerator
+from components.similarity import Neo4jSimilarity
+from llm.OpenAI import ChatOpenAIChat
+from wrapper.chat_history_store import ChatHistoryStore
+from wrapper.neo4j_chathistory_wrapper import Neo4jSessionHistory, add_messages_query, clear_messages_query
+
+
+class FakeHistoryDatabase:
+    """Keeps the message chains of AsyncNeo4jDatabase in memory, message writes take write_delay."""
+
+    def __init__(self, write_delay: float = 0.0) -> None:
+        self.sessions = {}
+        self.write_delay = write_delay
+        self.reads = 0
+        self.writes = 0
+
+    async def query(self, cypher_query: str, params: dict = {}) -> [dict]:
+        self.reads += 1
+        messages = self.sessions.get(params["session_id"], [])
+        return [{"result": message} for message in messages_to_dict(messages)]
+
+    async def execute_write(self, cypher_query: str, params: dict = {}) -> [dict]:
+        self.writes += 1
+        if cypher_query == add_messages_query:
+            await asyncio.sleep(self.write_delay)
+            self.sessions.setdefault(params["session_id"], []).extend(
+                HumanMessage(content=message["content"]) if message["type"] == "human"
+                else AIMessage(content=message["content"])
+                for message in params["messages"]
+            )
+        elif cypher_query == clear_messages_query:
+            self.sessions.pop(params["session_id"], None)
+        return []
+
+
+def create_chain(store: ChatHistoryStore, save_conversation: bool = True) -> RunnableWithMessageHistory:
+    prompt = ChatPromptTemplate.from_messages([MessagesPlaceholder(variable_name="chat_history"), ("human", "{question}")])
+    # Answers with the number of messages it was given
+    chain = prompt | RunnableLambda(lambda value: f"{len(value.to_messages())} messages")
+
+    return RunnableWithMessageHistory(
+        chain,
+        get_session_history=store.get_session_history_method(save_conversation),
+        input_messages_key="question",
+        history_messages_key="chat_history",
+    )
+
+
+def test_runnable_with_message_history_uses_the_async_api():
+    database = FakeHistoryDatabase()
+    store = ChatHistoryStore(database)
+    chain = create_chain(store)
+    config = {"configurable": {"session_id": "session"}}
+
+    async def run():
+        first = await chain.ainvoke({"question": "سلام"}, config)
+        second = await chain.ainvoke({"question": "شیراز"}, config)
+        return first, second
+
+    assert asyncio.run(run()) == ("1 messages", "3 messages")
+    assert [message.content for message in database.sessions["session"]] == [
+        "سلام", "1 messages", "شیراز", "3 messages",
+    ]
+
+
+def test_no_save_history_reads_without_writing():
+    database = FakeHistoryDatabase()
+    database.sessions["session"] = [HumanMessage(content="سلام"), AIMessage(content="سلام!")]
+    store = ChatHistoryStore(database)
+    chain = create_chain(store, save_conversation=False)
+
+    answer = asyncio.run(chain.ainvoke({"question": "شیراز"}, {"configurable": {"session_id": "session"}}))
+
+    assert answer == "3 messages"
+    assert database.writes == 0
+
+
+def test_evicted_session_keeps_its_queued_messages():
+    database = FakeHistoryDatabase(write_delay=0.2)
+    store = ChatHistoryStore(database, max_sessions=1)
+
+    async def run():
+        store.start()
+        await store.add_messages("first", [HumanMessage(content="سلام")])
+        # Loading another session evicts the first one while its write is queued
+        await store.get_messages("second", window=3)
+        messages = await store.get_messages("first", window=3)
+        await store.close()
+        return messages
+
+    assert [message.content for message in asyncio.run(run())] == ["سلام"]
+    assert [message.content for message in database.sessions["first"]] == ["سلام"]
+
+
+def test_clear_waits_only_for_the_writes_of_its_session():
+    database = FakeHistoryDatabase(write_delay=0.5)
+    store = ChatHistoryStore(database)
+
+    async def run():
+        store.start()
+        await store.add_messages("busy", [HumanMessage(content="سلام")])
+        await store.add_messages("other", [HumanMessage(content="مرسی")])
+        await asyncio.sleep(0)
+
+        loop = asyncio.get_running_loop()
+        started_at = loop.time()
+        # "quiet" has nothing queued, it doesn't wait for the slow writes of the others
+        await store.clear("quiet")
+        quiet_elapsed = loop.time() - started_at
+
+        await store.clear("other")
+        other_cleared = "other" not in database.sessions
+        await store.close()
+        return quiet_elapsed, other_cleared
+
+    quiet_elapsed, other_cleared = asyncio.run(run())
+
+    assert quiet_elapsed < 0.5
+    assert other_cleared
+
+
+def test_200_concurrent_sessions_keep_their_messages_in_order():
+    database = FakeHistoryDatabase(write_delay=0.01)
+    store = ChatHistoryStore(database)
+
+    async def session(index: int) -> [int]:
+        history = store.get_save_session_history(str(index))
+        seen = []
+        for turn in range(3):
+            seen.append(len(await history.aget_messages()))
+            await history.aadd_messages([HumanMessage(content=f"{index}-{turn}"), AIMessage(content=f"answer {turn}")])
+        return seen
+
+    async def run():
+        store.start()
+        seen = await asyncio.gather(*(session(index) for index in range(200)))
+        await store.close()
+        return seen
+
+    seen = asyncio.run(run())
+
+    # Each turn reads its own earlier turns, served from the buffer while their writes are queued
+    assert all(session_seen == [0, 2, 4] for session_seen in seen)
+    assert len(database.sessions) == 200
+    assert [message.content for message in database.sessions["7"]] == [
+        "7-0", "answer 0", "7-1", "answer 1", "7-2", "answer 2",
+    ]
+    # Batched by the flush loop, never more than one write per saved turn
+    assert database.writes <= 200 * 3
+
+
+class SilentWebSocket:
+    async def send_json(self, message: dict) -> None:
+        pass
+
+    async def stream(self, token: str) -> None:
+        pass
+
+
+class NoSaveSessionHistory(Neo4jSessionHistory):
+    async def aadd_messages(self, messages) -> None:
+        pass
+
+
+class UnbufferedHistoryStore:
+    """How the LLM wrappers used the history before the ChatHistoryStore, every call going to Neo4j."""
+
+    def __init__(self, database) -> None:
+        self._database = database
+
+    def get_session_history_method(self, save_conversation: bool):
+        history_class = Neo4jSessionHistory if save_conversation else NoSaveSessionHistory
+        return lambda session_id: history_class(self._database, session_id)
+
+
+def answer_questions(history_store, questions: [str]) -> None:
+    trip = '{"city": "شیراز", "stay_duration": 3, "mentioned_city": "شیراز"}'
+    model = FakeListChatModel(responses=[trip, "برنامه سفر"] * len(questions))
+    llm = ChatOpenAIChat(SilentWebSocket(), history_store, model=model, model_name="fake")
+    similarity = Neo4jSimilarity(database=None, embedder=None, llm=llm, extraction_mode="structured")
+    result_generator = ResultGenerator(llm=llm)
+
+    async def run():
+        if isinstance(history_store, ChatHistoryStore):
+            history_store.start()
+        for question in questions:
+            assert await similarity.extract_trip_information(question, "session") == (3, "شیراز")
+            await result_generator.run_async(question, "session", [])
+        if isinstance(history_store, ChatHistoryStore):
+            await history_store.close()
+
+    asyncio.run(run())
+
+
+def test_buffer_cuts_neo4j_round_trips_per_question():
+    questions = ["سفر به شیراز", "سه روز", "جاهای دیدنی؟"]
+
+    unbuffered = FakeHistoryDatabase()
+    answer_questions(UnbufferedHistoryStore(unbuffered), questions)
+    buffered = FakeHistoryDatabase()
+    answer_questions(ChatHistoryStore(buffered), questions)
+
+    # Extraction and answer each read the history, the answer saves its turn
+    assert (unbuffered.reads, unbuffered.writes) == (2 * len(questions), len(questions))
+    # The session is read once, then served from the buffer; each saved turn is one batched write
+    assert buffered.reads == 1
+    assert buffered.writes == len(questions)
+    assert [message.content for message in buffered.sessions["session"]] == [
+        message.content for message in unbuffered.sessions["session"]
+    ]
@@ -0,0 +1,112 @@
+import asyncio
+
+from wrapper.async_neo4j_wrapper import AsyncNeo4jDatabase
+from wrapper.neo4j_wrapper import schema_queries
+
+
+class RecordedResult:
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        return
+        yield
+
+    async def consume(self) -> None:
+        pass
+
+
+class RecordingSession:
+    def __init__(self, statements: list) -> None:
+        self.statements = statements
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def run(self, cypher_query: str, params: dict = None):
+        self.statements.append((cypher_query, params))
+        return RecordedResult()
+
+    async def execute_read(self, work, *args):
+        return await work(self, *args)
+
+    async def execute_write(self, work, *args):
+        return await work(self, *args)
+
+
+class RecordingDriver:
+    def __init__(self) -> None:
+        self.statements = []
+
+    def session(self, database: str = None):
+        return RecordingSession(self.statements)
+
+    async def close(self) -> None:
+        pass
+
+
+def recording_database() -> (AsyncNeo4jDatabase, RecordingDriver):
+    database = AsyncNeo4jDatabase("bolt://localhost:7687", "neo4j", "password", "neo4j")
+    asyncio.run(database.close())
+    driver = RecordingDriver()
+    database._driver = driver
+    return database, driver
+
+
+def test_queries_of_different_cities_share_one_statement():
+    database, driver = recording_database()
+
+    async def run():
+        for i in range(50):
+            await database.get_attractions([f"city {i}", "Tehran"])
+            await database.get_city(f"city {i}")
+
+    asyncio.run(run())
+
+    # Neo4j caches plans by statement text, so each query compiles once
+    assert len(driver.statements) == 100
+    assert len({cypher_query for cypher_query, _ in driver.statements}) == 2
+    assert all("city " not in cypher_query for cypher_query, _ in driver.statements)
+    assert driver.statements[0][1] == {"city_names": ["city 0", "Tehran"]}
+
+
+def test_nearest_cities_without_gazetteer_uses_parameters():
+    database, driver = recording_database()
+
+    async def get_city(city_name):
+        return {"lat": 35.7, "long": 51.4}
+
+    database.get_city = get_city
+    asyncio.run(database.find_nearest_cities("Tehran"))
+
+    cypher_query, params = driver.statements[0]
+    assert "$latitude" in cypher_query and "35.7" not in cypher_query
+    assert params == {"latitude": 35.7, "longitude": 51.4, "distance": 30000}
+
+
+def test_ensure_indexes_applies_every_schema_query():
+    database, driver = recording_database()
+
+    asyncio.run(database.ensure_indexes())
+
+    assert [cypher_query for cypher_query, _ in driver.statements] == schema_queries
+    assert any("POINT INDEX" in cypher_query for cypher_query in schema_queries)
+
+
+def test_similar_attractions_rank_only_the_given_cities():
+    database, driver = recording_database()
+
+    asyncio.run(database.get_similar_attractions("nomic-embed-text-v1.5", [0.1, 0.2], ["Tehran", "Rey"], limit=5))
+
+    cypher_query, params = driver.statements[0]
+    assert cypher_query.lstrip().startswith("MATCH (n:Attraction)")
+    assert "vector.similarity.cosine" in cypher_query
+    assert params == {
+        "property": "embedding_nomic_embed_text_v1_5",
+        "embedding": [0.1, 0.2],
+        "city_names": ["Tehran", "Rey"],
+        "limit": 5,
+    }
@@ -0,0 +1,36 @@
+from Utils.data_formatter import Attraction, format_entries, merge_entries, process_large_object
+
+rows = [
+    {"n.name": "Golestan", "n.city_name": "Tehran", "n.location": "loc 1", "n.url": "url 1", "n.title": "history", "n.text": "a"},
+    {"n.name": "Milad", "n.city_name": "Tehran", "n.location": "loc 2", "n.url": None, "n.title": "tower", "n.text": None},
+    {"n.name": "Golestan", "n.city_name": "Tehran", "n.location": "loc 3", "n.url": "url 2", "n.title": "gardens", "n.text": "b"},
+]
+
+
+def test_rows_are_merged_per_name_in_one_record():
+    golestan, milad = merge_entries(rows)
+
+    assert golestan == Attraction(name="Golestan", city_name="Tehran", location="loc 1", url="url 1",
+                                  titles=["history", "gardens"], texts=["a", "b"])
+    assert milad == Attraction(name="Milad", city_name="Tehran", location="loc 2", url="", titles=["tower"], texts=[])
+
+
+def test_format_entries_keeps_the_dict_contract():
+    assert format_entries(rows)[0] == {
+        "n.name": "Golestan",
+        "n.city_name": "Tehran",
+        "n.titles": ["history", "gardens"],
+        "n.texts": ["a", "b"],
+        "n.location": "loc 1",
+        "n.url": "url 1",
+    }
+
+
+def test_texts_are_truncated_more_when_there_are_many():
+    one_text = Attraction(name="one", texts=["x" * 300])
+    many_texts = Attraction(name="many", texts=["x" * 300] * 20)
+
+    process_large_object([one_text, many_texts])
+
+    assert one_text.texts == ["x" * 190 + "..."]
+    assert many_texts.texts[0] == "x" * 50 + "..."
@@ -0,0 +1,185 @@
+import asyncio
+import json
+import sys
+
+import pandas as pd
+
+from Utils.embedding_pipeline import collect_checkpoints, generate_checkpoints, read_embeddings, run_cli
+from Utils.mapper import attractions_output_name, map_attractions
+
+
+def build_text(attraction):
+    return f"{attraction['city_name']}, {attraction['name']}, {attraction['title']}: {attraction['text']}"
+
+
+class StubEmbedder:
+    """Embeds a text as [len(text), attractionId taken from the text], recording every text it was given."""
+
+    def __init__(self) -> None:
+        self.texts = []
+
+    def create_embed_batch(self):
+        async def embed_batch(texts):
+            self.texts.extend(texts)
+            return [[float(len(text)), float(text.split("#")[1])] for text in texts]
+
+        return embed_batch
+
+
+def write_attractions(path, texts: dict) -> None:
+    pd.DataFrame([
+        {"attractionId": attraction_id, "city_name": "Tehran", "name": f"attraction #{attraction_id}#",
+         "title": "about", "text": text}
+        for attraction_id, text in texts.items()
+    ]).to_csv(path, index=False)
+
+
+def run(monkeypatch, embedder: StubEmbedder, input_path, output_path) -> None:
+    monkeypatch.setattr(sys, "argv", ["embed", "--input", str(input_path), "--output", str(output_path),
+                                      "--batch-size", "2"])
+    run_cli(build_text, embedder.create_embed_batch)
+
+
+def embedded(output_path) -> dict:
+    ids, vectors = read_embeddings(str(output_path))
+    return {int(attraction_id): vector.tolist() for attraction_id, vector in zip(ids, vectors)}
+
+
+def test_first_run_embeds_every_attraction(tmp_path, monkeypatch):
+    input_path, output_path = tmp_path / "attractions.csv", tmp_path / "embeddings.npy"
+    write_attractions(input_path, {1: "palace", 2: "tower", 3: "bazaar"})
+    embedder = StubEmbedder()
+
+    run(monkeypatch, embedder, input_path, output_path)
+
+    assert len(embedder.texts) == 3
+    assert sorted(embedded(output_path)) == [1, 2, 3]
+    assert embedded(output_path)[2][1] == 2.0
+    assert not (tmp_path / "embeddings.npy.checkpoints").exists()
+    assert json.loads((tmp_path / "embeddings.delta.deleted.json").read_text()) == []
+
+
+def test_incremental_run_embeds_only_changed_and_new(tmp_path, monkeypatch):
+    input_path, output_path = tmp_path / "attractions.csv", tmp_path / "embeddings.npy"
+    write_attractions(input_path, {1: "palace", 2: "tower", 3: "bazaar"})
+    run(monkeypatch, StubEmbedder(), input_path, output_path)
+    before = embedded(output_path)
+
+    write_attractions(input_path, {1: "palace", 2: "the tallest tower", 3: "bazaar", 4: "garden"})
+    embedder = StubEmbedder()
+    run(monkeypatch, embedder, input_path, output_path)
+
+    assert [text.split("#")[1] for text in embedder.texts] == ["2", "4"]
+    after = embedded(output_path)
+    assert sorted(after) == [1, 2, 3, 4]
+    assert after[1] == before[1]
+    assert after[2][0] > before[2][0]
+    delta_ids, _ = read_embeddings(str(tmp_path / "embeddings.delta.npy"))
+    assert sorted(delta_ids.tolist()) == [2, 4]
+
+
+def test_deleted_attractions_are_removed(tmp_path, monkeypatch):
+    input_path, output_path = tmp_path / "attractions.csv", tmp_path / "embeddings.parquet"
+    write_attractions(input_path, {1: "palace", 2: "tower", 3: "bazaar"})
+    run(monkeypatch, StubEmbedder(), input_path, output_path)
+
+    write_attractions(input_path, {1: "palace", 3: "bazaar"})
+    embedder = StubEmbedder()
+    run(monkeypatch, embedder, input_path, output_path)
+
+    assert embedder.texts == []
+    assert sorted(embedded(output_path)) == [1, 3]
+    assert json.loads((tmp_path / "embeddings.delta.deleted.json").read_text()) == [2]
+
+
+def test_interrupted_run_resumes_from_checkpoints(tmp_path, monkeypatch):
+    rows = [(i, f"attraction #{i}#") for i in range(6)]
+    checkpoint_dir = str(tmp_path / "checkpoints")
+
+    async def failing_embed_batch(texts):
+        if "#4#" in texts[0]:
+            raise RuntimeError("rate limited")
+        return [[float(len(text)), float(text.split("#")[1])] for text in texts]
+
+    async def no_backoff(seconds):
+        pass
+
+    with monkeypatch.context() as patch:
+        patch.setattr(asyncio, "sleep", no_backoff)
+        try:
+            asyncio.run(generate_checkpoints(rows, failing_embed_batch, checkpoint_dir, batch_size=2, concurrency=1))
+        except RuntimeError:
+            pass
+
+    embedder = StubEmbedder()
+    batches = asyncio.run(generate_checkpoints(rows, embedder.create_embed_batch(), checkpoint_dir, batch_size=2))
+    ids, vectors = collect_checkpoints(checkpoint_dir)
+
+    assert batches == 3
+    assert embedder.texts == ["attraction #4#", "attraction #5#"]
+    assert ids.tolist() == list(range(6))
+    assert vectors[:, 1].tolist() == [float(i) for i in range(6)]
+
+
+def test_resume_with_another_batch_size_embeds_every_row(tmp_path, monkeypatch):
+    rows = [(i, f"attraction #{i}#") for i in range(8)]
+    checkpoint_dir = str(tmp_path / "checkpoints")
+
+    async def failing_embed_batch(texts):
+        if "#4#" in texts[0]:
+            raise RuntimeError("rate limited")
+        return [[float(len(text)), float(text.split("#")[1])] for text in texts]
+
+    async def no_backoff(seconds):
+        pass
+
+    with monkeypatch.context() as patch:
+        patch.setattr(asyncio, "sleep", no_backoff)
+        try:
+            asyncio.run(generate_checkpoints(rows, failing_embed_batch, checkpoint_dir, batch_size=2, concurrency=1))
+        except RuntimeError:
+            pass
+
+    # The checkpoints of rows 0 to 3 hold the batches of two rows, none of them matches a batch of four
+    embedder = StubEmbedder()
+    batches = asyncio.run(generate_checkpoints(rows, embedder.create_embed_batch(), checkpoint_dir, batch_size=4))
+    ids, vectors = collect_checkpoints(checkpoint_dir, batches)
+
+    assert batches == 2
+    assert embedder.texts == [f"attraction #{i}#" for i in range(8)]
+    assert ids.tolist() == list(range(8))
+    assert vectors[:, 1].tolist() == [float(i) for i in range(8)]
+
+
+def test_unchanged_run_removes_the_previous_delta(tmp_path, monkeypatch):
+    input_path, output_path = tmp_path / "attractions.csv", tmp_path / "embeddings.npy"
+    write_attractions(input_path, {1: "palace", 2: "tower"})
+    run(monkeypatch, StubEmbedder(), input_path, output_path)
+    assert (tmp_path / "embeddings.delta.npy").exists()
+
+    embedder = StubEmbedder()
+    run(monkeypatch, embedder, input_path, output_path)
+
+    assert embedder.texts == []
+    assert not (tmp_path / "embeddings.delta.npy").exists()
+    assert not (tmp_path / "embeddings.delta.ids.npy").exists()
+    assert json.loads((tmp_path / "embeddings.delta.deleted.json").read_text()) == []
+    assert sorted(embedded(output_path)) == [1, 2]
+
+
+def test_reads_the_parquet_written_by_the_mapper(tmp_path, monkeypatch):
+    attractions_path, cities_path = tmp_path / "attractions.csv", tmp_path / "Cities.csv"
+    pd.DataFrame([
+        {"city_name": "Tehran", "name": "attraction #1#", "title": "about", "text": "palace"},
+        {"city_name": "Tehran", "name": "attraction #2#", "title": "about", "text": "tower"},
+    ]).to_csv(attractions_path, index=False)
+    pd.DataFrame([{"cityId": 1, "Name": "Tehran"}]).to_csv(cities_path, index=False)
+    map_attractions(str(attractions_path), str(cities_path), str(tmp_path / "data"))
+
+    output_path = tmp_path / "embeddings.npy"
+    embedder = StubEmbedder()
+    run(monkeypatch, embedder, tmp_path / "data" / attractions_output_name, output_path)
+
+    mapped = pd.read_parquet(tmp_path / "data" / attractions_output_name)
+    assert sorted(embedder.texts) == ["Tehran, attraction #1#, about: palace", "Tehran, attraction #2#, about: tower"]
+    assert sorted(embedded(output_path)) == sorted(mapped["attractionId"].tolist())
@@ -0,0 +1,68 @@
+import asyncio
+import os
+
+from embedding import GPT4ALL
+from embedding.GPT4ALL import Gpt4AllEmbedding
+
+
+def embed_batch_sizes(texts: [str], model: str) -> [[float]]:
+    # Runs in the worker process, every embedding carries the size of its batch
+    return [[float(len(texts)), float(i)] for i in range(len(texts))]
+
+
+def crash_once(texts: [str], model: str) -> [[float]]:
+    marker = os.environ["CRASH_MARKER"]
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return embed_batch_sizes(texts, model)
+
+
+def fail(texts: [str], model: str) -> [[float]]:
+    raise RuntimeError("model not found")
+
+
+def test_concurrent_queries_are_embedded_in_one_batch(monkeypatch):
+    monkeypatch.setattr(GPT4ALL, "embed_texts", embed_batch_sizes)
+    embedder = Gpt4AllEmbedding(max_workers=1, batch_window=0.05)
+
+    async def run():
+        return await asyncio.gather(*(embedder.embed_query(f"question {i}") for i in range(8)))
+
+    embeddings = asyncio.run(run())
+    embedder._executor.shutdown()
+
+    assert embeddings == [[8.0, float(i)] for i in range(8)]
+
+
+def test_broken_pool_is_recreated(monkeypatch, tmp_path):
+    monkeypatch.setattr(GPT4ALL, "embed_texts", crash_once)
+    monkeypatch.setenv("CRASH_MARKER", str(tmp_path / "crashed"))
+    embedder = Gpt4AllEmbedding(max_workers=1)
+
+    async def run():
+        first = await embedder.embed_query("question")
+        first_executor = embedder._executor
+        second = await embedder.embed_query("question")
+        return first, second, first_executor
+
+    first, second, first_executor = asyncio.run(run())
+    embedder._executor.shutdown()
+
+    # The worker died on the first batch, which was retried on a new pool
+    assert (tmp_path / "crashed").exists()
+    assert first == second == [1.0, 0.0]
+    assert first_executor is embedder._executor
+
+
+def test_errors_reach_every_query_of_the_batch(monkeypatch):
+    monkeypatch.setattr(GPT4ALL, "embed_texts", fail)
+    embedder = Gpt4AllEmbedding(max_workers=1)
+
+    async def run():
+        return await asyncio.gather(*(embedder.embed_query(f"question {i}") for i in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    embedder._executor.shutdown()
+
+    assert [str(result) for result in results] == ["model not found"] * 3
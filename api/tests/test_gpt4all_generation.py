@@ -0,0 +1,143 @@
+import asyncio
+import queue
+import threading
+import time
+
+from langchain_community.llms import GPT4All
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+from llm.GPT4ALL import Gpt4AllChat
+from llm.inference_scheduler import InferenceScheduler
+from Utils.stream_writer import StreamWriter
+from test_chat_history_store import FakeHistoryDatabase
+from wrapper.chat_history_store import ChatHistoryStore
+
+token_count = 200
+token_seconds = 0.005
+
+
+class FakeNativeModel:
+    """Generates like the gpt4all bindings: a native thread that only the callback can stop."""
+
+    def __init__(self) -> None:
+        self.generated = 0
+        self.finished = threading.Event()
+
+    def generate(self, prompt: str, callback=None, **params):
+        tokens = queue.Queue()
+
+        def run():
+            for i in range(token_count):
+                time.sleep(token_seconds)
+                self.generated += 1
+                if callback is not None and not callback(i, f"t{i} "):
+                    break
+                tokens.put(f"t{i} ")
+            tokens.put(None)
+            self.finished.set()
+
+        threading.Thread(target=run, daemon=True).start()
+        while (token := tokens.get()) is not None:
+            yield token
+
+
+class FakeWebSocket:
+    def __init__(self) -> None:
+        self.frames = []
+
+    async def send_text(self, frame: str) -> None:
+        self.frames.append(frame)
+
+
+def create_chat(client: FakeNativeModel, history_store: ChatHistoryStore = None) -> (Gpt4AllChat, InferenceScheduler,
+                                                                                    StreamWriter):
+    model = GPT4All.construct(client=client, model="fake.gguf")
+    scheduler = InferenceScheduler(lambda: model, model=model)
+    writer = StreamWriter(FakeWebSocket())
+    writer.start()
+    history_store = history_store if history_store is not None else ChatHistoryStore(database=None)
+    chat = Gpt4AllChat(writer, history_store, scheduler=scheduler, model_name="fake.gguf")
+    return chat, scheduler, writer
+
+
+def generate(chat: Gpt4AllChat, use_history: bool = False):
+    prompt = ChatPromptTemplate.from_messages([
+        MessagesPlaceholder(variable_name="chat_history", optional=True),
+        ("human", "{similars} {question}"),
+    ])
+    return chat.generate_streaming("سفر به شیراز", "session", "", prompt, use_history=use_history)
+
+
+def test_generation_streams_every_token():
+    client = FakeNativeModel()
+
+    async def run():
+        chat, scheduler, writer = create_chat(client)
+        response = await generate(chat)
+        await writer.close()
+        return response
+
+    response = asyncio.run(run())
+    assert client.generated == token_count
+    assert response.startswith("t0 t1 ")
+
+
+def test_cancelled_generation_stops_the_model_and_frees_the_slot():
+    client = FakeNativeModel()
+
+    async def run():
+        chat, scheduler, writer = create_chat(client)
+        task = asyncio.create_task(generate(chat))
+        await asyncio.sleep(token_seconds * 10)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+        # The native thread stopped before the slot was handed back
+        assert client.finished.is_set()
+        async with scheduler.job("next") as job:
+            assert job.queue_wait < token_seconds
+        await writer.close()
+
+    asyncio.run(run())
+    assert client.generated < token_count / 2
+
+
+def test_cancelled_generation_is_not_saved_to_the_history():
+    client = FakeNativeModel()
+    database = FakeHistoryDatabase()
+
+    async def run():
+        history_store = ChatHistoryStore(database)
+        history_store.start()
+        chat, scheduler, writer = create_chat(client, history_store)
+
+        task = asyncio.create_task(generate(chat, use_history=True))
+        await asyncio.sleep(token_seconds * 10)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+        messages = await history_store.get_messages("session", window=3)
+        await history_store.close()
+        await writer.close()
+        return messages
+
+    assert asyncio.run(run()) == []
+    assert database.sessions == {}
+
+
+def test_finished_generation_is_saved_to_the_history():
+    database = FakeHistoryDatabase()
+
+    async def run():
+        history_store = ChatHistoryStore(database)
+        history_store.start()
+        chat, scheduler, writer = create_chat(FakeNativeModel(), history_store)
+        response = await generate(chat, use_history=True)
+        await history_store.close()
+        await writer.close()
+        return response
+
+    response = asyncio.run(run())
+    human, answer = database.sessions["session"]
+    assert human.content == "سفر به شیراز"
+    assert answer.content.strip() == response
@@ -0,0 +1,136 @@
+import argparse
+import asyncio
+
+import numpy as np
+import pandas as pd
+
+from test_cypher_parameters import recording_database
+from Utils.embedding_pipeline import write_embeddings
+from Utils.graph_loader import (attractions_query, backfill_city_points, backfill_city_points_query, cities_query,
+                                connections_query, iter_embedding_batches, load_graph)
+from wrapper.neo4j_wrapper import schema_queries, upsert_embeddings_query
+
+
+def write_inputs(tmp_path, embeddings_name: str = "embeddings.npy") -> argparse.Namespace:
+    pd.DataFrame({
+        # pandas wrote some ids as floats
+        'cityId': ["1.0", "2", "3"],
+        'city_name': ["تهران", "شیراز", "یزد"],
+        'lat': ["35.7", "29.6", ""],
+        'long': ["51.4", "52.5", ""],
+    }).to_csv(tmp_path / "Cities.csv", index=False)
+    pd.DataFrame({
+        'attractionId': [10, 11, 12, 13, 14],
+        'city_name': ["تهران", "تهران", "شیراز", "شیراز", "یزد"],
+        'name': ["کاخ گلستان", "برج میلاد", "باغ ارم", "حافظیه", "باغ دولت‌آباد"],
+        'title': ["تاریخچه"] * 5,
+        'text': ["متن"] * 5,
+        'url': [""] * 5,
+    }).to_parquet(tmp_path / "attractions.parquet", index=False)
+    pd.DataFrame({'attractionId': [10, 11, 12, 13, 14], 'cityId': [1, 1, 2, 2, 3]}).to_csv(
+        tmp_path / "connections.csv", index=False)
+    write_embeddings(str(tmp_path / embeddings_name), np.array([10, 11, 12, 13, 14], dtype=np.int64),
+                     np.arange(10, dtype=np.float32).reshape(5, 2))
+
+    return argparse.Namespace(
+        cities=str(tmp_path / "Cities.csv"),
+        attractions=str(tmp_path / "attractions.parquet"),
+        connections=str(tmp_path / "connections.csv"),
+        embeddings=str(tmp_path / embeddings_name),
+        embedding_backend='openai',
+        relationship='LOCATED_IN',
+        backfill_points=False,
+        batch_size=2,
+    )
+
+
+def run_loader(args: argparse.Namespace) -> list:
+    database, driver = recording_database()
+    asyncio.run(load_graph(database, args))
+    return driver.statements
+
+
+def test_nodes_load_in_batches_before_their_connections(tmp_path):
+    statements = run_loader(write_inputs(tmp_path))
+    queries = [query for query, _ in statements]
+
+    assert queries[:len(schema_queries)] == schema_queries
+    node_positions = [i for i, query in enumerate(queries) if query in (cities_query, attractions_query)]
+    link_positions = [i for i, query in enumerate(queries)
+                      if query in (connections_query('LOCATED_IN'), upsert_embeddings_query)]
+    assert len(node_positions) == 2 + 3
+    assert len(link_positions) == 3 + 3
+    assert max(node_positions) < min(link_positions)
+
+    for query, params in statements:
+        if params and "rows" in params:
+            assert 1 <= len(params["rows"]) <= 2
+
+
+def test_statements_merge_on_the_ids_with_converted_rows(tmp_path):
+    statements = run_loader(write_inputs(tmp_path))
+
+    assert "MERGE (n:City {cityId: row.cityId})" in cities_query
+    assert "MERGE (n:Attraction {attractionId: row.attractionId})" in attractions_query
+
+    city_rows = [row for query, params in statements if query == cities_query for row in params["rows"]]
+    assert city_rows == [
+        {'cityId': 1, 'city_name': "تهران", 'lat': 35.7, 'long': 51.4},
+        {'cityId': 2, 'city_name': "شیراز", 'lat': 29.6, 'long': 52.5},
+        # Empty coordinates are left out, so the point is set to null
+        {'cityId': 3, 'city_name': "یزد"},
+    ]
+
+    attraction_rows = [row for query, params in statements if query == attractions_query for row in params["rows"]]
+    assert [row['attractionId'] for row in attraction_rows] == [10, 11, 12, 13, 14]
+    assert "url" not in attraction_rows[0]
+
+    connection_rows = [row for query, params in statements
+                       if query == connections_query('LOCATED_IN') for row in params["rows"]]
+    assert connection_rows[0] == {'attractionId': 10, 'cityId': 1}
+
+    embedding_params = [params for query, params in statements if query == upsert_embeddings_query]
+    assert {params["property"] for params in embedding_params} == {"embedding_text_embedding_ada_002"}
+    assert embedding_params[0]["rows"] == [
+        {"attractionId": 10, "embedding": [0.0, 1.0]},
+        {"attractionId": 11, "embedding": [2.0, 3.0]},
+    ]
+
+
+def test_parquet_embeddings_are_streamed_in_batches(tmp_path):
+    args = write_inputs(tmp_path, "embeddings.parquet")
+
+    batches = list(iter_embedding_batches(args.embeddings, 2))
+
+    assert [len(rows) for rows in batches] == [2, 2, 1]
+    assert batches[2] == [{"attractionId": 14, "embedding": [8.0, 9.0]}]
+
+
+class BackfillDatabase:
+    """Has cities_without_point cities to migrate, updating at most $limit per statement."""
+
+    def __init__(self, cities_without_point: int) -> None:
+        self.remaining = cities_without_point
+        self.limits = []
+
+    async def execute_write(self, cypher_query: str, params: dict = {}) -> [dict]:
+        assert cypher_query == backfill_city_points_query
+        self.limits.append(params["limit"])
+        updated = min(self.remaining, params["limit"])
+        self.remaining -= updated
+        return [{"updated": updated}]
+
+
+def test_city_points_are_backfilled_in_bounded_batches():
+    database = BackfillDatabase(cities_without_point=5)
+
+    assert asyncio.run(backfill_city_points(database, 2)) == 5
+    assert database.limits == [2, 2, 2, 2]
+
+
+def test_schema_queries_only_create_indexes_and_constraints(tmp_path):
+    # The point backfill is a data migration, startup must not run it
+    assert all(query.lstrip().startswith("CREATE ") for query in schema_queries)
+
+    statements = run_loader(write_inputs(tmp_path))
+    assert backfill_city_points_query not in [query for query, _ in statements]
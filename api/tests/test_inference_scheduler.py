@@ -0,0 +1,64 @@
+import asyncio
+
+from prometheus_client import REGISTRY
+
+from llm.inference_scheduler import EXTRACTION_PRIORITY, GENERATION_PRIORITY, InferenceScheduler
+
+
+def queue_wait_count(priority: int) -> float:
+    return REGISTRY.get_sample_value('travel_adviser_inference_queue_wait_seconds_count',
+                                     {'priority': str(priority)}) or 0.0
+
+
+def test_extraction_jobs_run_before_queued_generations(capsys):
+    scheduler = InferenceScheduler(lambda: object(), model=object())
+    order = []
+
+    async def run_job(name: str, priority: int):
+        async with scheduler.job(name, priority) as job:
+            order.append(name)
+            await asyncio.sleep(0.01)
+            job.tokens = 10
+
+    async def run():
+        first = asyncio.create_task(run_job("first", GENERATION_PRIORITY))
+        await asyncio.sleep(0)
+        await asyncio.gather(first, run_job("generation", GENERATION_PRIORITY),
+                             run_job("extraction", EXTRACTION_PRIORITY))
+
+    observed = queue_wait_count(GENERATION_PRIORITY), queue_wait_count(EXTRACTION_PRIORITY)
+    asyncio.run(run())
+
+    assert order == ["first", "extraction", "generation"]
+    assert scheduler.stats()["jobs"] == 3
+    assert queue_wait_count(GENERATION_PRIORITY) == observed[0] + 2
+    assert queue_wait_count(EXTRACTION_PRIORITY) == observed[1] + 1
+    # Reported through metrics, nothing is printed per job
+    assert capsys.readouterr().out == ""
+
+
+def tokens_per_second(priority: int) -> (float, float):
+    labels = {'priority': str(priority)}
+    return (REGISTRY.get_sample_value('travel_adviser_inference_tokens_per_second_count', labels) or 0.0,
+            REGISTRY.get_sample_value('travel_adviser_inference_tokens_per_second_sum', labels) or 0.0)
+
+
+def test_tokens_per_second_is_observed_per_job():
+    scheduler = InferenceScheduler(lambda: object(), model=object())
+
+    async def run_job(tokens: int):
+        async with scheduler.job("session", EXTRACTION_PRIORITY) as job:
+            await asyncio.sleep(0.1)
+            job.tokens = tokens
+
+    async def run():
+        await run_job(50)
+        # A job that generated nothing, e.g. cancelled before its first token, says nothing about speed
+        await run_job(0)
+
+    count, total = tokens_per_second(EXTRACTION_PRIORITY)
+    asyncio.run(run())
+    new_count, new_total = tokens_per_second(EXTRACTION_PRIORITY)
+
+    assert new_count == count + 1
+    assert 250 < new_total - total <= 500
@@ -0,0 +1,78 @@
+import asyncio
+import os
+
+import numpy as np
+import pandas as pd
+
+from Utils.pack_embeddings import pack_embeddings
+from wrapper.local_vector_store import LocalVectorStore, metadata_file_name, vectors_file_name
+
+
+def write_store(directory, city_names: [str], dimensions: int = 16) -> np.ndarray:
+    vectors = np.random.default_rng(0).standard_normal((len(city_names), dimensions)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.save(os.path.join(directory, vectors_file_name), vectors)
+    pd.DataFrame({
+        "attractionId": np.arange(len(city_names)) + 100,
+        "city_name": city_names,
+        "name": [f"attraction {i}" for i in range(len(city_names))],
+        "location": "", "text": "", "title": "", "url": "",
+    }).to_parquet(os.path.join(directory, metadata_file_name), index=False)
+    return vectors
+
+
+def test_search_matches_brute_force(tmp_path):
+    vectors = write_store(tmp_path, ["Rey"] * 20 + ["Tehran"] * 30)
+    store = LocalVectorStore(str(tmp_path))
+    queries = np.random.default_rng(1).standard_normal((3, vectors.shape[1]))
+
+    results = store.search(queries, k=5)
+
+    expected = np.argsort(-(vectors @ (queries / np.linalg.norm(queries, axis=1, keepdims=True)).T).T, axis=1)[:, :5]
+    assert [[row for row, _ in matches] for matches in results] == expected.tolist()
+    assert len(store) == 50
+
+
+def test_search_inside_city_partitions(tmp_path):
+    vectors = write_store(tmp_path, ["Karaj"] * 10 + ["Rey"] * 20 + ["Tehran"] * 30)
+    store = LocalVectorStore(str(tmp_path))
+
+    assert store.partitions == {"Karaj": (0, 10), "Rey": (10, 30), "Tehran": (30, 60)}
+
+    [matches] = store.search(vectors[45], k=40, city_names=["Karaj", "Tehran", "Unknown"])
+    rows = [row for row, _ in matches]
+    assert rows[0] == 45
+    assert sorted(rows) == list(range(10)) + list(range(30, 60))
+    assert store.search(vectors[0], city_names=["Unknown"]) == [[]]
+
+
+def test_similar_attractions_map_back_to_metadata(tmp_path):
+    vectors = write_store(tmp_path, ["Rey"] * 5 + ["Tehran"] * 5)
+    store = LocalVectorStore(str(tmp_path))
+
+    rows = asyncio.run(store.get_similar_attractions(vectors[7].tolist(), ["Tehran"], limit=2))
+
+    assert rows[0]["attractionId"] == 107
+    assert rows[0]["n.name"] == "attraction 7"
+    assert all(row["n.city_name"] == "Tehran" for row in rows)
+
+
+def test_pack_embeddings_from_the_mapper_parquet(tmp_path):
+    pd.DataFrame({
+        "attractionId": np.array([3, 1, 2], dtype=np.int64),
+        "city_name": ["Tehran", "Rey", "Tehran"],
+        "name": ["palace", "shrine", "tower"],
+        "title": "", "text": "", "url": "", "location": "",
+    }).to_parquet(tmp_path / "attractions.parquet", index=False)
+    # Attraction 4 was embedded but no longer exists
+    ids = np.array([1, 2, 3, 4], dtype=np.int64)
+    vectors = np.eye(4, dtype=np.float32) * 2
+
+    count = pack_embeddings(ids, vectors, str(tmp_path / "attractions.parquet"), str(tmp_path / "store"))
+
+    store = LocalVectorStore(str(tmp_path / "store"))
+    assert count == 3
+    assert store.metadata["city_name"].tolist() == ["Rey", "Tehran", "Tehran"]
+    [matches] = store.search(np.array([0, 0, 1, 0]), k=1)
+    assert store.get_rows([matches[0][0]])[0]["n.name"] == "palace"
+    assert np.allclose(np.linalg.norm(store.vectors, axis=1), 1)
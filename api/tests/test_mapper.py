@@ -0,0 +1,68 @@
+import pandas as pd
+
+from Utils.mapper import attractions_output_name, connections_output_name, map_attractions, stable_id
+
+
+def write_inputs(tmp_path, rows: [dict]) -> (str, str):
+    attractions_path, cities_path = tmp_path / "attractions.csv", tmp_path / "Cities.csv"
+    pd.DataFrame(rows).to_csv(attractions_path, index=False)
+    pd.DataFrame([{"cityId": 1, "Name": "Tehran"}, {"cityId": 2, "Name": "Shiraz"}]).to_csv(cities_path, index=False)
+    return str(attractions_path), str(cities_path)
+
+
+def section(name: str, title: str, text: str, city_name: str = "Tehran") -> dict:
+    return {"city_name": city_name, "name": name, "title": title, "text": text}
+
+
+def test_sections_sharing_a_title_get_distinct_ids(tmp_path):
+    rows = [
+        section("Golestan", "history", "built by the Qajars"),
+        section("Golestan", "history", "listed by UNESCO"),
+        section("Golestan", "visit", "open every day"),
+        section("Eram", "history", "built by the Qajars", city_name="Shiraz"),
+        # Same city, name, title and text, still a section of its own
+        section("Golestan", "history", "built by the Qajars"),
+    ]
+    attractions_path, cities_path = write_inputs(tmp_path, rows)
+
+    attractions, connections = map_attractions(attractions_path, cities_path, str(tmp_path / "data"), chunksize=2)
+
+    mapped = pd.read_parquet(tmp_path / "data" / attractions_output_name)
+    # Every row has its own id, so graph_loader never MERGEs two of them into one node
+    assert mapped["attractionId"].nunique() == 5
+    assert (attractions, connections) == (5, 5)
+
+    linked = pd.read_parquet(tmp_path / "data" / connections_output_name)
+    assert dict(zip(linked["attractionId"], linked["cityId"]))[mapped["attractionId"][3]] == 2
+
+
+def test_ids_are_stable_across_runs_and_existing_ids_are_kept(tmp_path):
+    rows = [section("Golestan", "history", "built by the Qajars"), section("Milad", "visit", "tower")]
+    attractions_path, cities_path = write_inputs(tmp_path, rows)
+    map_attractions(attractions_path, cities_path, str(tmp_path / "first"))
+
+    rows = [dict(rows[1], attractionId=42), section("Azadi", "visit", "square"), rows[0]]
+    attractions_path, cities_path = write_inputs(tmp_path, rows)
+    map_attractions(attractions_path, cities_path, str(tmp_path / "second"))
+
+    first = pd.read_parquet(tmp_path / "first" / attractions_output_name).set_index("name")["attractionId"]
+    second = pd.read_parquet(tmp_path / "second" / attractions_output_name).set_index("name")["attractionId"]
+    assert second["Golestan"] == first["Golestan"] == stable_id("Tehran", "Golestan", "history")
+    assert second["Milad"] == 42
+    assert 0 <= second["Azadi"] < 2 ** 63
+
+
+def test_edited_section_keeps_its_id(tmp_path):
+    rows = [section("Golestan", "history", "built by the Qajars"), section("Golestan", "history", "listed by UNESCO")]
+    attractions_path, cities_path = write_inputs(tmp_path, rows)
+    map_attractions(attractions_path, cities_path, str(tmp_path / "first"))
+
+    rows[1] = section("Golestan", "history", "listed by UNESCO in 2013")
+    attractions_path, cities_path = write_inputs(tmp_path, rows)
+    map_attractions(attractions_path, cities_path, str(tmp_path / "second"))
+
+    first = pd.read_parquet(tmp_path / "first" / attractions_output_name)
+    second = pd.read_parquet(tmp_path / "second" / attractions_output_name)
+    # The loaders MERGE on the id, the node of the edited section is updated instead of duplicated
+    assert second["attractionId"].tolist() == first["attractionId"].tolist()
+    assert second["text"][1] == "listed by UNESCO in 2013"
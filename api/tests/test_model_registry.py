@@ -0,0 +1,65 @@
+import time
+
+from llm import model_registry
+from llm.OpenAI import ChatOpenAIChat
+from llm.model_registry import ModelRegistry
+from wrapper.chat_history_store import ChatHistoryStore
+
+load_seconds = 0.2
+
+
+class SlowLoader:
+    """Stands in for loading model weights."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def __call__(self, **options):
+        self.calls += 1
+        time.sleep(load_seconds)
+        return object()
+
+
+def create_registry(monkeypatch) -> (ModelRegistry, SlowLoader):
+    loader = SlowLoader()
+    monkeypatch.setitem(model_registry.model_loaders, 'openai', loader)
+    return ModelRegistry(ChatHistoryStore(database=None)), loader
+
+
+def test_weights_are_loaded_once_across_connections(monkeypatch):
+    registry, loader = create_registry(monkeypatch)
+
+    first = registry.create_model('openai', websocket="first socket")
+    second = registry.create_model('openai', websocket="second socket")
+
+    assert loader.calls == 1
+    assert isinstance(first, ChatOpenAIChat)
+    assert first.model is second.model
+    assert first.websocket != second.websocket
+
+
+def test_warm_create_model_is_faster_than_cold(monkeypatch):
+    registry, _ = create_registry(monkeypatch)
+
+    started_at = time.perf_counter()
+    registry.create_model('openai', websocket=None)
+    cold = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    for _ in range(100):
+        registry.create_model('openai', websocket=None)
+    warm = (time.perf_counter() - started_at) / 100
+
+    assert cold >= load_seconds
+    assert warm < cold / 100
+
+
+def test_preload_skips_unknown_models(monkeypatch):
+    registry, loader = create_registry(monkeypatch)
+    monkeypatch.setitem(model_registry.embedder_factories, 'openai', lambda: "embedder")
+
+    registry.load(['openai', 'unknown'])
+
+    assert loader.calls == 1
+    assert registry.get_model('unknown') is None
+    assert registry.get_embedder('openai') == "embedder"
@@ -0,0 +1,42 @@
+import pytest
+
+from components import classifier
+from components.router import QueryRouter
+
+
+@pytest.fixture(autouse=True)
+def trained_pipeline(monkeypatch):
+    # Trained from the source, a stale intent_classifier.joblib must not decide the routes
+    monkeypatch.setattr(classifier, "_pipeline", classifier.train_pipeline())
+
+
+@pytest.mark.parametrize("question", ["سلام", "سلام خوبی؟", "مرسی", "متشکرم", "ممنون", "خداحافظ"])
+def test_small_talk_skips_retrieval(question):
+    router = QueryRouter()
+
+    assert router.route(question) == "skip"
+    assert not router.needs_retrieval(question)
+
+
+def test_trip_request_is_travel():
+    assert QueryRouter().route("می‌خواهم یک سفر سه روزه به اصفهان برنامه‌ریزی کنم") == "travel"
+
+
+def test_attraction_keyword_skips_the_classifier(monkeypatch):
+    monkeypatch.setattr(classifier, "_pipeline", None)
+    monkeypatch.setattr(classifier, "load_pipeline", lambda: pytest.fail("classifier was used"))
+
+    assert QueryRouter().route("موزه‌های تهران کدامند؟") == "keyword"
+
+
+def test_low_confidence_travel_intent_is_uncertain(monkeypatch):
+    monkeypatch.setattr("components.router.classify_batch", lambda texts: [("plan_trip", 0.3)])
+
+    assert QueryRouter(threshold=0.6).route("سه روز") == "uncertain"
+
+
+def test_threshold_above_one_never_skips():
+    router = QueryRouter(threshold=1.01)
+
+    assert router.needs_retrieval("سلام")
+    assert router.stats()["uncertain"] == 1
@@ -0,0 +1,111 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from Utils.stream_writer import StreamChannel, StreamWriter
+
+
+class FakeWebSocket:
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+        self.frames = []
+
+    async def send_text(self, frame: str) -> None:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.frames.append(json.loads(frame))
+
+
+class ClosedWebSocket:
+    async def send_text(self, frame: str) -> None:
+        raise RuntimeError("disconnected")
+
+
+def test_tokens_are_coalesced_into_few_frames():
+    websocket = FakeWebSocket()
+
+    async def run():
+        writer = StreamWriter(websocket, flush_interval=0.05)
+        writer.start()
+        for i in range(100):
+            await writer.stream(f"{i} ")
+        await writer.close()
+
+    asyncio.run(run())
+    assert len(websocket.frames) == 1
+    assert websocket.frames[0] == {"type": "stream", "output": "".join(f"{i} " for i in range(100))}
+
+
+def test_flush_bytes_bounds_the_frame_size():
+    websocket = FakeWebSocket()
+
+    async def run():
+        writer = StreamWriter(websocket, flush_interval=10, flush_bytes=10)
+        writer.start()
+        for _ in range(10):
+            await writer.stream("abcde")
+        await writer.close()
+
+    asyncio.run(run())
+    assert [frame["output"] for frame in websocket.frames] == ["abcdeabcde"] * 5
+
+
+def test_buffered_tokens_are_sent_before_the_next_frame_of_the_request():
+    websocket = FakeWebSocket()
+
+    async def run():
+        writer = StreamWriter(websocket, flush_interval=10)
+        writer.start()
+        first = StreamChannel(writer, "a")
+        second = StreamChannel(writer, "b")
+        await first.stream("hello ")
+        await second.stream("other")
+        await first.stream("world")
+        await first.send_json({"type": "end"})
+        await writer.close()
+
+    asyncio.run(run())
+    frames_of_a = [frame for frame in websocket.frames if frame["request_id"] == "a"]
+    assert frames_of_a == [
+        {"type": "stream", "output": "hello world", "request_id": "a"},
+        {"type": "end", "request_id": "a"},
+    ]
+    assert {"type": "stream", "output": "other", "request_id": "b"} in websocket.frames
+
+
+def test_slow_client_does_not_block_generation():
+    websocket = FakeWebSocket(delay=0.05)
+
+    async def run():
+        writer = StreamWriter(websocket, flush_interval=0.001, queue_size=2)
+        writer.start()
+        started_at = time.perf_counter()
+        for i in range(200):
+            await writer.stream(f"{i} ")
+            if i % 20 == 0:
+                # Let the flush timer fire while the client is still busy
+                await asyncio.sleep(0.002)
+        generation_seconds = time.perf_counter() - started_at
+        await writer.close()
+        return generation_seconds
+
+    generation_seconds = asyncio.run(run())
+    assert generation_seconds < 0.1
+    assert "".join(frame["output"] for frame in websocket.frames) == "".join(f"{i} " for i in range(200))
+    assert len(websocket.frames) < 20
+
+
+def test_disconnect_is_raised_on_the_next_send():
+    async def run():
+        writer = StreamWriter(ClosedWebSocket())
+        writer.start()
+        await writer.send_json({"type": "start"})
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        with pytest.raises(RuntimeError):
+            writer.stream_nowait("token")
+        await writer.close()
+
+    asyncio.run(run())
@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+from components.similarity import Neo4jSimilarity, parse_trip_information, validate_user_trip_information
+
+delay = 0.2
+
+
+class FakeLLM:
+    """Answers every prompt after a fixed delay, like one LLM round trip."""
+
+    model_name = "fake"
+
+    def __init__(self, answers: dict, delay: float = delay) -> None:
+        self.answers = answers
+        self.delay = delay
+        self.calls = 0
+
+    async def generate_streaming(self, question, session_id, similars, prompt, send_response=True,
+                                 use_history=True, save_conversation=True, json_mode=False):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if json_mode:
+            return self.answers["json"]
+        if "چند روز" in question:
+            return self.answers["stay_duration"]
+        if "متن کاربر" in question:
+            return self.answers["mentioned_city"]
+        return self.answers["city"]
+
+
+answers = {
+    "json": 'حتما: {"city": "تهران", "stay_duration": 3, "mentioned_city": "نمیدانم"}',
+    "city": "تهران",
+    "stay_duration": "3",
+    "mentioned_city": "نمیدانم",
+}
+
+
+def extract(extraction_mode: str, llm: FakeLLM) -> ((int, str), float):
+    similarity = Neo4jSimilarity(None, None, llm, extraction_mode=extraction_mode)
+
+    started_at = time.perf_counter()
+    result = asyncio.run(similarity.get_user_trip_information("سه روز سفر", "session"))
+    return result, time.perf_counter() - started_at
+
+
+def test_structured_extraction_takes_one_round_trip():
+    llm = FakeLLM(answers)
+
+    result, elapsed = extract("structured", llm)
+
+    assert result == (3, "تهران")
+    assert llm.calls == 1
+    assert elapsed < delay * 2
+
+
+def test_concurrent_extraction_overlaps_the_three_calls():
+    llm = FakeLLM(answers)
+
+    result, elapsed = extract("concurrent", llm)
+
+    assert result == (3, "تهران")
+    assert llm.calls == 3
+    # Back to back they would take three round trips
+    assert elapsed < delay * 2
+
+
+def test_malformed_structured_answer_falls_back_to_concurrent():
+    llm = FakeLLM({**answers, "json": "نمیدانم"})
+
+    result, _ = extract("structured", llm)
+
+    assert result == (3, "تهران")
+    assert llm.calls == 4
+
+
+def test_parse_trip_information():
+    assert parse_trip_information('{"city": "شیراز", "stay_duration": 2}') == {
+        "city": "شیراز", "stay_duration": "2", "mentioned_city": None,
+    }
+    assert parse_trip_information('{"city": ') is None
+    assert parse_trip_information('["شیراز"]') is None
+
+
+def test_mentioned_city_overrides_history():
+    assert validate_user_trip_information("تهران", "شیراز", "2") == (2, "شیراز")
+    assert validate_user_trip_information("تهران", "نمیدانم", "نمیدانم") == (0, "تهران")
+    assert validate_user_trip_information("نمیدانم", "نمیدانم", "2") == (0, None)
@@ -0,0 +1,114 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+
+# The driver is created when main is imported but only connects on startup, which TestClient skips here
+os.environ.setdefault('NEO4J_URL', 'bolt://localhost:7687')
+
+import main  # noqa: E402
+from wrapper.local_vector_store import metadata_file_name, vectors_file_name  # noqa: E402
+
+
+class FakeSimilar:
+    def to_dict(self) -> dict:
+        return {"name": "باغ ارم"}
+
+
+class FakeLLM:
+    model_name = "fake"
+
+
+class FakeSimilarity:
+    async def run_async(self, question: str, session_id: str):
+        return [FakeSimilar()]
+
+
+class FakeResultGenerator:
+    def __init__(self, stream) -> None:
+        self.llm = FakeLLM()
+        self.stream = stream
+
+    async def run_async(self, question: str, session_id: str, similars) -> str:
+        for token in ["سفر ", "به ", "شیراز"]:
+            await self.stream.stream(token)
+            await asyncio.sleep(0)
+        return "سفر به شیراز"
+
+
+def fake_components(model_name: str, stream):
+    if model_name != "fake":
+        return None
+    return FakeResultGenerator(stream), FakeSimilarity()
+
+
+def receive_until_end(websocket, timeout: float = 5.0) -> [dict]:
+    def receive():
+        frames = []
+        while not frames or frames[-1].get("type") != "end":
+            frames.append(websocket.receive_json())
+        return frames
+
+    # An answer task dying on an exception sends nothing, fail instead of blocking forever
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        return executor.submit(receive).result(timeout=timeout)
+    finally:
+        executor.shutdown(wait=False)
+
+
+def test_question_is_answered_over_the_websocket(monkeypatch):
+    monkeypatch.setattr(main, "create_components", fake_components)
+
+    with TestClient(main.app).websocket_connect("/text2text") as websocket:
+        assert websocket.receive_json() == {"type": "debug", "detail": "connected"}
+
+        websocket.send_json({"type": "question", "question": "سفر به شیراز", "session_id": "s", "model": "fake"})
+        frames = receive_until_end(websocket)
+
+    types = [frame["type"] for frame in frames]
+    assert types.index("start") < types.index("stream") < types.index("end")
+    assert "".join(frame["output"] for frame in frames if frame["type"] == "stream") == "سفر به شیراز"
+    assert frames[-1] == {"type": "end", "output": "سفر به شیراز", "similars": [{"name": "باغ ارم"}]}
+    assert "error" not in types
+
+
+def test_tagged_request_frames_carry_the_request_id(monkeypatch):
+    monkeypatch.setattr(main, "create_components", fake_components)
+
+    with TestClient(main.app).websocket_connect("/text2text") as websocket:
+        websocket.receive_json()
+
+        websocket.send_json({"type": "question", "question": "شیراز", "session_id": "s", "model": "unknown"})
+        assert websocket.receive_json() == {"error": "model undefined"}
+
+        websocket.send_json({"type": "question", "question": "شیراز", "session_id": "s", "model": "fake",
+                             "request_id": "r1"})
+        frames = receive_until_end(websocket)
+
+    assert all(frame["request_id"] == "r1" for frame in frames)
+
+
+def test_model_without_a_packed_store_falls_back_to_random_retrieval(tmp_path, monkeypatch):
+    packed = tmp_path / "openai"
+    packed.mkdir()
+    np.save(packed / vectors_file_name, np.ones((1, 2), dtype=np.float32))
+    pd.DataFrame({"attractionId": [1], "city_name": ["شیراز"]}).to_parquet(packed / metadata_file_name)
+
+    monkeypatch.setattr(main, "retrieval_mode", "local")
+    monkeypatch.setattr(main, "local_vector_store_path", str(tmp_path))
+    monkeypatch.setattr(main, "vector_stores", {})
+    monkeypatch.setattr(main.model_registry, "create_model", lambda model_name, stream: FakeLLM())
+    monkeypatch.setattr(main.model_registry, "get_embedder", lambda model_name: None)
+
+    # Startup loads the stores of the preloaded models
+    assert main.get_vector_store("gpt4all") is None
+    assert main.get_vector_store("openai") is not None
+
+    _, packed_similarity = main.create_components("openai", None)
+    _, missing_similarity = main.create_components("gpt4all", None)
+    assert (packed_similarity.retrieval_mode, missing_similarity.retrieval_mode) == ("local", "random")
+    assert missing_similarity.vector_store is None
@@ -1,11 +1,13 @@
 export type WebSocketRequest = {
-  type: "question";
-  question: string;
+  type: "question" | "cancel";
+  question?: string;
   session_id?: string;
   model?: string;
+  // Optional, every frame of a tagged question carries it and several can be in flight
+  request_id?: string;
 };
 
-export type WebSocketResponse =
+export type WebSocketResponse = (
   | { type: "start" }
   | {
       type: "stream";
@@ -23,6 +25,7 @@ export type WebSocketResponse =
   | {
       type: "debug";
       detail: string;
-    };
+    }
+) & { request_id?: string };
 
 export type ConversationState = "waiting" | "streaming" | "ready" | "error";